@@ -3,12 +3,12 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from django.urls import reverse
+from django.contrib import messages
 from django.db.models import Count
-from django.http import HttpResponse
-import csv
+from .exports import EXPORT_CHUNK_SIZE, csv_streaming_response, start_background_export
 from .models import GenerateModel, GenerateDimension, GenerateSize, GenerateCount
 
-from .models import GenerateSetting, GenerateHistory, Post, SidebarMenu, Tag, Comment
+from .models import AccountDeletion, GenerateSetting, GenerateHistory, GenerationJob, Post, SidebarMenu, Tag, Comment
 # ถ้ามี Profile model และอยากจัดการในแอดมินด้วย ปลดคอมเมนต์บรรทัดนี้
 # from .models import Profile
 
@@ -22,14 +22,40 @@ def short(text, limit=80):
     text = str(text)
     return text if len(text) <= limit else text[:limit] + "…"
 
-def _csv_response(filename, header_row, rows_iter):
-    resp = HttpResponse(content_type="text/csv; charset=utf-8")
-    resp["Content-Disposition"] = f'attachment; filename="{filename}"'
-    writer = csv.writer(resp)
-    writer.writerow(header_row)
-    for row in rows_iter:
-        writer.writerow(row)
-    return resp
+def csv_export_actions(name, filename, header, make_row, prepare=lambda qs: qs, label="rows"):
+    """
+    สร้าง admin actions สำหรับ export CSV 3 แบบ:
+      - stream ตรงไปยัง browser (ดึงจาก DB ทีละ chunk ด้วย .iterator)
+      - stream แบบ gzip
+      - เขียนเป็นไฟล์ใน background (สำหรับ selection ใหญ่มาก) แล้วให้ลิงก์ดาวน์โหลด
+    name = ชื่อ action หลัก (แบบ gzip / background ต่อท้ายด้วย _gz / _background)
+    prepare = ปรับ queryset ก่อน export (select_related / prefetch_related / only)
+    """
+    def rows(queryset):
+        for obj in prepare(queryset).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            yield make_row(obj)
+
+    def export_csv(modeladmin, request, queryset):
+        return csv_streaming_response(filename, header, rows(queryset))
+    export_csv.short_description = f"Export selected {label} to CSV"
+
+    def export_csv_gz(modeladmin, request, queryset):
+        return csv_streaming_response(filename, header, rows(queryset), gzip=True)
+    export_csv_gz.short_description = f"Export selected {label} to CSV (gzip)"
+
+    def export_csv_background(modeladmin, request, queryset):
+        name = start_background_export(filename, header, lambda: rows(queryset))
+        url = reverse("admin_export_download", args=[name])
+        modeladmin.message_user(
+            request,
+            format_html('กำลัง export ใน background — ดาวน์โหลดเมื่อเสร็จที่ <a href="{}">{}</a>', url, name),
+            messages.INFO,
+        )
+    export_csv_background.short_description = f"Export selected {label} to CSV file (background)"
+
+    for action, suffix in ((export_csv, ""), (export_csv_gz, "_gz"), (export_csv_background, "_background")):
+        action.__name__ = name + suffix
+    return [export_csv, export_csv_gz, export_csv_background]
 
 
 # ---------------------------
@@ -52,23 +78,27 @@ class GenerateCountAdmin(admin.ModelAdmin):
 # ---------------------------
 # GenerateHistory
 # ---------------------------
-@admin.action(description="Export selected GenerateHistory to CSV")
-def export_histories_csv(modeladmin, request, queryset):
-    header = ["id", "user", "model_name", "seed", "image_url", "rating", "created_at", "positive_prompt", "negative_prompt"]
-    def iter_rows():
-        for h in queryset.select_related("user"):
-            yield [
-                h.id,
-                getattr(h.user, "username", ""),
-                h.model_name,
-                h.seed,
-                h.image_url,
-                h.rating,
-                h.created_at,
-                h.positive_prompt,
-                h.negative_prompt,
-            ]
-    return _csv_response("generate_histories.csv", header, iter_rows())
+def _history_row(h):
+    return [
+        h.id,
+        getattr(h.user, "username", ""),
+        h.model_name,
+        h.seed,
+        h.image_url,
+        h.rating,
+        h.created_at,
+        h.positive_prompt,
+        h.negative_prompt,
+    ]
+
+history_export_actions = csv_export_actions(
+    "export_histories_csv",
+    "generate_histories.csv",
+    ["id", "user", "model_name", "seed", "image_url", "rating", "created_at", "positive_prompt", "negative_prompt"],
+    _history_row,
+    prepare=lambda qs: qs.select_related("user"),
+    label="GenerateHistory",
+)
 
 @admin.register(GenerateHistory)
 class GenerateHistoryAdmin(admin.ModelAdmin):
@@ -80,7 +110,7 @@ class GenerateHistoryAdmin(admin.ModelAdmin):
     search_fields = ("positive_prompt", "negative_prompt", "user__username", "model_name", "seed")
     readonly_fields = ("thumb", "created_at")
     date_hierarchy = "created_at"
-    actions = [export_histories_csv]
+    actions = history_export_actions
     ordering = ("-created_at",)
 
     fieldsets = (
@@ -123,24 +153,28 @@ class TagInline(admin.TabularInline):
     verbose_name = "Tag"
     verbose_name_plural = "Tags"
 
-@admin.action(description="Export selected Posts to CSV")
-def export_posts_csv(modeladmin, request, queryset):
-    header = ["id", "user", "title", "caption", "model_used", "created_at", "history_id", "history_image_url", "tags"]
-    def iter_rows():
-        qs = queryset.select_related("user", "history").prefetch_related("tags")
-        for p in qs:
-            yield [
-                p.id,
-                getattr(p.user, "username", ""),
-                p.title,
-                p.caption,
-                p.model_used,
-                getattr(p, "created_at", ""),
-                getattr(p.history, "id", ""),
-                getattr(p.history, "image_url", ""),
-                ", ".join([t.name for t in p.tags.all()]),
-            ]
-    return _csv_response("posts.csv", header, iter_rows())
+def _post_row(p):
+    return [
+        p.id,
+        getattr(p.user, "username", ""),
+        p.title,
+        p.caption,
+        p.model_used,
+        getattr(p, "created_at", ""),
+        getattr(p.history, "id", ""),
+        getattr(p.history, "image_url", ""),
+        ", ".join([t.name for t in p.tags.all()]),
+    ]
+
+# prefetch_related ทำงานร่วมกับ .iterator(chunk_size) -> tags ถูกดึงทีละ chunk
+post_export_actions = csv_export_actions(
+    "export_posts_csv",
+    "posts.csv",
+    ["id", "user", "title", "caption", "model_used", "created_at", "history_id", "history_image_url", "tags"],
+    _post_row,
+    prepare=lambda qs: qs.select_related("user", "history").prefetch_related("tags"),
+    label="Posts",
+)
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
@@ -149,7 +183,7 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ("model_used", "created_at", "tags")
     date_hierarchy = "created_at"
     inlines = [TagInline]
-    actions = [export_posts_csv]
+    actions = post_export_actions
     ordering = ("-created_at",)
 
     fieldsets = (
@@ -264,4 +298,17 @@ class SidebarMenuAdmin(admin.ModelAdmin):
 class GenerateDimensionAdmin(admin.ModelAdmin):
     list_display = ("label", "value", "is_active")
 
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "prompt_id", "backend", "status", "created_at", "updated_at")
+    list_filter = ("status", "backend")
+    search_fields = ("prompt_id", "user__username")
+    ordering = ("-created_at",)
 
+@admin.register(AccountDeletion)
+class AccountDeletionAdmin(admin.ModelAdmin):
+    list_display = ("id", "username", "user_id", "status", "progress", "requested_by", "created_at", "updated_at")
+    list_filter = ("status",)
+    search_fields = ("username",)
+    readonly_fields = ("user_id", "username", "requested_by", "status", "progress", "error", "created_at", "updated_at")
+    ordering = ("-created_at",)
@@ -6,5 +6,4 @@ class AccountsConfig(AppConfig):
     name = 'accounts'
     
     def ready(self):
-        # import accounts.signals 
-        pass
+        import accounts.signals  # noqa: F401  (rollup สถิติ dashboard)
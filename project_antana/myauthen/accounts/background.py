@@ -0,0 +1,40 @@
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+
+# ==========================================
+# Background worker (in-process) สำหรับงานที่ไม่ต้องให้ request รอ
+# เช่น export ไฟล์ใหญ่, ลบไฟล์ภาพออกจาก storage
+# ==========================================
+# หมายเหตุ: งานอยู่ในหน่วยความจำของ process -> ถ้า process ตาย งานที่ยังไม่ทำจะหาย
+# ใช้กับงานที่ทำซ้ำ/เก็บกวาดทีหลังได้เท่านั้น
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_WORKERS, thread_name_prefix="background"
+            )
+        return _executor
+
+def _run(fn, args, kwargs):
+    close_old_connections()
+    try:
+        return fn(*args, **kwargs)
+    except Exception:
+        print(f"[Background] {getattr(fn, '__name__', fn)} failed:\n{traceback.format_exc()}")
+        raise
+    finally:
+        close_old_connections()
+
+def submit(fn, *args, **kwargs):
+    """ส่งงานเข้าคิว คืน Future (exception ถูก print ไว้แล้ว ไม่ต้องรอผลก็ได้)"""
+    return _get_executor().submit(_run, fn, args, kwargs)
@@ -0,0 +1,185 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .comfy import (
+    COMFY_HOST,
+    _poll_history,
+    batch_key,
+    batch_prompt_graph,
+    build_prompt_graph,
+    output_image_urls,
+    submit_prompt,
+)
+from .jobs import record_submitted
+from .progress import ensure_listener, store as progress_store
+
+
+# ==========================================
+# Micro-batching: รวมงาน generate ที่มาใกล้ ๆ กันเป็น latent batch เดียว
+# ==========================================
+# รวมเฉพาะงานที่ prompt / checkpoint / ขนาด / ค่า sampler เหมือนกันและไม่ได้ระบุ seed (comfy.batch_key)
+# -> KSampler ตัวเดียว sample ทุกภาพพร้อมกันบน GPU แล้วแยก outputs ตามลำดับใน batch
+# งานที่ระบุ seed เองส่งทันที (ภาพต้องตรงกับ seed นั้นเมื่อสร้างซ้ำ)
+
+class _Job:
+    def __init__(self, payload, progress_id=None, record=None):
+        self.payload = payload
+        self.progress_id = progress_id
+        self.record = record
+        self.record_id = None
+        self.future = Future()
+
+    @property
+    def n_images(self):
+        return self.payload["prompt"].get("5", {}).get("inputs", {}).get("batch_size", 1)
+
+
+class _Group:
+    def __init__(self, key):
+        self.key = key
+        self.jobs = []
+        self.timer = None
+
+    @property
+    def n_images(self):
+        return sum(job.n_images for job in self.jobs)
+
+
+class GenerationBatcher:
+    """
+    พักงานที่รวมกันได้ไว้สั้น ๆ (window) แล้วส่งไป ComfyUI เป็น latent batch เดียว (batch_size = ผลรวม)
+    ผลลัพธ์ถูกแยกกลับไปที่ Future ของแต่ละงาน: {"image_urls": [...], "seed": <int>}
+    งานในกลุ่มเดียวกันได้ seed ของกลุ่ม (ภาพของงานคือลำดับ offset.. ใน batch ของ seed นั้น)
+    """
+
+    def __init__(self, window=0.3, max_images=8, workers=2):
+        self.window = window
+        self.max_images = max_images
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="comfy-batch")
+
+    def submit(self, model_name, positive, negative, seed, width, height, n_images=1, progress_id=None, record=None):
+        """
+        progress_id = id ใน progress store (ถ้ามี) เพื่อรายงาน step/preview ให้หน้าเว็บ
+        record = {"user_id", "model_name"} -> บันทึก GenerationJob หลังได้ prompt_id (กู้ผลได้ถ้า process ตาย)
+        """
+        ensure_listener()
+        payload = build_prompt_graph(
+            model_name=model_name,
+            positive=positive or "",
+            negative=negative or "",
+            seed=seed,
+            width=width,
+            height=height,
+            n_images=n_images or 1,
+        )
+        if record is not None:
+            record = dict(record, positive=positive or "", negative=negative or "")
+        job = _Job(payload, progress_id, record)
+
+        if self.window <= 0 or seed not in (None, "") or job.n_images >= self.max_images:
+            self._executor.submit(self._run, [job])
+            return job.future
+
+        key = batch_key(payload)
+        with self._lock:
+            group = self._pending.get(key)
+            if group is not None and group.n_images + job.n_images > self.max_images:
+                overflow, group = group, None   # เกิน max_images -> ส่งกลุ่มเดิมไปก่อน แล้วเริ่มกลุ่มใหม่
+                del self._pending[key]
+            else:
+                overflow = None
+            if group is None:
+                group = self._pending[key] = _Group(key)
+                group.timer = threading.Timer(self.window, self._flush, args=(group,))
+                group.timer.daemon = True
+                group.timer.start()
+            group.jobs.append(job)
+            full = group.n_images >= self.max_images
+
+        if overflow is not None:
+            overflow.timer.cancel()
+            self._executor.submit(self._run, overflow.jobs)
+        if full:
+            self._flush(group)
+        return job.future
+
+    def _flush(self, group):
+        with self._lock:
+            # กลุ่มอาจถูก flush ไปแล้ว (เต็มก่อนหมดเวลา)
+            if self._pending.get(group.key) is not group:
+                return
+            del self._pending[group.key]
+        group.timer.cancel()
+        self._executor.submit(self._run, group.jobs)
+
+    def _run(self, jobs):
+        close_old_connections()
+        try:
+            if len(jobs) == 1:
+                payload, slices = jobs[0].payload, [None]
+            else:
+                payload, slices = batch_prompt_graph([job.payload for job in jobs])
+            seed = payload["prompt"].get("4", {}).get("inputs", {}).get("seed")
+            print(f"[Batch] submit {len(jobs)} job(s), {sum(j.n_images for j in jobs)} image(s)")
+
+            prompt_id = submit_prompt(payload)
+            self._record(prompt_id, jobs, slices, seed)
+            progress_store.attach_prompt(prompt_id, {"4": [job.progress_id for job in jobs if job.progress_id]})
+            hist = _poll_history(prompt_id, max_secs=300, sleep_secs=1.0)
+            image_urls = output_image_urls(hist[prompt_id].get("outputs", {}), "7")
+        except Exception as e:
+            for job in jobs:
+                self._resolve(job, error=e)
+            return
+
+        for job, part in zip(jobs, slices):
+            urls = image_urls if part is None else image_urls[part[0]:part[0] + part[1]]
+            if urls:
+                self._resolve(job, result={"image_urls": urls, "seed": seed, "job_record_id": job.record_id})
+            else:
+                self._resolve(job, error=RuntimeError("No images found in ComfyUI outputs."))
+        close_old_connections()
+
+    def _record(self, prompt_id, jobs, slices, seed):
+        recorded = [(job, part) for job, part in zip(jobs, slices) if job.record]
+        if not recorded:
+            return
+        try:
+            ids = record_submitted(prompt_id, COMFY_HOST, [
+                dict(job.record, seed=seed, output_offset=part[0] if part else 0, output_count=part[1] if part else None)
+                for job, part in recorded
+            ])
+        except Exception as e:
+            # บันทึกไม่ได้ก็ยังรอผลต่อได้ แค่กู้คืนไม่ได้ถ้า process ตาย
+            print(f"[Batch] could not record GenerationJob: {e}")
+            return
+        for (job, _), record_id in zip(recorded, ids):
+            job.record_id = record_id
+
+    def _resolve(self, job, result=None, error=None):
+        if job.progress_id:
+            progress_store.finish(job.progress_id, error)
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+def get_batcher():
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = GenerationBatcher(
+                window=settings.COMFY_BATCH_WINDOW,
+                max_images=settings.COMFY_BATCH_MAX_IMAGES,
+                workers=settings.COMFY_BATCH_WORKERS,
+            )
+        return _batcher
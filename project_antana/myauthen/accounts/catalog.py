@@ -0,0 +1,84 @@
+import threading
+import time
+
+from django.conf import settings
+
+from .models import GenerateCount, GenerateDimension, GenerateModel
+from .versions import get_version
+
+# ==========================================
+# Catalog ตัวเลือกการสร้างภาพ (โมเดล / ขนาด / จำนวนภาพ) เก็บใน memory ของ process
+# ==========================================
+# ถูก invalidate ด้วย version "catalog" (signals.py bump ตอน save/delete)
+# ถ้า cache backend ไม่ได้แชร์ระหว่าง process (LocMemCache) process อื่นจะเห็นค่าใหม่ภายใน CATALOG_CACHE_SECONDS
+
+CATALOG_VERSION = "catalog"
+
+
+def parse_dimension(value):
+    """'1024 x 768px' -> (1024, 768), raise ValueError ถ้ารูปแบบผิด"""
+    raw = value.replace("px", "").replace(" ", "")
+    width, height = raw.split("x")
+    return int(width), int(height)
+
+
+class Catalog:
+    def __init__(self, models, dimensions, counts):
+        self.models_by_id = {m.id: m for m in models}
+        self.dimensions_by_id = {d.id: d for d in dimensions}
+        self.models = [m for m in models if m.is_active]
+        self.dimensions = [d for d in dimensions if d.is_active]
+        self.counts = [c for c in counts if c.is_active]
+        self.allowed_counts = {c.value for c in self.counts}
+
+        # parse ขนาดไว้ล่วงหน้า (ค่าที่ parse ไม่ได้เก็บ exception ไว้แจ้ง error เดิม)
+        self.dimension_sizes = {}
+        for d in dimensions:
+            try:
+                self.dimension_sizes[d.id] = parse_dimension(d.value)
+            except ValueError as e:
+                self.dimension_sizes[d.id] = e
+
+    def get_model(self, model_id):
+        try:
+            return self.models_by_id.get(int(model_id))
+        except (TypeError, ValueError):
+            return None
+
+    def get_dimension_size(self, dimension_id):
+        """(width, height) ของ dimension, raise ValueError ถ้าไม่พบหรือรูปแบบผิด"""
+        try:
+            size = self.dimension_sizes[int(dimension_id)]
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("ไม่พบ dimension")
+        if isinstance(size, Exception):
+            raise size
+        return size
+
+
+_lock = threading.Lock()
+_cached = None        # (version, loaded_at, Catalog)
+
+def _load():
+    return Catalog(
+        list(GenerateModel.objects.order_by("id")),
+        list(GenerateDimension.objects.order_by("id")),
+        list(GenerateCount.objects.order_by("id")),
+    )
+
+def get_catalog():
+    global _cached
+    version = get_version(CATALOG_VERSION)
+    now = time.monotonic()
+    with _lock:
+        if _cached and _cached[0] == version and now - _cached[1] < settings.CATALOG_CACHE_SECONDS:
+            return _cached[2]
+    catalog = _load()
+    with _lock:
+        _cached = (version, now, catalog)
+    return catalog
+
+def clear_local():
+    global _cached
+    with _lock:
+        _cached = None
@@ -0,0 +1,214 @@
+import json
+import os
+import random
+import time
+import uuid
+
+import requests
+
+
+COMFY_HOST = os.environ.get("COMFY_HOST", "http://127.0.0.1:8188")
+WORKFLOW_PATH = os.path.join(os.path.dirname(__file__), "workflows", "workflows1.json")
+# ComfyUI ส่ง progress/preview ไปที่ websocket ของ client_id ที่ส่ง prompt -> แยกต่อ process
+CLIENT_ID = f"django-ui-{uuid.uuid4().hex[:8]}"
+
+def _as_int(x, default):
+    try:
+        return int(x)
+    except Exception:
+        return int(default)
+
+def _mul8(x, default=512):
+    """บังคับให้เป็นจำนวนที่หาร 8 ลงตัว (latent ส่วนใหญ่ต้องเป็น multiple of 8)"""
+    v = _as_int(x, default)
+    return max(64, (v // 8) * 8)
+
+def _normalize_model_name(model_name: str) -> str:
+    """
+    แปลงชื่อที่มาจาก UI ให้เป็นไฟล์ ckpt/safetensors ที่ ComfyUI เห็นจริง
+    ปรับ mapping ให้ตรงกับ checkpoints ที่คุณมีใน ComfyUI
+    """
+    mapping = {
+        "Nova XL v9.0": "novaOrangeXL_v90.safetensors",
+        "ilustmix v8.0": "ilustmix_v80.safetensors",
+    }
+    if not model_name:
+        return "novaOrangeXL_v90.safetensors"
+    if model_name.endswith(".safetensors") or model_name.endswith(".ckpt"):
+        return model_name
+    return mapping.get(model_name, model_name)
+
+def _post_json(url: str, payload: dict, timeout: int = 60):
+    """POST แบบ JSON พร้อม error message ที่อ่านง่าย"""
+    try:
+        r = requests.post(url, json=payload, timeout=timeout)
+    except requests.RequestException as e:
+        raise RuntimeError(f"POST {url} failed: {e}")
+    if r.status_code != 200:
+        raise RuntimeError(f"POST {url} -> {r.status_code}: {r.text}")
+    try:
+        return r.json()
+    except Exception:
+        raise RuntimeError(f"POST {url} returned non-JSON: {r.text[:500]}")
+
+def _get_json(url: str, timeout: int = 30):
+    """GET แล้วแปลงเป็น JSON พร้อมข้อความ error อ่านง่าย"""
+    try:
+        r = requests.get(url, timeout=timeout)
+    except requests.RequestException as e:
+        raise RuntimeError(f"GET {url} failed: {e}")
+    if r.status_code != 200:
+        raise RuntimeError(f"GET {url} -> {r.status_code}: {r.text}")
+    try:
+        return r.json()
+    except Exception:
+        raise RuntimeError(f"GET {url} returned non-JSON: {r.text[:500]}")
+
+def _poll_history(prompt_id: str, max_secs: int = 300, sleep_secs: float = 1.0):
+    """
+    โพลผลลัพธ์จาก /history/<prompt_id> จนกว่าจะมี outputs
+    คืน dict history ของ ComfyUI
+    """
+    start = time.time()
+    url = f"{COMFY_HOST}/history/{prompt_id}"
+    while time.time() - start <= max_secs:
+        data = _get_json(url, timeout=15)
+        if prompt_id in data and data[prompt_id].get("outputs"):
+            return data
+        time.sleep(sleep_secs)
+    raise TimeoutError(f"ComfyUI did not produce output within {max_secs}s for prompt_id={prompt_id}")
+
+# =========================
+# == COMFY PAYLOAD BUILDER
+# =========================
+def build_prompt_graph(model_name, positive, negative, seed, width, height, n_images=1):
+    """
+    โหลด workflows2.json แล้วตั้งค่า node id ตามไฟล์ workflow ของคุณ:
+      1: CheckpointLoaderSimple -> ckpt_name
+      2: CLIPTextEncode (positive) -> text
+      3: CLIPTextEncode (negative) -> text
+      4: KSampler -> seed
+      5: EmptyLatentImage -> width/height/batch_size
+      7: SaveImage (output)
+    คืน payload พร้อมส่ง /prompt
+    """
+    with open(WORKFLOW_PATH, "r", encoding="utf-8") as f:
+        wf = json.load(f)
+
+    ckpt  = _normalize_model_name(model_name)
+    seed  = _as_int(seed if seed not in [None, ""] else random.randint(1, 4294967295), random.randint(1, 4294967295))
+    width = _mul8(width, 512)
+    height = _mul8(height, 512)
+    batch = max(1, _as_int(n_images or 1, 1))
+
+    # id=1
+    if "1" in wf and "inputs" in wf["1"]:
+        wf["1"]["inputs"]["ckpt_name"] = ckpt
+    # id=2
+    if "2" in wf and "inputs" in wf["2"]:
+        wf["2"]["inputs"]["text"] = positive or ""
+    # id=3
+    if "3" in wf and "inputs" in wf["3"]:
+        wf["3"]["inputs"]["text"] = negative or ""
+    # id=4
+    if "4" in wf and "inputs" in wf["4"]:
+        wf["4"]["inputs"]["seed"] = seed
+    # id=5
+    if "5" in wf and "inputs" in wf["5"]:
+        wf["5"]["inputs"]["width"] = width
+        wf["5"]["inputs"]["height"] = height
+        wf["5"]["inputs"]["batch_size"] = batch  # ถ้าอยากได้หลายรูป
+
+    return {"prompt": wf, "client_id": CLIENT_ID}
+
+def generate_image_with_workflow(model_name, positive, negative, seed, width, height, n_images=None):
+    """
+    ส่ง workflow ไป ComfyUI และดึง URL รูปกลับมาเป็นลิสต์
+    คืน dict: {"image_urls": [...], "seed": <int>}
+    """
+    payload = build_prompt_graph(
+        model_name=model_name,
+        positive=positive or "",
+        negative=negative or "",
+        seed=seed,
+        width=width,
+        height=height,
+        n_images=n_images or 1,
+    )
+
+    prompt_id = submit_prompt(payload)
+
+    hist = _poll_history(prompt_id, max_secs=300, sleep_secs=1.0)
+    outputs = hist[prompt_id].get("outputs", {})
+
+    # node 7 = SaveImage (ตาม workflows2.json)
+    image_urls = output_image_urls(outputs, "7")
+    if not image_urls:
+        raise RuntimeError("No images found in ComfyUI outputs.")
+
+    return {"image_urls": image_urls, "seed": payload["prompt"].get("4", {}).get("inputs", {}).get("seed")}
+
+def output_image_urls(outputs, node_id, host=None):
+    """แปลง outputs ของ SaveImage node เป็นลิสต์ URL /view"""
+    host = host or COMFY_HOST
+    image_urls = []
+    for im in outputs.get(node_id, {}).get("images", []) or []:
+        filename = im["filename"]
+        subfolder = im.get("subfolder", "")
+        image_urls.append(f"{host}/view?filename={filename}&subfolder={subfolder}&type=output")
+    return image_urls
+
+def queued_prompt_ids(host=None):
+    """prompt_id ที่ยังอยู่ในคิวหรือกำลังรันบน ComfyUI (/queue)"""
+    data = _get_json(f"{host or COMFY_HOST}/queue", timeout=15)
+    ids = set()
+    for item in (data.get("queue_running") or []) + (data.get("queue_pending") or []):
+        # แต่ละรายการคือ [number, prompt_id, prompt, extra_data, outputs_to_execute]
+        if len(item) > 1:
+            ids.add(item[1])
+    return ids
+
+# =========================
+# == LATENT BATCH (micro-batch)
+# =========================
+# ComfyUI รัน KSampler แต่ละ node ทีละตัว -> ภาพจะถูก sample พร้อมกันบน GPU ได้ก็ต่อเมื่ออยู่ใน latent batch เดียว
+# (EmptyLatentImage.batch_size) ซึ่งใช้ conditioning และ seed ร่วมกัน
+# จึงรวมได้เฉพาะงานที่ prompt / checkpoint / ขนาด / ค่า sampler ตรงกันทุกอย่าง และไม่ได้ระบุ seed เอง
+SAMPLER_KEYS = ("steps", "cfg", "sampler_name", "scheduler", "denoise")
+
+def batch_key(payload):
+    """คืน key ของงานที่รวมเป็น latent batch เดียวกันได้ (ต่างกันได้แค่ seed และ batch_size)"""
+    wf = payload["prompt"]
+    sampler = wf.get("4", {}).get("inputs", {})
+    latent = wf.get("5", {}).get("inputs", {})
+    return (
+        wf.get("1", {}).get("inputs", {}).get("ckpt_name"),
+        wf.get("2", {}).get("inputs", {}).get("text"),
+        wf.get("3", {}).get("inputs", {}).get("text"),
+        latent.get("width"),
+        latent.get("height"),
+    ) + tuple(sampler.get(k) for k in SAMPLER_KEYS)
+
+def batch_prompt_graph(payloads):
+    """
+    รวม payload ที่ batch_key ตรงกันเป็น graph เดียว: batch_size = ผลรวม, seed = seed ของงานแรก
+    คืน (payload, slices) โดย slices[i] = (offset, count) ของภาพงานที่ i ใน outputs ของ SaveImage (node 7)
+    """
+    merged = json.loads(json.dumps(payloads[0]))
+    slices = []
+    offset = 0
+    for payload in payloads:
+        count = payload["prompt"].get("5", {}).get("inputs", {}).get("batch_size", 1)
+        slices.append((offset, count))
+        offset += count
+    if "5" in merged["prompt"]:
+        merged["prompt"]["5"]["inputs"]["batch_size"] = offset
+    return merged, slices
+
+def submit_prompt(payload):
+    """ส่ง payload ไป /prompt แล้วคืน prompt_id"""
+    resp = _post_json(f"{COMFY_HOST}/prompt", payload, timeout=90)
+    prompt_id = resp.get("prompt_id") or resp.get("promptId")
+    if not prompt_id:
+        raise RuntimeError(f"ComfyUI did not return prompt_id: {resp}")
+    return prompt_id
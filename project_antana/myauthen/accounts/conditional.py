@@ -0,0 +1,107 @@
+import hashlib
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.cache import patch_cache_control
+
+from . import stats
+from .feed import POST_CARDS_VERSION, author_card_version_name, bump_after_commit, post_card_version_name
+from .models import Comment, Post
+from .versions import get_versions
+
+
+# ==========================================
+# Conditional GET (ETag) ของหน้าโพสต์ / โปรไฟล์
+# ==========================================
+# ETag = hash ของ version stamp ใน cache "versions" (ไม่แตะตารางใหญ่) -> ถ้าตรงกับ If-None-Match ตอบ 304 โดยไม่ render
+# - โพสต์: version การ์ด (feed) + ผู้เขียน + thread (comment / like ของโพสต์)
+#   + ผู้เขียนคอมเมนต์หน้าแรก (ชื่อ / รูปโปรไฟล์ใน partials/comment_item.html)
+# - โปรไฟล์: version ผู้เขียน + หน้าโปรไฟล์ (แก้โพสต์) + ค่าใน UserStats (โพสต์/like/comment ที่เปลี่ยน)
+# หน้าเหล่านี้มีส่วนต่อผู้ชม (สถานะไลก์, เมนูเจ้าของ, csrf token) -> ใส่ผู้ชม + csrf cookie ใน ETag ด้วย
+# version stamp ต้องอยู่ใน cache ที่ทุก worker เห็น (settings.CACHES["versions"]: Redis หรือไฟล์)
+# ถ้าถูกตั้งเป็น LocMemCache (ต่อ process) worker ที่ไม่ได้ bump จะตอบ 304 ผิด จึงไม่ส่ง ETag เลย
+
+COMMENT_PAGE_SIZE = 20   # คอมเมนต์หน้าแรกของ post_detail / comment_modal (หน้าถัดไปโหลดผ่าน comments_api)
+
+def thread_version_name(post_id):
+    return f"post_thread:{post_id}"
+
+def user_page_version_name(user_id):
+    return f"user_page:{user_id}"
+
+def bump_threads(post_ids):
+    bump_after_commit([thread_version_name(pk) for pk in post_ids])
+
+def bump_user_page(user_id):
+    bump_after_commit([user_page_version_name(user_id)])
+
+
+@lru_cache(maxsize=1)
+def etags_enabled():
+    if isinstance(caches["versions"], LocMemCache):
+        print("[ETag] CACHES['versions'] เป็น LocMemCache (ต่อ process) -> ปิด ETag ของหน้าโพสต์/โปรไฟล์")
+        return False
+    return True
+
+def _etag(request, *parts):
+    viewer = request.user.pk if request.user.is_authenticated else "anon"
+    raw = ":".join(str(p) for p in (settings.ETAG_SALT, viewer, request.META.get("CSRF_COOKIE", ""), *parts))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def post_etag(request, post_id):
+    """etag_func ของ post_detail / comment_modal (cache get_many 1 ครั้ง + หา user_id ของโพสต์ตาม pk)"""
+    if not etags_enabled():
+        return None
+    owner_id = Post.objects.filter(pk=post_id).values_list("user_id", flat=True).first()
+    if owner_id is None:
+        return None  # ให้ view ตอบ 404 เอง
+    commenters = set(
+        Comment.objects.filter(post_id=post_id).order_by("-created_at", "-pk")
+        .values_list("user_id", flat=True)[:COMMENT_PAGE_SIZE]
+    )
+    names = [
+        POST_CARDS_VERSION,
+        post_card_version_name(post_id),
+        author_card_version_name(owner_id),
+        thread_version_name(post_id),
+    ] + [author_card_version_name(uid) for uid in sorted(commenters - {owner_id})]
+    versions = get_versions(names)
+    return _etag(request, "post", post_id, *(versions[n] for n in names))
+
+def user_profile_etag(request, username):
+    if not etags_enabled():
+        return None
+    user_id = User.objects.filter(username=username).values_list("pk", flat=True).first()
+    if user_id is None:
+        return None
+    names = [POST_CARDS_VERSION, author_card_version_name(user_id), user_page_version_name(user_id)]
+    versions = get_versions(names)
+    s = stats.user_stats(user_id)
+    return _etag(
+        request, "user", user_id, request.GET.get("cursor", ""), *(versions[n] for n in names),
+        s.posts, s.likes_received, s.comments_received, s.generations,
+    )
+
+
+def revalidate(view):
+    """
+    Cache-Control ของหน้าที่มี ETag:
+    ผู้ใช้ที่ login หรือหน้าที่ render csrf token (ต่อผู้ชม) -> private, no-cache
+    (browser เก็บได้แต่ต้องถามด้วย If-None-Match ทุกครั้ง)
+    ผู้ชมทั่วไปที่หน้าไม่มี token -> public, max-age=PUBLIC_PAGE_MAX_AGE (proxy/CDN ช่วยรับ crawler และลิงก์ที่ถูกแชร์)
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if request.method not in ("GET", "HEAD") or response.status_code not in (200, 304):
+            return response
+        # get_token() (แท็ก {% csrf_token %}) ตั้ง CSRF_COOKIE_NEEDS_UPDATE -> อาจมี Set-Cookie csrftoken ด้วย
+        if request.user.is_authenticated or request.META.get("CSRF_COOKIE_NEEDS_UPDATE"):
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, public=True, max_age=settings.PUBLIC_PAGE_MAX_AGE)
+        return response
+    return wrapper
@@ -0,0 +1,125 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import background, stats, trending
+from .jobs import unlink_files
+from .models import AccountDeletion, Comment, GenerateHistory, GenerationJob, Post, Profile
+
+
+# ==========================================
+# ลบบัญชีแบบไม่บล็อก request
+# ==========================================
+# user.delete() ตรง ๆ ให้ Collector โหลดทุกแถวที่ cascade (history / post / comment / like) เข้าหน่วยความจำ
+# และถือ lock จนลบครบ -> ที่นี่ปิดบัญชีทันที แล้วลบของที่ผูกกับผู้ใช้ทีละ batch ใน background
+# งานที่ค้าง (process ตาย) ทำต่อได้ด้วย `manage.py process_account_deletions`
+# worker ต้อง claim งานก่อน (UPDATE แบบมีเงื่อนไข เหมือน jobs.claim_job) -> งานเดียวกันไม่ถูกรันซ้อนกัน
+
+
+def request_account_deletion(user, requested_by=None):
+    """ปิดการใช้งานบัญชีทันที แล้วส่งงานลบเข้า background worker คืน AccountDeletion"""
+    with transaction.atomic():
+        User.objects.filter(pk=user.pk).update(is_active=False)
+        job = AccountDeletion.objects.filter(
+            user_id=user.pk, status__in=[AccountDeletion.STATUS_PENDING, AccountDeletion.STATUS_RUNNING]
+        ).first()
+        if job is None:
+            job = AccountDeletion.objects.create(user_id=user.pk, username=user.username, requested_by=requested_by)
+    transaction.on_commit(lambda: background.submit(run_account_deletion, job.pk))
+    return job
+
+
+def _delete_in_batches(job, key, qs, delete_batch):
+    """ดึง pk ทีละ batch จาก qs แล้วให้ delete_batch(pks) ลบ -> บันทึกความคืบหน้าทุก batch"""
+    size = settings.ACCOUNT_DELETE_BATCH_SIZE
+    while True:
+        pks = list(qs.values_list("pk", flat=True)[:size])
+        if not pks:
+            return
+        delete_batch(pks)
+        job.progress[key] = job.progress.get(key, 0) + len(pks)
+        job.save(update_fields=["progress", "updated_at"])
+        # เว้นช่วงให้ query ของ request อื่นได้ lock
+        time.sleep(settings.ACCOUNT_DELETE_BATCH_PAUSE)
+
+
+def _delete_likes(pks):
+    rows = Post.likes.through.objects.filter(pk__in=pks)
+    stats.remove_likes_received(rows)
+    trending.remove_likes(rows)
+    rows.delete()
+
+def _delete_histories(job, pks):
+    files = [f for f in GenerateHistory.objects.filter(pk__in=pks).values_list("image_file", flat=True) if f]
+    GenerateHistory.objects.filter(pk__in=pks).delete()
+    unlink_files(files)  # อยู่ใน background อยู่แล้ว
+    job.progress["files"] = job.progress.get("files", 0) + len(files)
+
+
+def _claimable():
+    """pending / failed หรือ running ที่ไม่คืบหน้าเกิน ACCOUNT_DELETE_STALE_AFTER (worker ตายกลางทาง)"""
+    stale_before = timezone.now() - timedelta(seconds=settings.ACCOUNT_DELETE_STALE_AFTER)
+    return Q(status__in=[AccountDeletion.STATUS_PENDING, AccountDeletion.STATUS_FAILED]) | Q(
+        status=AccountDeletion.STATUS_RUNNING, updated_at__lt=stale_before
+    )
+
+def claim_deletion(job_id):
+    """เปลี่ยนเป็น running แบบ atomic -> True ถ้าฝั่งนี้ได้สิทธิ์ทำงานนี้"""
+    return AccountDeletion.objects.filter(_claimable(), pk=job_id).update(
+        status=AccountDeletion.STATUS_RUNNING, updated_at=timezone.now()
+    ) == 1
+
+
+def run_account_deletion(job_id):
+    if not claim_deletion(job_id):
+        return   # เสร็จแล้ว หรือมี worker อื่นกำลังทำอยู่
+    job = AccountDeletion.objects.get(pk=job_id)
+    uid = job.user_id
+
+    try:
+        likes = Post.likes.through.objects
+        # like ของผู้ใช้ + like ที่คนอื่นกดให้โพสต์ของผู้ใช้ (through ไม่มี signal -> หัก UserStats เอง)
+        _delete_in_batches(job, "likes", likes.filter(user_id=uid), _delete_likes)
+        _delete_in_batches(job, "likes", likes.filter(post__user_id=uid), _delete_likes)
+        # comment ของผู้ใช้ และ comment ของคนอื่นบนโพสต์ของผู้ใช้ (ให้การลบโพสต์แต่ละ batch เบา)
+        _delete_in_batches(job, "comments", Comment.objects.filter(user_id=uid),
+                           lambda pks: Comment.objects.filter(pk__in=pks).delete())
+        _delete_in_batches(job, "comments", Comment.objects.filter(post__user_id=uid),
+                           lambda pks: Comment.objects.filter(pk__in=pks).delete())
+        _delete_in_batches(job, "posts", Post.objects.filter(user_id=uid),
+                           lambda pks: Post.objects.filter(pk__in=pks).delete())
+        _delete_in_batches(job, "histories", GenerateHistory.objects.filter(user_id=uid),
+                           lambda pks: _delete_histories(job, pks))
+        GenerationJob.objects.filter(user_id=uid).delete()
+
+        # เหลือแถวเล็ก ๆ (profile, social account, session ...) -> ลบ user ตามปกติ
+        profile_image = Profile.objects.filter(user_id=uid).values_list("profile_image", flat=True).first()
+        User.objects.filter(pk=uid).delete()
+        if profile_image and profile_image != Profile._meta.get_field("profile_image").default:
+            unlink_files([profile_image])
+    except Exception as e:
+        job.status = AccountDeletion.STATUS_FAILED
+        job.error = str(e)
+        job.save(update_fields=["status", "error", "progress", "updated_at"])
+        raise
+
+    job.status = AccountDeletion.STATUS_DONE
+    job.error = ""
+    job.save(update_fields=["status", "error", "progress", "updated_at"])
+    print(f"[AccountDeletion] {job.username} (#{uid}) done: {job.progress}")
+
+
+def resume_account_deletions():
+    """ทำงานลบที่ค้าง/ล้มเหลวต่อ (ทุกขั้นตอนทำซ้ำได้) คืนจำนวนงาน / running ที่ยังคืบหน้าอยู่ไม่ยุ่ง"""
+    jobs = list(AccountDeletion.objects.filter(_claimable()).values_list("pk", flat=True))
+    for job_id in jobs:
+        try:
+            run_account_deletion(job_id)
+        except Exception as e:
+            print(f"[AccountDeletion] job {job_id} failed: {e}")
+    return len(jobs)
@@ -0,0 +1,113 @@
+import csv
+import os
+import re
+import time
+import uuid
+import zlib
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from . import background
+
+
+# ==========================================
+# CSV export แบบ streaming (หน่วยความจำคงที่ ไม่ขึ้นกับจำนวนแถว)
+# ==========================================
+# rows ต้องเป็น iterator ที่ดึงจาก DB ทีละ chunk (queryset.iterator(chunk_size=...))
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """pseudo-buffer: csv.writer เขียนแล้วคืนค่าบรรทัดนั้นกลับมาเลย ไม่เก็บสะสม"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(header, rows, gzip=False):
+    """yield bytes ของ CSV ทีละบรรทัด (หรือทีละก้อนที่บีบอัดแล้วถ้า gzip=True)"""
+    writer = csv.writer(Echo())
+    compressor = zlib.compressobj(wbits=31) if gzip else None  # wbits=31 -> gzip container
+
+    def emit(text):
+        data = text.encode("utf-8")
+        if compressor is None:
+            return data
+        return compressor.compress(data)
+
+    yield emit(writer.writerow(header))
+    for row in rows:
+        chunk = emit(writer.writerow(row))
+        if chunk:
+            yield chunk
+    if compressor is not None:
+        yield compressor.flush()
+
+
+def csv_streaming_response(filename, header, rows, gzip=False):
+    if gzip:
+        filename += ".gz"
+        resp = StreamingHttpResponse(iter_csv(header, rows, gzip=True), content_type="application/gzip")
+    else:
+        resp = StreamingHttpResponse(iter_csv(header, rows), content_type="text/csv; charset=utf-8")
+    resp["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return resp
+
+
+# ---------------- background export -> ไฟล์ ----------------
+def export_path(name):
+    """path ของไฟล์ export (อยู่นอก MEDIA_ROOT: ดาวน์โหลดได้เฉพาะผ่าน view ของ admin)"""
+    if not re.fullmatch(r"[\w.-]+", name):
+        raise ValueError("invalid export name")
+    return os.path.join(settings.EXPORT_ROOT, name)
+
+def cleanup_exports(max_age_hours=None, dry_run=False):
+    """ลบไฟล์ export (รวม .part ที่ค้างจาก process ตาย) ที่เก่ากว่า max_age_hours คืน (จำนวนไฟล์, bytes)"""
+    hours = settings.EXPORT_MAX_AGE_HOURS if max_age_hours is None else max_age_hours
+    cutoff = time.time() - hours * 3600
+    count = size = 0
+    try:
+        it = os.scandir(settings.EXPORT_ROOT)
+    except FileNotFoundError:
+        return count, size
+    with it:
+        for entry in it:
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime > cutoff:
+                continue
+            if not dry_run:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+            count += 1
+            size += stat.st_size
+    return count, size
+
+def _write_export(name, header, rows_factory, gzip):
+    cleanup_exports()   # เก็บกวาดไฟล์เก่าทุกครั้งที่มี export ใหม่ (อยู่ใน background อยู่แล้ว)
+    path = export_path(name)
+    tmp = path + ".part"
+    os.makedirs(settings.EXPORT_ROOT, exist_ok=True)
+    try:
+        with open(tmp, "wb") as f:
+            for chunk in iter_csv(header, rows_factory(), gzip=gzip):
+                f.write(chunk)
+        os.replace(tmp, path)  # ไฟล์ปรากฏเมื่อเขียนเสร็จเท่านั้น
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    print(f"[Export] wrote {path}")
+
+def start_background_export(filename, header, rows_factory, gzip=True):
+    """
+    เขียน CSV ลงไฟล์ใน background worker แล้วคืนชื่อไฟล์ (ดาวน์โหลดที่ admin_export_download)
+    rows_factory = callable ที่คืน iterator ของแถว (ถูกเรียกใน worker thread)
+    """
+    name = f"{uuid.uuid4().hex[:12]}_{filename}" + (".gz" if gzip else "")
+    background.submit(_write_export, name, header, rows_factory, gzip)
+    return name
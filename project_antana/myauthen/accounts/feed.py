@@ -0,0 +1,92 @@
+from django.db import transaction
+from django.db.models import Count, prefetch_related_objects
+
+from .models import Comment, Post
+from .versions import bump_version, get_versions
+
+
+# ==========================================
+# การ์ดโพสต์ (post_feed / profile / user_profile)
+# ==========================================
+# template เดิมเรียก post.likes.all / post.likes.count / post.comments.count ต่อการ์ด
+# = 3 query ต่อโพสต์ และโหลดผู้กดไลก์ทุกคนมาเทียบกับ request.user
+# attach_post_stats() ดึงทั้งหน้าในไม่กี่ query แล้วแปะค่าไว้บน object:
+#   post.like_count, post.comment_count, post.liked_by_me (+ prefetch tags)
+#
+# ส่วนที่ไม่ขึ้นกับผู้ชม (ผู้เขียน / title / caption / ภาพ / tags) cache เป็น fragment ด้วย {% cache %}
+# key = post.card_version (version ของโพสต์ . ผู้เขียน . ทุกการ์ด) -> แก้อะไรก็ bump version แล้ว render ใหม่แค่ใบนั้น
+# ส่วนที่เปลี่ยนบ่อย/ต่อผู้ชม (จำนวน like/comment, สถานะไลก์, เมนูเจ้าของ, เวลา) render นอก fragment เสมอ
+
+# FK ที่การ์ดใช้ (ชื่อ/รูปเจ้าของโพสต์ และภาพจาก history)
+POST_CARD_RELATED = ("user__profile", "history")
+
+POST_CARDS_VERSION = "post_cards"   # ทุกการ์ด (เช่น แก้ชื่อ/หมวดของ tag)
+
+def post_card_version_name(post_id):
+    return f"post_card:{post_id}"
+
+def author_card_version_name(user_id):
+    return f"post_author:{user_id}"
+
+def bump_after_commit(names):
+    # bump ก่อน commit -> request อื่นอาจ render ข้อมูลเก่าแล้ว cache ไว้ใต้ version ใหม่
+    transaction.on_commit(lambda: [bump_version(name) for name in names])
+
+def bump_post_cards(post_ids):
+    bump_after_commit([post_card_version_name(pk) for pk in post_ids])
+
+def bump_author_cards(user_id):
+    bump_after_commit([author_card_version_name(user_id)])
+
+def bump_all_post_cards():
+    bump_after_commit([POST_CARDS_VERSION])
+
+
+def card_posts(qs):
+    """queryset ของโพสต์ที่ join FK ที่การ์ดต้องใช้แล้ว"""
+    return qs.select_related(*POST_CARD_RELATED)
+
+
+def _counts(qs):
+    return dict(qs.values("post_id").annotate(n=Count("pk")).order_by().values_list("post_id", "n"))
+
+
+def liked_post_ids(user, post_ids):
+    """id ของโพสต์ใน post_ids ที่ user กดไลก์ไว้ (1 query)"""
+    if not user.is_authenticated or not post_ids:
+        return set()
+    return set(
+        Post.likes.through.objects.filter(user_id=user.pk, post_id__in=post_ids).values_list("post_id", flat=True)
+    )
+
+
+def attach_post_stats(posts, viewer):
+    """
+    รับโพสต์หนึ่งหน้า คืน list เดิมที่แปะ like_count / comment_count / liked_by_me / card_version แล้ว
+    จำนวน query คงที่ (like, comment, liked-by-me, tags) + cache get_many 1 ครั้ง ไม่ขึ้นกับจำนวนโพสต์
+    """
+    posts = list(posts)
+    ids = [p.pk for p in posts]
+    if not ids:
+        return posts
+
+    like_counts = _counts(Post.likes.through.objects.filter(post_id__in=ids))
+    comment_counts = _counts(Comment.objects.filter(post_id__in=ids))
+    liked = liked_post_ids(viewer, ids)
+    prefetch_related_objects(posts, "tags")
+    versions = get_versions(
+        [POST_CARDS_VERSION]
+        + [post_card_version_name(pk) for pk in ids]
+        + [author_card_version_name(uid) for uid in {p.user_id for p in posts}]
+    )
+
+    for post in posts:
+        post.like_count = like_counts.get(post.pk, 0)
+        post.comment_count = comment_counts.get(post.pk, 0)
+        post.liked_by_me = post.pk in liked
+        post.card_version = "{}.{}.{}".format(
+            versions[post_card_version_name(post.pk)],
+            versions[author_card_version_name(post.user_id)],
+            versions[POST_CARDS_VERSION],
+        )
+    return posts
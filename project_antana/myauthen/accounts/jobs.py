@@ -0,0 +1,226 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from . import background, prompt_index, stats
+from .comfy import _get_json, output_image_urls, queued_prompt_ids
+from .models import GenerateHistory, GenerationJob
+
+
+# ==========================================
+# งาน generate ที่ค้างอยู่บน ComfyUI (persisted) + reconciler
+# ==========================================
+
+def record_submitted(prompt_id, backend, entries):
+    """
+    บันทึกงานที่ส่งไป ComfyUI แล้ว
+    entries: [{"user_id", "model_name", "positive", "negative", "seed", "output_offset", "output_count"}, ...]
+    คืนลิสต์ id ของ GenerationJob ตามลำดับ entries
+    """
+    rows = GenerationJob.objects.bulk_create([
+        GenerationJob(
+            user_id         = e["user_id"],
+            prompt_id       = prompt_id,
+            backend         = backend,
+            output_offset   = e.get("output_offset", 0),
+            output_count    = e.get("output_count"),
+            model_name      = e["model_name"],
+            positive_prompt = e["positive"],
+            negative_prompt = e["negative"],
+            seed            = e["seed"],
+        )
+        for e in entries
+    ])
+    return [row.id for row in rows]
+
+def claim_job(job_id, status=GenerationJob.STATUS_DONE):
+    """
+    เปลี่ยนสถานะจาก pending แบบ atomic -> True ถ้าฝั่งนี้ได้สิทธิ์บันทึกผล
+    (กัน generate_view กับ reconciler บันทึก GenerateHistory ซ้ำกัน)
+    """
+    if not job_id:
+        return True
+    return GenerationJob.objects.filter(pk=job_id, status=GenerationJob.STATUS_PENDING).update(status=status) == 1
+
+def _download(url):
+    try:
+        resp = requests.get(url, timeout=30)
+        if resp.status_code == 200:
+            return resp.content
+        print(f"Error downloading image: {url} -> {resp.status_code}")
+    except Exception as e:
+        print(f"Error downloading image: {e}")
+    return None
+
+def save_generated_images(user_id, model_name, positive, negative, seed, image_urls):
+    """
+    ดาวน์โหลดภาพจาก ComfyUI (พร้อมกัน) แล้วบันทึกเป็น GenerateHistory ทีเดียวทั้ง batch
+    คืน (history_ids, image_urls) โดย URL ที่บันทึกไฟล์สำเร็จจะเป็น MEDIA URL
+    """
+    image_urls = list(image_urls)
+    if not image_urls:
+        return [], []
+    with ThreadPoolExecutor(max_workers=min(len(image_urls), 4)) as pool:
+        contents = list(pool.map(_download, image_urls))
+    return store_generated_images(user_id, model_name, positive, negative, seed, list(zip(image_urls, contents)))
+
+def store_generated_images(user_id, model_name, positive, negative, seed, images):
+    """
+    images: [(comfy_url, bytes | None), ...]
+    เขียนไฟล์ลง storage ก่อน แล้ว INSERT ทุกแถวใน transaction เดียว (bulk_create)
+    -> DB write 1 ครั้งต่อ batch แทน create + save + save ต่อภาพ
+    ภาพที่ดาวน์โหลดไม่ได้ยังมีแถวใน History โดยเก็บ URL ของ ComfyUI ไว้
+    """
+    rows = []
+    stored = []
+    storage = GenerateHistory._meta.get_field("image_file").storage
+    try:
+        for url, content in images:
+            h = GenerateHistory(
+                user_id          = user_id,
+                model_name       = model_name,
+                positive_prompt  = positive,
+                negative_prompt  = negative,
+                seed             = seed,
+                image_url        = url,
+            )
+            if content is not None:
+                name = h.image_file.field.generate_filename(h, f"gen_{user_id}_{uuid.uuid4().hex[:8]}.png")
+                h.image_file.name = storage.save(name, ContentFile(content))
+                stored.append(h.image_file.name)
+                h.image_url = h.image_file.url
+            rows.append(h)
+
+        with transaction.atomic():
+            GenerateHistory.objects.bulk_create(rows)
+            # bulk_create ไม่ส่ง post_save -> อัปเดต rollup dashboard เอง
+            if rows:
+                stats.record_generations(rows[0].created_at, model_name, len(rows))
+                stats.bump_user(user_id, "generations", len(rows))
+                transaction.on_commit(prompt_index.mark_stale)
+    except Exception:
+        # insert ไม่สำเร็จ -> ไม่ทิ้งไฟล์ที่ไม่มีแถวอ้างถึง
+        for name in stored:
+            storage.delete(name)
+        raise
+
+    return [h.id for h in rows], [h.image_url for h in rows]
+
+DELETE_BATCH_SIZE = 500
+
+def unlink_files(names):
+    storage = GenerateHistory._meta.get_field("image_file").storage
+    for name in names:
+        try:
+            storage.delete(name)
+        except Exception as e:
+            print(f"[History] could not delete file {name}: {e}")
+
+def delete_histories(user_id, ids):
+    """
+    ลบ GenerateHistory หลายรายการของผู้ใช้ (ตรวจเจ้าของด้วย query เดียว)
+    ลบแถวทีละ DELETE_BATCH_SIZE แล้วส่งการลบไฟล์ภาพไปทำใน background worker
+    คืนจำนวนที่ลบ หรือ None ถ้ามี id ที่ไม่ใช่ของผู้ใช้ (ไม่ลบอะไรเลย)
+    """
+    ids = set(ids)
+    owned = dict(
+        GenerateHistory.objects.filter(user_id=user_id, pk__in=ids).values_list("pk", "image_file")
+    )
+    if len(owned) != len(ids):
+        return None
+
+    pks = sorted(owned)
+    for i in range(0, len(pks), DELETE_BATCH_SIZE):
+        # queryset.delete() ยังส่ง signal ต่อแถว (rollup สถิติ) และลบ Post ที่อ้างถึงแบบ cascade
+        GenerateHistory.objects.filter(pk__in=pks[i:i + DELETE_BATCH_SIZE]).delete()
+
+    files = [name for name in owned.values() if name]
+    if files:
+        background.submit(unlink_files, files)
+    return len(pks)
+
+def reconcile():
+    """
+    ตรวจงาน pending ที่เก่ากว่า GENERATE_JOB_RECONCILE_AFTER วินาที (ไม่มี request ไหนรออยู่แล้ว)
+      - มี outputs ใน /history -> นำเข้าเป็น GenerateHistory
+      - error หรือหายไปจาก ComfyUI (ไม่อยู่ทั้งคิวและ history) -> failed
+      - ยังอยู่ในคิว -> รอรอบถัดไป
+    แล้วลบงานที่จบแล้วเก่ากว่า GENERATE_JOB_KEEP_HOURS
+    """
+    now = timezone.now()
+    pending = GenerationJob.objects.filter(
+        status=GenerationJob.STATUS_PENDING,
+        created_at__lt=now - timedelta(seconds=settings.GENERATE_JOB_RECONCILE_AFTER),
+    )
+    stats = {"imported": 0, "failed": 0, "waiting": 0, "removed": 0}
+
+    for backend in pending.values_list("backend", flat=True).distinct():
+        try:
+            still_queued = queued_prompt_ids(backend)
+        except RuntimeError as e:
+            print(f"[Reconcile] {backend} unreachable: {e}")
+            continue
+
+        histories = {}
+        for job in pending.filter(backend=backend).order_by("created_at"):
+            if job.prompt_id in still_queued:
+                stats["waiting"] += 1
+                continue
+            if job.prompt_id not in histories:
+                try:
+                    data = _get_json(f"{backend}/history/{job.prompt_id}", timeout=15)
+                except RuntimeError as e:
+                    print(f"[Reconcile] history {job.prompt_id}: {e}")
+                    continue
+                histories[job.prompt_id] = data.get(job.prompt_id) or {}
+
+            image_urls = output_image_urls(histories[job.prompt_id].get("outputs", {}), job.output_node, host=backend)
+            if job.output_count is not None:
+                image_urls = image_urls[job.output_offset:job.output_offset + job.output_count]
+            if not image_urls:
+                if claim_job(job.id, GenerationJob.STATUS_FAILED):
+                    stats["failed"] += 1
+                continue
+            if claim_job(job.id):
+                save_generated_images(
+                    job.user_id, job.model_name, job.positive_prompt, job.negative_prompt, job.seed, image_urls
+                )
+                stats["imported"] += 1
+
+    stats["removed"], _ = GenerationJob.objects.filter(
+        status__in=[GenerationJob.STATUS_DONE, GenerationJob.STATUS_FAILED],
+        updated_at__lt=now - timedelta(hours=settings.GENERATE_JOB_KEEP_HOURS),
+    ).delete()
+    return stats
+
+
+_reconciler = None
+
+def _reconcile_loop():
+    while True:
+        close_old_connections()
+        try:
+            stats = reconcile()
+            if stats["imported"] or stats["failed"]:
+                print(f"[Reconcile] {stats}")
+        except Exception as e:
+            # เช่น ยังไม่ได้ migrate ตาราง
+            print(f"[Reconcile] error: {e}")
+        close_old_connections()
+        time.sleep(settings.GENERATE_RECONCILE_INTERVAL)
+
+def start_reconciler():
+    """เรียกตอน web process เริ่ม (wsgi.py / asgi.py): เก็บงานที่ค้างจาก process ก่อนหน้า"""
+    global _reconciler
+    if not settings.GENERATE_RECONCILE_ON_STARTUP or _reconciler is not None:
+        return
+    _reconciler = threading.Thread(target=_reconcile_loop, name="comfy-reconcile", daemon=True)
+    _reconciler.start()
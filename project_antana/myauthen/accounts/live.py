@@ -0,0 +1,97 @@
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+# ==========================================
+# Live counts: ส่ง delta ของจำนวน like / comment ให้หน้าเว็บที่เปิดโพสต์นั้นอยู่
+# ==========================================
+# publisher (signals.py) -> pub/sub -> stream SSE ต่อ client (views.post_live_counts)
+# client แต่ละตัวอ่านคิวของตัวเองทุก LIVE_COUNTS_INTERVAL วินาที แล้วรวม delta ของรอบนั้นเป็นข้อความเดียว
+# pub/sub เลือกได้จาก settings.LIVE_PUBSUB_BACKEND (ค่าเริ่มต้น = ใน process เดียว)
+# ถ้ารันหลาย process ให้เขียน backend ที่มี publish/subscribe/unsubscribe แบบเดียวกันบน broker (เช่น Redis)
+
+ENGAGEMENT_CHANNEL = "engagement"
+SUBSCRIPTION_MAX_PENDING = 10000   # client ที่อ่านไม่ทัน -> ทิ้งข้อความเก่าสุด
+
+
+class Subscription:
+    def __init__(self, channel):
+        self.channel = channel
+        self._lock = threading.Lock()
+        self._pending = deque(maxlen=SUBSCRIPTION_MAX_PENDING)
+
+    def put(self, message):
+        with self._lock:
+            self._pending.append(message)
+
+    def drain(self):
+        """คืนข้อความที่ค้างทั้งหมด (ไม่บล็อก เรียกจาก event loop ได้)"""
+        with self._lock:
+            messages = list(self._pending)
+            self._pending.clear()
+        return messages
+
+
+class LocalPubSub:
+    """pub/sub ใน process: publish จาก thread ใดก็ได้ (view แบบ sync), subscriber อ่านด้วย drain()"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}   # channel -> set(Subscription)
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for sub in subscribers:
+            sub.put(message)
+
+    def subscribe(self, channel):
+        sub = Subscription(channel)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subscribers = self._subscribers.get(sub.channel)
+            if subscribers is not None:
+                subscribers.discard(sub)
+                if not subscribers:
+                    del self._subscribers[sub.channel]
+
+
+_pubsub = None
+_pubsub_lock = threading.Lock()
+
+def get_pubsub():
+    global _pubsub
+    with _pubsub_lock:
+        if _pubsub is None:
+            _pubsub = import_string(settings.LIVE_PUBSUB_BACKEND)()
+        return _pubsub
+
+
+def publish_count(post_id, field, delta, actor_id=None):
+    """
+    แจ้งว่าจำนวน field ("likes" | "comments") ของโพสต์เปลี่ยนไป delta หลัง transaction commit
+    actor_id = ผู้ที่ทำให้เปลี่ยน (หน้าของเขาอัปเดตจาก response ของตัวเองแล้ว -> ไม่ส่งซ้ำให้)
+    """
+    if not delta:
+        return
+    message = {"post": post_id, "field": field, "delta": delta, "actor": actor_id}
+    transaction.on_commit(lambda: get_pubsub().publish(ENGAGEMENT_CHANNEL, message))
+
+
+def coalesce(messages, post_ids, viewer_id=None):
+    """รวม delta ของรอบนี้เฉพาะโพสต์ที่ client เห็น -> {post_id: {"likes": n, "comments": n}}"""
+    counts = {}
+    for m in messages:
+        if m["post"] not in post_ids or (viewer_id is not None and m["actor"] == viewer_id):
+            continue
+        entry = counts.setdefault(m["post"], {"likes": 0, "comments": 0})
+        entry[m["field"]] += m["delta"]
+    return {post_id: entry for post_id, entry in counts.items() if entry["likes"] or entry["comments"]}
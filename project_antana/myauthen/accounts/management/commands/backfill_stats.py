@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from accounts.stats import backfill, backfill_user_stats
+
+
+class Command(BaseCommand):
+    help = "คำนวณ rollup สถิติรายวันของ Dashboard และ UserStats ของหัวโปรไฟล์ใหม่ทั้งหมดจากตารางจริง (รันครั้งแรกหลัง migrate หรือเมื่อค่าเพี้ยน)"
+
+    def handle(self, *args, **options):
+        result = backfill()
+        users = backfill_user_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"days={result['days']} model_rows={result['models']} tag_rows={result['tags']} user_rows={users}"
+        ))
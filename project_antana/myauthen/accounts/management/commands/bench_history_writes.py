@@ -0,0 +1,78 @@
+import tempfile
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+
+from accounts.jobs import store_generated_images
+from accounts.models import GenerateHistory
+
+
+WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE")
+
+
+class _WriteCounter:
+    def __init__(self):
+        self.writes = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith(WRITE_PREFIXES):
+            self.writes += 1
+        return execute(sql, params, many, context)
+
+
+def _legacy_store(user_id, model_name, positive, negative, seed, images):
+    """เส้นทางเดิมของ generate_view: create + image_file.save + save ต่อภาพ (ไว้เทียบผล)"""
+    ids = []
+    for url, content in images:
+        h = GenerateHistory.objects.create(
+            user_id=user_id, model_name=model_name, positive_prompt=positive,
+            negative_prompt=negative, seed=seed, image_url=url,
+        )
+        h.image_file.save(f"gen_{user_id}_{uuid.uuid4().hex[:8]}.png", ContentFile(content), save=True)
+        h.image_url = h.image_file.url
+        h.save()
+        ids.append(h.id)
+    return ids
+
+
+class Command(BaseCommand):
+    help = "เทียบจำนวน DB write และเวลาในการบันทึก GenerateHistory (เดิม vs bulk) สำหรับ batch 1-8"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=5, help="จำนวนรอบต่อ batch size")
+        parser.add_argument("--max-batch", type=int, default=8)
+
+    def handle(self, *args, **options):
+        rounds = options["rounds"]
+        image = b"\x89PNG\r\n\x1a\n" + b"\0" * 64 * 1024  # ภาพปลอมขนาด ~64KB
+
+        user = User.objects.order_by("id").first()
+        if user is None:
+            self.stderr.write("ต้องมีผู้ใช้อย่างน้อย 1 คนในฐานข้อมูล")
+            return
+
+        self.stdout.write(f"{'batch':>5} | {'legacy writes':>13} {'legacy ms':>10} | {'bulk writes':>11} {'bulk ms':>8}")
+        # ไฟล์ลง temp dir และทุกแถวถูก rollback -> ไม่เหลือข้อมูลทดสอบ
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            for batch in range(1, options["max_batch"] + 1):
+                images = [(f"http://comfy.invalid/view?filename={i}.png", image) for i in range(batch)]
+                results = []
+                for store in (_legacy_store, store_generated_images):
+                    counter = _WriteCounter()
+                    elapsed = 0.0
+                    for _ in range(rounds):
+                        with transaction.atomic():
+                            with connection.execute_wrapper(counter):
+                                start = time.perf_counter()
+                                store(user.id, "bench", "bench prompt", "", 1, images)
+                                elapsed += time.perf_counter() - start
+                            transaction.set_rollback(True)
+                    results.append((counter.writes / rounds, elapsed * 1000 / rounds))
+
+                (lw, lms), (bw, bms) = results
+                self.stdout.write(f"{batch:>5} | {lw:>13.0f} {lms:>10.2f} | {bw:>11.0f} {bms:>8.2f}")
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from accounts.prompt_index import BUILD_BATCH, PromptIndex, configured_embedder
+
+
+class Command(BaseCommand):
+    help = (
+        "embed positive_prompt ของ GenerateHistory ทั้งหมดแล้วเขียน index (float32 + LSH) ลง PROMPT_INDEX_PATH "
+        "ต้องรันก่อนเปิดค้นหา prompt (ไม่มีไฟล์ = ค้นหาตอบ 503) "
+        "process ที่รันอยู่โหลดไฟล์ใหม่เองภายใน PROMPT_INDEX_REFRESH วินาที ให้ cron รันเป็นระยะ เช่น วันละครั้ง"
+    )
+
+    def handle(self, *args, **options):
+        embedder = configured_embedder()
+        self.stdout.write(f"embedder={embedder.name}")
+
+        def on_progress(rows):
+            if rows % (BUILD_BATCH * 25) < BUILD_BATCH:
+                self.stdout.write(f"  {rows} rows")
+
+        header = PromptIndex.build(settings.PROMPT_INDEX_PATH, embedder, on_progress=on_progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"rows={header['rows']} dim={header['dim']} watermark={header['watermark']} -> {settings.PROMPT_INDEX_PATH}"
+        ))
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from accounts.related import RelatedIndex
+
+
+class Command(BaseCommand):
+    help = (
+        "สร้าง index tag ของโพสต์สำหรับ related posts จาก DB แล้วเขียนไฟล์ RELATED_INDEX_PATH "
+        "(process ที่รันอยู่โหลดไฟล์ใหม่เองภายใน RELATED_INDEX_REFRESH วินาที) ให้ cron รันเป็นระยะ เช่น วันละครั้ง"
+    )
+
+    def handle(self, *args, **options):
+        header = RelatedIndex.build().save(settings.RELATED_INDEX_PATH)
+        self.stdout.write(self.style.SUCCESS(
+            f"posts={header['posts']} pairs={header['pairs']} watermark={header['watermark']} -> {settings.RELATED_INDEX_PATH}"
+        ))
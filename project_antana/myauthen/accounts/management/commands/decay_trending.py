@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from accounts.trending import decay, rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "ลดคะแนน trending (PostScore) ตามเวลาที่ผ่านไป และลบโพสต์ที่คะแนนต่ำออกจากตาราง "
+        "ให้ cron รันทุก --minutes นาที (ค่าเดียวกับที่ส่งมา); --rebuild = คำนวณใหม่ทั้งหมดจาก like/comment"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--minutes", type=float, default=60, help="ช่วงเวลาตั้งแต่รอบก่อน (default 60)")
+        parser.add_argument("--rebuild", action="store_true", help="คำนวณคะแนนใหม่ทั้งตาราง (ครั้งแรกหลัง migrate)")
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            rows = rebuild()
+            self.stdout.write(self.style.SUCCESS(f"rebuilt rows={rows}"))
+            return
+        decayed, pruned = decay(options["minutes"])
+        self.stdout.write(self.style.SUCCESS(f"decayed={decayed} pruned={pruned}"))
@@ -0,0 +1,70 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from accounts import stats
+from accounts.models import Comment, GenerateHistory, Post
+
+
+def hot_queries():
+    """query ที่วิ่งบ่อยที่สุดของหน้าเว็บ -> ต้องใช้ index เสมอ (ดู Meta.indexes ใน models.py)"""
+    start, end = stats.day_range(stats.local_date())
+    return [
+        ("history ของผู้ใช้ (generate_view)",
+         GenerateHistory.objects.filter(user_id=1).order_by("-created_at")[:30]),
+        ("ภาพล่าสุด (dashboard)",
+         GenerateHistory.objects.order_by("-created_at")[:5]),
+        ("ภาพวันนี้ (range แทน __date)",
+         GenerateHistory.objects.filter(created_at__gte=start, created_at__lt=end)),
+        ("โพสต์ของผู้ใช้ (profile)",
+         Post.objects.filter(user_id=1).order_by("-created_at")),
+        ("feed (community)",
+         Post.objects.order_by("-created_at")[:20]),
+        ("คอมเมนต์ของโพสต์ (post_detail)",
+         Comment.objects.filter(post_id=1).order_by("-created_at")),
+    ]
+
+
+def full_scans(plan, tables):
+    """คืนชื่อตารางที่ถูก scan ทั้งตารางใน plan"""
+    if connection.vendor == "postgresql":
+        pattern = r"Seq Scan on (\w+)"
+    else:
+        # SQLite: "SCAN table" = อ่านทั้งตาราง, "SCAN table USING INDEX ..." / "SEARCH ..." = ใช้ index
+        pattern = r"\bSCAN (\w+)(?! USING (?:COVERING )?INDEX)"
+    return sorted({t for t in re.findall(pattern, plan) if t in tables})
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN query หลักของ GenerateHistory / Post / Comment แล้ว fail ถ้ามีการ scan ทั้งตาราง "
+        "(PostgreSQL: ปิด enable_seqscan เพื่อให้ผลไม่ขึ้นกับขนาดข้อมูลทดสอบ)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verbose-plan", action="store_true", help="แสดง plan เต็มของทุก query")
+
+    def handle(self, *args, **options):
+        tables = {m._meta.db_table for m in (GenerateHistory, Post, Comment)}
+        failures = []
+
+        with transaction.atomic():
+            if connection.vendor == "postgresql":
+                # ตารางเล็กหรือว่าง planner จะเลือก Seq Scan เสมอ -> บังคับให้เห็นว่ามี index ที่ใช้ได้หรือไม่
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+
+            for label, qs in hot_queries():
+                plan = qs.explain()
+                scans = full_scans(plan, tables)
+                if scans:
+                    failures.append(label)
+                    self.stdout.write(self.style.ERROR(f"FULL SCAN  {label}: {', '.join(scans)}"))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"index      {label}"))
+                if options["verbose_plan"] or scans:
+                    self.stdout.write(plan)
+
+        if failures:
+            raise CommandError(f"{len(failures)} query ไม่ได้ใช้ index")
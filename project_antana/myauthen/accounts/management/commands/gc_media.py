@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from accounts.exports import cleanup_exports
+from accounts.media_gc import GC_BATCH_SIZE, collect_garbage
+
+
+class Command(BaseCommand):
+    help = (
+        "ลบไฟล์ภาพใน MEDIA_ROOT (generated_images/, user_<id>/) ที่ไม่มี GenerateHistory/Profile อ้างถึง "
+        "และไฟล์ export ที่เก่ากว่า EXPORT_MAX_AGE_HOURS / ค่าเริ่มต้นเป็น dry-run: ใส่ --delete เพื่อลบจริง"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--delete", action="store_true", help="ลบไฟล์จริง (ไม่ใส่ = รายงานอย่างเดียว)")
+        parser.add_argument("--min-age", type=float, default=24, help="ข้ามไฟล์ที่ใหม่กว่ากี่ชั่วโมง (default 24)")
+        parser.add_argument("--rate", type=float, default=50, help="ลบได้กี่ไฟล์ต่อวินาที (0 = ไม่จำกัด)")
+        parser.add_argument("--batch-size", type=int, default=GC_BATCH_SIZE)
+        parser.add_argument("--list", action="store_true", help="แสดงชื่อไฟล์ที่ไม่มีการอ้างอิงทุกไฟล์")
+
+    def handle(self, *args, **options):
+        dry_run = not options["delete"]
+
+        def on_orphan(name, size):
+            if options["list"]:
+                self.stdout.write(f"{'orphan' if dry_run else 'delete'}  {size:>10}  {name}")
+
+        result = collect_garbage(
+            dry_run=dry_run,
+            min_age_hours=options["min_age"],
+            rate=options["rate"],
+            batch_size=options["batch_size"],
+            on_orphan=on_orphan,
+        )
+        exports, export_bytes = cleanup_exports(dry_run=dry_run)
+        mb = result["bytes"] / (1024 * 1024)
+        summary = (
+            f"scanned={result['scanned']} orphans={result['orphans']} ({mb:.1f} MB) "
+            f"skipped_recent={result['skipped_recent']} deleted={result['deleted']} "
+            f"old_exports={exports} ({export_bytes / (1024 * 1024):.1f} MB)"
+        )
+        if dry_run:
+            summary += "  [dry-run: ใส่ --delete เพื่อลบจริง]"
+        self.stdout.write(self.style.SUCCESS(summary))
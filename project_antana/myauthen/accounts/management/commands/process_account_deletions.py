@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from accounts.deletion import resume_account_deletions
+
+
+class Command(BaseCommand):
+    help = "ลบบัญชีที่ค้างอยู่ใน AccountDeletion ต่อจนเสร็จ (เช่น process ตายระหว่างลบ)"
+
+    def handle(self, *args, **options):
+        count = resume_account_deletions()
+        self.stdout.write(self.style.SUCCESS(f"processed={count}"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from accounts.jobs import reconcile
+
+
+class Command(BaseCommand):
+    help = "นำภาพจากงาน ComfyUI ที่ค้างอยู่ (GenerationJob) เข้า GenerateHistory และล้างงานเก่า"
+
+    def handle(self, *args, **options):
+        stats = reconcile()
+        self.stdout.write(self.style.SUCCESS(
+            f"imported={stats['imported']} failed={stats['failed']} "
+            f"waiting={stats['waiting']} removed={stats['removed']}"
+        ))
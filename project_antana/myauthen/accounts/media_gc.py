@@ -0,0 +1,119 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from .models import GenerateHistory, Profile
+
+
+# ==========================================
+# Media GC: ลบไฟล์ใน MEDIA_ROOT ที่ไม่มีแถวไหนอ้างถึงแล้ว
+# ==========================================
+# - เดินไฟล์แบบ streaming (os.scandir) ไม่ list ทั้งโฟลเดอร์ไว้ในหน่วยความจำ
+# - ตรวจการอ้างอิงทีละ batch (WHERE image_file IN (...)) -> หน่วยความจำคงที่
+# - ข้ามไฟล์ที่ใหม่กว่า min_age (ไฟล์ที่ store_generated_images เขียนแล้วแต่ยังไม่ INSERT)
+# - จำกัดอัตราการลบ (ไฟล์/วินาที) ไม่ให้ดิสก์ทำงานหนักจนเว็บช้า
+# - ลบโฟลเดอร์ที่ว่างทุก batch -> หน่วยความจำไม่โตตามจำนวนโฟลเดอร์
+# รันผ่าน `manage.py gc_media` (cron) ไม่ใช่ background.submit: งานยาวหลายชั่วโมงได้ และค่าเริ่มต้นเป็น dry-run
+
+GC_ROOTS = ("generated_images",)   # + โฟลเดอร์ user_<id>/ ของรูปโปรไฟล์
+GC_BATCH_SIZE = 1000
+
+
+def _media_root():
+    return os.path.abspath(getattr(default_storage, "location", settings.MEDIA_ROOT))
+
+def _walk(path):
+    """yield DirEntry ของไฟล์ทั้งหมดใต้ path แบบ streaming"""
+    try:
+        it = os.scandir(path)
+    except FileNotFoundError:
+        return
+    with it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _walk(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+def iter_media_files(root=None):
+    """yield (ชื่อใน storage, DirEntry) ของไฟล์ที่อยู่ในขอบเขตของ GC"""
+    root = root or _media_root()
+    dirs = [os.path.join(root, d) for d in GC_ROOTS]
+    try:
+        with os.scandir(root) as it:
+            dirs += [e.path for e in it if e.is_dir(follow_symlinks=False) and e.name.startswith("user_")]
+    except FileNotFoundError:
+        return
+    for d in dirs:
+        for entry in _walk(d):
+            yield os.path.relpath(entry.path, root).replace(os.sep, "/"), entry
+
+def referenced(names):
+    """ชื่อไฟล์ใน names ที่ยังมีแถวอ้างถึง (2 query ต่อ batch)"""
+    names = list(names)
+    refs = set(GenerateHistory.objects.filter(image_file__in=names).values_list("image_file", flat=True))
+    refs.update(Profile.objects.filter(profile_image__in=names).values_list("profile_image", flat=True))
+    return refs
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _remove_empty_dirs(root, dirs):
+    """ลบโฟลเดอร์ที่ว่างหลังลบไฟล์ (เช่น generated_images/2024/01/02/) ไล่ขึ้นไปถึงโฟลเดอร์บนสุดของ GC"""
+    for d in sorted(dirs, key=len, reverse=True):
+        while os.path.dirname(d) != root:
+            try:
+                os.rmdir(d)  # ลบได้เฉพาะโฟลเดอร์ว่าง
+            except OSError:
+                break
+            d = os.path.dirname(d)
+
+def collect_garbage(dry_run=True, min_age_hours=24, rate=50, batch_size=GC_BATCH_SIZE, on_orphan=None):
+    """
+    คืน {"scanned", "orphans", "bytes", "deleted", "skipped_recent"}
+    on_orphan(name, size) ถูกเรียกกับทุกไฟล์ที่ไม่มีการอ้างอิง (ใช้ทำรายงาน dry-run)
+    rate = จำนวนไฟล์ที่ลบต่อวินาที (0 = ไม่จำกัด)
+    """
+    root = _media_root()
+    cutoff = time.time() - min_age_hours * 3600
+    result = {"scanned": 0, "orphans": 0, "bytes": 0, "deleted": 0, "skipped_recent": 0}
+    interval = 1.0 / rate if rate else 0
+
+    for batch in _batches(iter_media_files(root), batch_size):
+        touched = set()   # โฟลเดอร์ที่ลบไฟล์ใน batch นี้ (ไม่เกิน batch_size)
+        result["scanned"] += len(batch)
+        refs = referenced(name for name, _ in batch)
+        for name, entry in batch:
+            if name in refs:
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime > cutoff:
+                result["skipped_recent"] += 1
+                continue
+            result["orphans"] += 1
+            result["bytes"] += stat.st_size
+            if on_orphan:
+                on_orphan(name, stat.st_size)
+            if dry_run:
+                continue
+            try:
+                os.remove(entry.path)
+                result["deleted"] += 1
+                touched.add(os.path.dirname(entry.path))
+            except FileNotFoundError:
+                pass
+            if interval:
+                time.sleep(interval)
+        # โฟลเดอร์ที่ไฟล์ยังเหลือใน batch ถัดไปลบไม่ได้ตอนนี้ แต่จะอยู่ใน touched ของ batch นั้นอีกครั้ง
+        _remove_empty_dirs(root, touched)
+
+    return result
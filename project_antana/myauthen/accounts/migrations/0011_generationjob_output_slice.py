@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_post_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='output_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='generationjob',
+            name='output_offset',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
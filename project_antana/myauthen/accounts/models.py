@@ -13,7 +13,8 @@ class Profile(models.Model):
         return self.user.username
 
 class GenerateHistory(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # ไม่สร้าง index เดี่ยวของ FK: index (user, -created_at) ใน Meta ครอบคลุม filter(user=...) อยู่แล้ว
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     model_name = models.CharField(max_length=255)
     positive_prompt = models.TextField()
     negative_prompt = models.TextField(null=True, blank=True)
@@ -31,6 +32,14 @@ class GenerateHistory(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # ประวัติของผู้ใช้ล่าสุด (generate_view: filter(user=...).order_by('-created_at')[:30])
+            models.Index(fields=["user", "-created_at"], name="history_user_created_idx"),
+            # ภาพล่าสุดทั้งระบบ + ช่วงเวลา "วันนี้" ของ dashboard/rollup (btree ใช้ได้ทั้ง ORDER BY และ range)
+            models.Index(fields=["-created_at"], name="history_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.user.username} | {self.model_name} | {self.positive_prompt[:30]}"
     
@@ -43,7 +52,7 @@ class Tag(models.Model):
 
 
 class Post(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)  # ใช้ index (user, -created_at)
     history = models.ForeignKey(GenerateHistory, on_delete=models.CASCADE)
     title = models.CharField(max_length=100, blank=True)
     caption = models.TextField()
@@ -52,16 +61,28 @@ class Post(models.Model):
     likes = models.ManyToManyField(User, related_name='liked_posts', blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-created_at"], name="post_user_created_idx"),   # หน้าโปรไฟล์
+            models.Index(fields=["-created_at"], name="post_created_idx"),                # feed / community
+        ]
+
     # String representation for admin
 
     def __str__(self):
         return self.title or f"{self.user.username} - {self.caption[:30]}"
     
 class Comment(models.Model):
-    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments', db_index=False)  # ใช้ index (post, -created_at)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # คอมเมนต์ของโพสต์เรียงตามเวลา (post_detail) + COUNT ต่อโพสต์
+            models.Index(fields=["post", "-created_at"], name="comment_post_created_idx"),
+        ]
     
     def __str__(self):
         return f"{self.user.username}: {self.text[:30]}"
@@ -129,8 +150,137 @@ class GenerateDimension(models.Model):
         return f"{self.label} ({self.value})"
 
 
+# งาน generate ที่ส่งไป ComfyUI แล้ว (เก็บ prompt_id ไว้กู้ผลลัพธ์ถ้า web process ถูก restart ระหว่างรอ)
+class GenerationJob(models.Model):
+    STATUS_PENDING = "pending"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    prompt_id = models.CharField(max_length=64)
+    backend = models.CharField(max_length=200)                  # COMFY_HOST ที่รับงาน
+    output_node = models.CharField(max_length=20, default="7")  # SaveImage node ของงานนี้
+    # prompt ที่รวมหลายงานเป็น latent batch เดียว: ภาพของงานนี้คือ outputs[offset:offset + count]
+    output_offset = models.PositiveIntegerField(default=0)
+    output_count = models.PositiveIntegerField(null=True, blank=True)   # None = ทุกภาพของ node
+    model_name = models.CharField(max_length=255)
+    positive_prompt = models.TextField()
+    negative_prompt = models.TextField(null=True, blank=True)
+    seed = models.BigIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username} | {self.prompt_id} | {self.status}"
+
+
 
 
     
 
     
+
+
+# ==========================================
+# Rollup สถิติรายวันสำหรับ Dashboard (อัปเดตผ่าน signals, backfill ด้วย `manage.py backfill_stats`)
+# นับตามวันที่สร้างของแถวต้นทาง: ลบแถว -> ลดค่าของวันที่แถวนั้นถูกสร้าง
+# ==========================================
+class DailyStat(models.Model):
+    date = models.DateField(unique=True)
+    new_users = models.IntegerField(default=0)
+    posts = models.IntegerField(default=0)
+    comments = models.IntegerField(default=0)
+    generations = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.date}: users+{self.new_users} posts={self.posts} comments={self.comments} gen={self.generations}"
+
+
+class DailyModelUsage(models.Model):
+    date = models.DateField()
+    model_name = models.CharField(max_length=255)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("date", "model_name")
+
+    def __str__(self):
+        return f"{self.date} | {self.model_name}: {self.count}"
+
+
+class DailyTagUsage(models.Model):
+    date = models.DateField()
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name="daily_usage")
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("date", "tag")
+
+    def __str__(self):
+        return f"{self.date} | {self.tag.name}: {self.count}"
+
+
+# ==========================================
+# งานลบบัญชี (ทำใน background ทีละ batch ดู accounts/deletion.py)
+# ==========================================
+class AccountDeletion(models.Model):
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    # เก็บเป็นตัวเลข ไม่ใช่ FK: แถวนี้ต้องอยู่ต่อหลังผู้ใช้ถูกลบแล้ว
+    user_id = models.IntegerField(db_index=True)
+    username = models.CharField(max_length=150)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    progress = models.JSONField(default=dict, blank=True)   # {"likes": n, "comments": n, "posts": n, "histories": n, "files": n}
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.username} (#{self.user_id}) | {self.status}"
+
+
+
+# ==========================================
+# สถิติหัวโปรไฟล์ต่อผู้ใช้ (อัปเดตแบบ +/- ดู accounts/stats.py, signals.py)
+# ==========================================
+class UserStats(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    posts = models.IntegerField(default=0)
+    likes_received = models.IntegerField(default=0)      # like บนโพสต์ของผู้ใช้
+    comments_received = models.IntegerField(default=0)   # comment บนโพสต์ของผู้ใช้
+    generations = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"#{self.user_id}: posts={self.posts} likes={self.likes_received} comments={self.comments_received} gen={self.generations}"
+
+
+# ==========================================
+# คะแนน trending ต่อโพสต์ (เพิ่มตาม like/comment, ลดด้วย decay เป็นรอบ ดู accounts/trending.py)
+# ==========================================
+class PostScore(models.Model):
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name="score")
+    score = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-score", "-post"], name="post_score_rank_idx"),   # แท็บ Popular (keyset)
+        ]
+
+    def __str__(self):
+        return f"#{self.post_id}: {self.score:.3f}"
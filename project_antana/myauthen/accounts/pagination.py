@@ -0,0 +1,85 @@
+import base64
+import json
+from functools import reduce
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+# ==========================================
+# Keyset (cursor) pagination
+# ==========================================
+# แทน OFFSET: หน้าถัดไปเริ่มจากค่าคอลัมน์ที่ใช้เรียงของแถวสุดท้าย
+#   WHERE (a < x) OR (a = x AND pk < y) ORDER BY a DESC, pk DESC LIMIT n
+# -> ใช้ index ได้, ต้นทุนต่อหน้า O(limit) ไม่ขึ้นกับว่าเลื่อนไปลึกแค่ไหน
+# คอลัมน์สุดท้ายของ order ต้อง unique (ปกติคือ pk) และทุกคอลัมน์ต้องไม่เป็น NULL
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("cursor ไม่ถูกต้อง") from e
+    if not isinstance(values, list):
+        raise InvalidCursor("cursor ไม่ถูกต้อง")
+    return values
+
+
+def _field(model, path):
+    field = None
+    for part in path.split("__"):
+        if part == "pk":
+            field = model._meta.pk
+        else:
+            field = model._meta.get_field(part)
+        if field.is_relation:
+            model = field.related_model
+    return field
+
+def _value(row, path):
+    if isinstance(row, dict):
+        return row[path]
+    for part in path.split("__"):
+        row = getattr(row, part)
+    return row
+
+def keyset_page(qs, order, cursor=None, limit=20):
+    """
+    order = ["-created_at", "-pk"] (รูปแบบเดียวกับ order_by)
+    คืน (rows, next_cursor) โดย next_cursor = None ถ้าไม่มีหน้าถัดไป
+    raise InvalidCursor ถ้า cursor ไม่ตรงกับ order
+    """
+    names = [o.lstrip("-") for o in order]
+    qs = qs.order_by(*order)
+
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(order):
+            raise InvalidCursor("cursor ไม่ตรงกับการเรียงลำดับ")
+        try:
+            values = [_field(qs.model, name).to_python(v) for name, v in zip(names, values)]
+        except (FieldDoesNotExist, ValidationError, ValueError) as e:
+            raise InvalidCursor("cursor ไม่ถูกต้อง") from e
+
+        clauses = []
+        for i, o in enumerate(order):
+            lookup = "lt" if o.startswith("-") else "gt"
+            cond = {names[j]: values[j] for j in range(i)}
+            cond[f"{names[i]}__{lookup}"] = values[i]
+            clauses.append(Q(**cond))
+        qs = qs.filter(reduce(lambda a, b: a | b, clauses))
+
+    rows = list(qs[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor([_value(rows[-1], name) for name in names])
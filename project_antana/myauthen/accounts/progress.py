@@ -0,0 +1,169 @@
+import base64
+import json
+import struct
+import threading
+import time
+import uuid
+
+from .comfy import CLIENT_ID, COMFY_HOST
+
+try:
+    import websocket  # websocket-client (requirements.txt) ใช้รับ progress/preview จาก ComfyUI
+except ImportError:   # ไม่มี -> ensure_listener แจ้งครั้งเดียวว่าปิด listener
+    websocket = None
+
+
+# ==========================================
+# Progress store: สถานะงาน generate ของผู้ใช้ (in-process)
+# ==========================================
+# status: queued -> submitted -> running -> done | error
+
+DONE_TTL = 60  # วินาทีที่เก็บงานที่จบแล้วไว้ให้ client อ่านสถานะสุดท้าย
+
+
+class ProgressStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._prompts = {}   # prompt_id -> {sampler_node_id: [job_id, ...]} (latent batch เดียวมีได้หลายงาน)
+        self._current = {}   # prompt_id -> node ที่กำลังทำงาน
+        self.version = 0
+
+    def create(self, user_id, job_id=None):
+        """job_id มาจาก client ได้ (ให้หน้าเว็บรู้ id ก่อนได้ response) แต่ห้ามซ้ำกับงานที่มีอยู่"""
+        with self._lock:
+            self._gc()
+            if not job_id or job_id in self._jobs:
+                job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id": job_id,
+                "user_id": user_id,
+                "status": "queued",
+                "position": None,
+                "step": 0,
+                "max_steps": 0,
+                "preview": None,
+                "updated": time.time(),
+            }
+            self.version += 1
+        return job_id
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields, updated=time.time())
+            self.version += 1
+
+    def attach_prompt(self, prompt_id, sampler_nodes):
+        """ผูก prompt_id ของ ComfyUI กับงาน: sampler_nodes = {KSampler node id: [job_id, ...]}"""
+        with self._lock:
+            self._prompts[prompt_id] = {node: list(job_ids) for node, job_ids in sampler_nodes.items()}
+        for job_ids in sampler_nodes.values():
+            for job_id in job_ids:
+                self.update(job_id, status="submitted", position=None, prompt_id=prompt_id)
+
+    def finish(self, job_id, error=None):
+        self.update(job_id, status="error" if error else "done", error=str(error) if error else None, preview=None)
+
+    def snapshot(self, user_id):
+        with self._lock:
+            return [
+                {k: v for k, v in job.items() if k != "user_id"}
+                for job in self._jobs.values()
+                if job["user_id"] == user_id
+            ]
+
+    # ---------------- events จาก ComfyUI ----------------
+    def on_executing(self, prompt_id, node):
+        with self._lock:
+            nodes = self._prompts.get(prompt_id)
+            if nodes is None:
+                return
+            if node is None:  # prompt ทำงานเสร็จ
+                self._prompts.pop(prompt_id, None)
+                self._current.pop(prompt_id, None)
+                return
+            self._current[prompt_id] = node
+            job_ids = nodes.get(node, ())
+        for job_id in job_ids:
+            self.update(job_id, status="running")
+
+    def on_progress(self, prompt_id, node, value, max_value):
+        with self._lock:
+            job_ids = self._prompts.get(prompt_id, {}).get(node, ())
+        for job_id in job_ids:
+            self.update(job_id, status="running", step=value, max_steps=max_value)
+
+    def on_preview(self, image_bytes, mime):
+        # ComfyUI ไม่ระบุ prompt ใน preview -> ให้กับ sampler ที่กำลังทำงานล่าสุด
+        with self._lock:
+            job_ids = ()
+            for prompt_id, node in self._current.items():
+                job_ids = self._prompts.get(prompt_id, {}).get(node) or job_ids
+        if job_ids:
+            data = base64.b64encode(image_bytes).decode("ascii")
+            for job_id in job_ids:
+                self.update(job_id, preview=f"data:{mime};base64,{data}")
+
+    def _gc(self):
+        # เรียกภายใต้ self._lock
+        cutoff = time.time() - DONE_TTL
+        for job_id in [j for j, job in self._jobs.items() if job["status"] in ("done", "error") and job["updated"] < cutoff]:
+            del self._jobs[job_id]
+
+
+store = ProgressStore()
+
+
+# ==========================================
+# ComfyUI websocket listener
+# ==========================================
+_listener = None
+_listener_lock = threading.Lock()
+
+def _handle_message(message):
+    if isinstance(message, bytes):
+        # binary: [event type:uint32][image format:uint32][image bytes]
+        if len(message) > 8:
+            event_type, image_format = struct.unpack(">II", message[:8])
+            if event_type == 1:  # PREVIEW_IMAGE
+                store.on_preview(message[8:], "image/png" if image_format == 2 else "image/jpeg")
+        return
+
+    try:
+        msg = json.loads(message)
+    except ValueError:
+        return
+    data = msg.get("data") or {}
+    if msg.get("type") == "executing":
+        store.on_executing(data.get("prompt_id"), data.get("node"))
+    elif msg.get("type") == "progress":
+        store.on_progress(data.get("prompt_id"), data.get("node"), data.get("value", 0), data.get("max", 0))
+
+def _listen():
+    ws_url = COMFY_HOST.replace("http://", "ws://").replace("https://", "wss://") + f"/ws?clientId={CLIENT_ID}"
+    while True:
+        try:
+            ws = websocket.create_connection(ws_url, timeout=30)
+            ws.settimeout(None)
+            while True:
+                _handle_message(ws.recv())
+        except Exception as e:
+            print(f"[Progress] ComfyUI websocket error: {e}")
+            time.sleep(5)
+
+def ensure_listener():
+    """เปิด thread ฟัง websocket ของ ComfyUI (ครั้งเดียวต่อ process)"""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            return
+        if websocket is None:
+            print("[Progress] ไม่พบ websocket-client (pip install websocket-client): "
+                  "ปิด ComfyUI listener -> generate/events/ มีแค่สถานะคิว ไม่มี step / preview")
+            _listener = False
+            return
+        _listener = threading.Thread(target=_listen, name="comfy-progress", daemon=True)
+        _listener.start()
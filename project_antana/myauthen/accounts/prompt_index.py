@@ -0,0 +1,404 @@
+import json
+import mmap
+import os
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+import requests
+from django.conf import settings
+
+from . import background
+from .models import GenerateHistory
+
+
+# ==========================================
+# ค้นหา prompt ที่คล้ายกัน (GenerateHistory.positive_prompt) ด้วย embedding
+# ==========================================
+# - embedding จาก Ollama (/api/embed, PROMPT_EMBED_MODEL) หรือ hashing vectorizer ในตัว (ไม่ต้องมี service)
+#   ทุกเวกเตอร์ถูก normalize -> cosine = dot product / เก็บเป็น numpy float32 (n, dim)
+# - ANN: random-hyperplane LSH PROMPT_LSH_TABLES ตาราง x PROMPT_LSH_BITS bit (คูณ matrix ครั้งเดียวต่อ batch)
+#   candidate = แถวใน bucket เดียวกัน + bucket ที่ต่างกัน 1 bit (multi-probe) ทุกตาราง
+#   แถวที่ชนหลายครั้งที่สุดไม่เกิน MAX_CANDIDATES แถวถูกคำนวณ cosine จริง (matrix-vector บน mmap) แล้วเรียง
+# - build_prompt_index (ต้องรันก่อนใช้งาน) เขียน snapshot: เวกเตอร์ float32 + key LSH ต่อ table ที่เรียงแล้ว
+#   process เปิดไฟล์ด้วย mmap (ไม่โหลดเวกเตอร์ทั้งหมดเข้า memory, ไม่ต้องสร้าง bucket ใหม่ตอนเริ่ม)
+# - แถวใหม่ (tail): อ่าน GenerateHistory ที่ pk > watermark ของไฟล์ทุก PROMPT_INDEX_REFRESH วินาที
+#   embed ใน background (ไม่ถือ lock ระหว่างเรียก Ollama) เก็บใน memory ไม่เกิน MAX_TAIL_ROWS แล้วค้นแบบ exact
+#   แถวที่ถูกลบถูกกรองตอนดึงจาก DB (หายจากไฟล์เมื่อ build ใหม่)
+# embedder ที่ใช้ถูกบันทึกใน header -> เปลี่ยน PROMPT_EMBED_MODEL แล้วต้อง build ใหม่
+
+INDEX_MAGIC = b"PROMPTIDX2\n"
+HEADER_SIZE = 4096        # เว้นที่ให้ header -> ส่วนข้อมูลเริ่มที่ offset ที่ align แล้ว
+LSH_SEED = 20240601
+EMBED_BATCH = 64          # prompt ต่อ request ไปที่ Ollama
+BUILD_BATCH = 2048        # แถวต่อรอบตอน build (embed + hash เป็น matrix)
+REFRESH_BATCH = 500       # แถวใหม่ที่ embed ต่อ batch ใน background (ดึงจาก DB ทีละเท่านี้)
+MAX_TAIL_ROWS = 50000     # แถวหลัง snapshot ที่เก็บใน memory ได้ (เกินนี้ต้อง build ใหม่)
+EXACT_HIT_WEIGHT = 2      # ชน bucket ตรง ๆ นับมากกว่าชน bucket ข้างเคียง
+MAX_CANDIDATES = 5000     # แถวจาก snapshot ที่คำนวณ cosine จริงต่อ query
+MAX_BUCKET = 500          # bucket ใหญ่ (prompt ซ้ำ ๆ) ดูเฉพาะแถวล่าสุดเท่านี้
+
+
+class EmbeddingError(Exception):
+    pass
+
+
+# ---------------- embedders ----------------
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+class HashingEmbedder:
+    """bag of words + word bigram แบบ signed feature hashing (ไม่ต้องเรียก service ใด ๆ)"""
+
+    def __init__(self, dim):
+        self.dim = dim
+        self.name = f"hashing:{dim}"
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = re.findall(r"\w+", (text or "").lower())
+            for token in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                h = zlib.crc32(token.encode("utf-8"))
+                vectors[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        return _normalize(vectors)
+
+
+class OllamaEmbedder:
+    def __init__(self, model):
+        self.model = model
+        self.name = f"ollama:{model}"
+
+    def embed(self, texts):
+        vectors = []
+        for i in range(0, len(texts), EMBED_BATCH):
+            try:
+                r = requests.post(
+                    f"{settings.OLLAMA_HOST}/api/embed",
+                    json={"model": self.model, "input": [t or "" for t in texts[i:i + EMBED_BATCH]]},
+                    timeout=settings.PROMPT_EMBED_TIMEOUT,
+                )
+                r.raise_for_status()
+                vectors.extend(r.json()["embeddings"])
+            except (requests.RequestException, ValueError, KeyError) as e:
+                raise EmbeddingError(f"Ollama embed ไม่สำเร็จ: {e}") from e
+        return _normalize(vectors)
+
+
+def embedder_from_name(name):
+    kind, _, arg = name.partition(":")
+    if kind == "hashing":
+        return HashingEmbedder(int(arg))
+    if kind == "ollama":
+        return OllamaEmbedder(arg)
+    raise ValueError(f"ไม่รู้จัก embedder {name!r}")
+
+def configured_embedder():
+    """Ollama ถ้าตั้ง PROMPT_EMBED_MODEL และเรียกได้ ไม่อย่างนั้นใช้ hashing (ใช้ตอน build_prompt_index)"""
+    if settings.PROMPT_EMBED_MODEL:
+        embedder = OllamaEmbedder(settings.PROMPT_EMBED_MODEL)
+        try:
+            embedder.embed(["ping"])
+            return embedder
+        except EmbeddingError as e:
+            print(f"[PromptIndex] {e} -> ใช้ hashing embedder แทน")
+    return HashingEmbedder(settings.PROMPT_EMBED_HASH_DIM)
+
+
+# ---------------- LSH ----------------
+class Hyperplanes:
+    def __init__(self, dim, tables, bits, seed=LSH_SEED):
+        self.dim, self.tables, self.bits = dim, tables, bits
+        self.planes = np.random.default_rng(seed).standard_normal((tables * bits, dim), dtype=np.float32)
+        self._weights = (1 << np.arange(bits, dtype=np.uint32)).astype(np.uint32)
+
+    def keys(self, vectors):
+        """(n, dim) -> key uint32 ของแต่ละแถวในแต่ละตาราง (n, tables)"""
+        signs = (vectors @ self.planes.T >= 0).reshape(len(vectors), self.tables, self.bits)
+        return (signs * self._weights).sum(axis=2, dtype=np.uint32)
+
+
+# ---------------- index ----------------
+class PromptIndex:
+    def __init__(self, embedder, dim, watermark=0):
+        self._lock = threading.Lock()
+        self.embedder = embedder
+        self.dim = dim
+        self.watermark = watermark   # pk สูงสุดของ GenerateHistory ที่อยู่ใน index แล้ว
+        self.planes = Hyperplanes(dim, settings.PROMPT_LSH_TABLES, settings.PROMPT_LSH_BITS)
+        self.mtime = None
+        self.checked_at = time.monotonic()
+        self.stale = False
+
+        # snapshot (mmap): ids (n,), vectors (n, dim), keys / order (tables, n) เรียงตาม key ต่อ table
+        self._mmap = None
+        self._ids = np.empty(0, dtype=np.int64)
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._keys = np.empty((self.planes.tables, 0), dtype=np.uint32)
+        self._order = np.empty((self.planes.tables, 0), dtype=np.int32)
+
+        # แถวที่เพิ่มหลัง snapshot (ค้นแบบ exact)
+        self._tail_ids = np.empty(0, dtype=np.int64)
+        self._tail_vectors = np.empty((0, dim), dtype=np.float32)
+
+    def __len__(self):
+        return len(self._ids) + len(self._tail_ids)
+
+    @property
+    def tail_full(self):
+        return len(self._tail_ids) >= MAX_TAIL_ROWS
+
+    # ---------------- เพิ่มแถวใหม่ ----------------
+    def add(self, rows):
+        """rows = [(history_id, prompt), ...] เรียงตาม pk (embed นอก lock)"""
+        if not rows:
+            return
+        vectors = self.embedder.embed([prompt for _, prompt in rows])
+        ids = np.fromiter((history_id for history_id, _ in rows), dtype=np.int64, count=len(rows))
+        with self._lock:
+            self._tail_ids = np.concatenate([self._tail_ids, ids])
+            self._tail_vectors = np.concatenate([self._tail_vectors, vectors])
+            self.watermark = max(self.watermark, rows[-1][0])
+
+    # ---------------- ค้นหา ----------------
+    def _candidates(self, vec):
+        """แถวของ snapshot ที่ชน bucket มากที่สุดไม่เกิน MAX_CANDIDATES แถว"""
+        bits = self.planes.bits
+        probes = self.planes.keys(vec[None, :])[0][:, None] ^ np.array(
+            [0] + [1 << b for b in range(bits)], dtype=np.uint32
+        )   # (tables, 1 + bits): bucket ตรง + ข้างเคียง 1 bit
+        rows, weights = [], []
+        for table in range(self.planes.tables):
+            keys, order = self._keys[table], self._order[table]
+            lo = np.searchsorted(keys, probes[table], side="left")
+            hi = np.searchsorted(keys, probes[table], side="right")
+            for j in np.nonzero(hi > lo)[0]:
+                part = order[max(lo[j], hi[j] - MAX_BUCKET):hi[j]]
+                rows.append(part)
+                weights.append(np.full(len(part), EXACT_HIT_WEIGHT if j == 0 else 1, dtype=np.int32))
+        if not rows:
+            return np.empty(0, dtype=np.int64)
+        unique, inverse = np.unique(np.concatenate(rows), return_inverse=True)
+        hits = np.bincount(inverse, weights=np.concatenate(weights))
+        if len(unique) > MAX_CANDIDATES:
+            unique = unique[np.argpartition(-hits, MAX_CANDIDATES)[:MAX_CANDIDATES]]
+        return np.sort(unique)   # อ่าน mmap ตามลำดับ
+
+    def search(self, vec, k, exclude=None):
+        """[(history_id, cosine), ...] k รายการที่ใกล้ที่สุด (ค่าโดยประมาณ)"""
+        vec = np.asarray(vec, dtype=np.float32)
+        with self._lock:
+            if not len(self) or vec.shape != (self.dim,):
+                return []
+            rows = self._candidates(vec) if len(self._ids) else np.empty(0, dtype=np.int64)
+            ids = np.concatenate([self._ids[rows], self._tail_ids])
+            scores = np.concatenate([self._vectors[rows] @ vec, self._tail_vectors @ vec])
+        if exclude is not None:
+            scores[ids == exclude] = -np.inf
+        top = min(k, len(ids))
+        if not top:
+            return []
+        best = np.argpartition(-scores, top - 1)[:top] if top < len(ids) else np.arange(len(ids))
+        best = best[np.argsort(-scores[best])]
+        return [(int(ids[i]), float(scores[i])) for i in best if scores[i] != -np.inf]
+
+    def vector_of(self, history_id):
+        with self._lock:
+            for ids, vectors in ((self._ids, self._vectors), (self._tail_ids, self._tail_vectors)):
+                i = np.searchsorted(ids, history_id)
+                if i < len(ids) and ids[i] == history_id:
+                    return np.array(vectors[i])
+        return None
+
+    # ---------------- snapshot ----------------
+    @classmethod
+    def build(cls, path, embedder, on_progress=None):
+        """
+        embed ทุกแถวของ GenerateHistory แล้วเขียนไฟล์ snapshot (ไฟล์ชั่วคราวแล้ว replace) คืน header
+        เวกเตอร์เขียนลงไฟล์ทีละ batch -> ใช้ memory แค่ id + key ต่อแถว
+        """
+        tables, bits = settings.PROMPT_LSH_TABLES, settings.PROMPT_LSH_BITS
+        ids, keys = [], []
+        planes, dim = None, None
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"\0" * HEADER_SIZE)
+            rows = GenerateHistory.objects.order_by("pk").values_list("pk", "positive_prompt")
+            batch = []
+            done = 0
+
+            def flush():
+                nonlocal planes, dim, done
+                vectors = embedder.embed([prompt for _, prompt in batch])
+                if planes is None:
+                    dim = vectors.shape[1]
+                    planes = Hyperplanes(dim, tables, bits)
+                ids.append(np.fromiter((history_id for history_id, _ in batch), dtype=np.int64, count=len(batch)))
+                keys.append(planes.keys(vectors))
+                f.write(vectors.tobytes())
+                done += len(batch)
+                batch.clear()
+                if on_progress:
+                    on_progress(done)
+
+            for row in rows.iterator(chunk_size=BUILD_BATCH):
+                batch.append(row)
+                if len(batch) >= BUILD_BATCH:
+                    flush()
+            if batch:
+                flush()
+
+            if dim is None:   # ยังไม่มีแถว: เขียน index ว่างที่ใช้ขนาดเวกเตอร์ของ embedder
+                dim = embedder.embed([""]).shape[1]
+            ids = np.concatenate(ids) if ids else np.empty(0, dtype=np.int64)
+            keys = np.concatenate(keys).T if keys else np.empty((tables, 0), dtype=np.uint32)
+            sections = {"vectors": HEADER_SIZE}
+            sections["ids"] = f.tell()
+            f.write(ids.tobytes())
+            order = np.argsort(keys, axis=1, kind="stable").astype(np.int32)   # stable -> pk น้อยไปมากใน bucket
+            sections["keys"] = f.tell()
+            f.write(np.take_along_axis(keys, order, axis=1).astype(np.uint32).tobytes())
+            sections["order"] = f.tell()
+            f.write(order.tobytes())
+
+            header = {
+                "embedder": embedder.name, "dim": dim, "rows": len(ids),
+                "watermark": int(ids[-1]) if len(ids) else 0, "tables": tables, "bits": bits, "sections": sections,
+            }
+            raw = INDEX_MAGIC + json.dumps(header).encode() + b"\n"
+            if len(raw) > HEADER_SIZE:
+                raise ValueError("header ของ prompt index ใหญ่เกิน HEADER_SIZE")
+            f.seek(0)
+            f.write(raw)
+        os.replace(tmp, path)
+        return header
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            if f.readline() != INDEX_MAGIC:
+                raise ValueError(f"{path}: ไม่ใช่ไฟล์ prompt index (หรือเป็นรุ่นเก่า) ต้อง build ใหม่")
+            header = json.loads(f.readline())
+            mtime = os.fstat(f.fileno()).st_mtime
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if (header["tables"], header["bits"]) != (settings.PROMPT_LSH_TABLES, settings.PROMPT_LSH_BITS):
+            raise ValueError(f"{path}: ค่า LSH ไม่ตรงกับ settings ต้อง build ใหม่")
+        index = cls(embedder_from_name(header["embedder"]), header["dim"], header["watermark"])
+        index.mtime = mtime
+
+        n, dim, tables, sections = header["rows"], header["dim"], header["tables"], header["sections"]
+        section = lambda name, dtype, count: np.frombuffer(mm, dtype=dtype, count=count, offset=sections[name])
+        index._mmap = mm
+        index._vectors = section("vectors", np.float32, n * dim).reshape(n, dim)
+        index._ids = section("ids", np.int64, n)
+        index._keys = section("keys", np.uint32, tables * n).reshape(tables, n)
+        index._order = section("order", np.int32, tables * n).reshape(tables, n)
+        return index
+
+
+_index = None
+_index_lock = threading.Lock()   # ป้องกันเฉพาะ _index / _refreshing (ห้ามถือข้าม I/O ของ Ollama หรือ DB)
+_refreshing = False
+
+def _file_mtime():
+    try:
+        return os.stat(settings.PROMPT_INDEX_PATH).st_mtime
+    except OSError:
+        return None
+
+def _refresh():
+    """
+    (background) โหลดไฟล์ใหม่ถ้าถูก build ใหม่ แล้ว embed แถวที่ใหม่กว่า watermark ทีละ REFRESH_BATCH
+    จนหมดหรือ tail เต็ม / ระหว่างนี้การค้นใช้ index เดิม (แถวใหม่เข้ามาทีละ batch ผ่าน PromptIndex._lock)
+    """
+    global _index, _refreshing
+    try:
+        index = _index
+        mtime = _file_mtime()
+        if mtime is not None and mtime != index.mtime:
+            try:
+                index = PromptIndex.load(settings.PROMPT_INDEX_PATH)
+            except ValueError as e:
+                print(f"[PromptIndex] {e} -> ใช้ index เดิม")
+            else:
+                with _index_lock:
+                    _index = index
+        while not index.tail_full:
+            rows = list(
+                GenerateHistory.objects.filter(pk__gt=index.watermark).order_by("pk")
+                .values_list("pk", "positive_prompt")[:REFRESH_BATCH]
+            )
+            try:
+                index.add(rows)
+            except EmbeddingError as e:
+                print(f"[PromptIndex] {e} -> ลองใหม่รอบหน้า")
+                return
+            if len(rows) < REFRESH_BATCH:
+                return
+        print(f"[PromptIndex] แถวใหม่หลัง snapshot เกิน {MAX_TAIL_ROWS} -> รัน build_prompt_index")
+    finally:
+        with _index_lock:
+            _refreshing = False
+
+def get_prompt_index():
+    """
+    index ปัจจุบันทันที (None ถ้ายังไม่เคยรัน build_prompt_index)
+    ถึงรอบ (หรือมีแถวใหม่) -> ส่ง _refresh เข้า background ไม่ให้ request รอ embed
+    """
+    global _index, _refreshing
+    if _index is None:
+        if _file_mtime() is None:
+            return None
+        try:
+            index = PromptIndex.load(settings.PROMPT_INDEX_PATH)   # mmap ไม่อ่านทั้งไฟล์ -> ทำนอก lock
+        except ValueError as e:
+            print(f"[PromptIndex] {e}")
+            return None
+        with _index_lock:
+            if _index is None:
+                _index = index
+                _index.stale = True   # เติมแถวที่เกิดหลัง build ทันที
+
+    now = time.monotonic()
+    with _index_lock:
+        index = _index
+        due = index.stale or now - index.checked_at >= settings.PROMPT_INDEX_REFRESH
+        if not due or _refreshing:
+            return index
+        _refreshing = True
+        index.checked_at = now
+        index.stale = False   # mark_stale ระหว่าง refresh -> รอบถัดไปอ่านต่อ
+    background.submit(_refresh)
+    return index
+
+def mark_stale():
+    """เรียกจาก signals.py เมื่อมี GenerateHistory ใหม่ใน process นี้ -> ค้นครั้งถัดไปเห็นทันที"""
+    with _index_lock:
+        if _index is not None:
+            _index.stale = True
+
+
+def similar_histories(k, text=None, history_id=None):
+    """
+    [(history_id, cosine), ...] ของ prompt ที่คล้าย text หรือคล้าย prompt ของ history_id
+    raise EmbeddingError ถ้ายังไม่มี index หรือ embed ข้อความไม่ได้ (Ollama ล่ม)
+    """
+    index = get_prompt_index()
+    if index is None:
+        raise EmbeddingError("ยังไม่มี prompt index: รัน manage.py build_prompt_index")
+    vec = index.vector_of(history_id) if history_id is not None else None
+    if vec is None:
+        if text is None:
+            text = GenerateHistory.objects.filter(pk=history_id).values_list("positive_prompt", flat=True).first()
+            if text is None:
+                return []
+        vec = index.embedder.embed([text])[0]
+    return index.search(vec, k, exclude=history_id)
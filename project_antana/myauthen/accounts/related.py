@@ -0,0 +1,250 @@
+import heapq
+import json
+import math
+import os
+import threading
+import time
+from array import array
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+from .models import Post
+
+
+# ==========================================
+# Related posts: index tag ของโพสต์ใน memory (ไม่ self-join Post.tags ต่อ request)
+# ==========================================
+# - post -> tags, tag -> posts (postings), tag -> tag (co-occurrence) เก็บเป็น array/dict ใน process
+# - คะแนน = ผลรวม idf² ของ tag ที่ตรงกัน หารด้วย sqrt(จำนวน tag ของโพสต์ปลายทาง)
+#   + เติม tag ที่มักมาด้วยกัน (co-occurrence) เข้า query ด้วยน้ำหนักต่ำกว่า -> โพสต์ tag น้อยก็ยังมีผลลัพธ์
+# - build_related_index (management command) สร้างจาก DB แล้วเขียนไฟล์ RELATED_INDEX_PATH
+#   process อื่นโหลดไฟล์แทนการ scan ตาราง m2m ทั้งหมด และโหลดใหม่เองเมื่อไฟล์เปลี่ยน
+# - โพสต์ที่แชร์ใหม่: อ่านแถว Post.tags.through ที่ pk > watermark ทุก RELATED_INDEX_REFRESH วินาที
+#   (process ที่เกิด event อ่านทันทีในการเรียกครั้งถัดไป) / การถอด tag และลบโพสต์ใช้ signal ใน process นั้น
+#   process อื่นเห็นเมื่อ build ไฟล์ใหม่ (โพสต์ที่ถูกลบถูกกรองออกตอนดึงจาก DB อยู่แล้ว)
+
+INDEX_MAGIC = b"RELIDX1\n"
+EXPANSION_TAGS = 3        # จำนวน tag ข้างเคียงที่เติมเข้า query
+EXPANSION_WEIGHT = 0.5
+MAX_POSTINGS = 5000       # tag ที่มีโพสต์มากกว่านี้ ดูเฉพาะโพสต์ล่าสุดเท่านี้
+REFRESH_BATCH = 10000     # แถว m2m ใหม่ที่อ่านต่อรอบ
+
+
+class RelatedIndex:
+    def __init__(self, watermark=0, mtime=None):
+        self._lock = threading.Lock()
+        self._post_tags = {}   # post_id -> array('i') ของ tag id
+        self._postings = {}    # tag_id -> array('q') ของ post id (ตามลำดับที่เพิ่ม ~ ใหม่สุดอยู่ท้าย)
+        self._cooc = {}        # tag_id -> {tag_id: จำนวนโพสต์ที่มีทั้งสอง tag}
+        self.watermark = watermark   # pk สูงสุดของ Post.tags.through ที่อยู่ใน index แล้ว
+        self.mtime = mtime           # mtime ของไฟล์ที่โหลดมา (None = build จาก DB)
+        self.checked_at = time.monotonic()
+        self.stale = False
+
+    def __len__(self):
+        return len(self._post_tags)
+
+    # ---------------- แก้ไข (เรียกภายใต้ self._lock หรือก่อนแชร์ index) ----------------
+    def _add(self, post_id, tag_id):
+        tags = self._post_tags.setdefault(post_id, array("i"))
+        if tag_id in tags:
+            return
+        for other in tags:
+            pair = self._cooc.setdefault(tag_id, {})
+            pair[other] = pair.get(other, 0) + 1
+            pair = self._cooc.setdefault(other, {})
+            pair[tag_id] = pair.get(tag_id, 0) + 1
+        tags.append(tag_id)
+        self._postings.setdefault(tag_id, array("q")).append(post_id)
+
+    def _remove(self, post_id, tag_id):
+        tags = self._post_tags.get(post_id)
+        if not tags or tag_id not in tags:
+            return
+        tags.remove(tag_id)
+        for other in tags:
+            for a, b in ((tag_id, other), (other, tag_id)):
+                pair = self._cooc[a]
+                pair[b] -= 1
+                if not pair[b]:
+                    del pair[b]
+        postings = self._postings[tag_id]
+        postings.remove(post_id)
+        if not postings:
+            del self._postings[tag_id]
+        if not tags:
+            del self._post_tags[post_id]
+
+    def add_pairs(self, pairs, watermark):
+        with self._lock:
+            for post_id, tag_id in pairs:
+                self._add(post_id, tag_id)
+            self.watermark = max(self.watermark, watermark)
+
+    def remove_pairs(self, pairs):
+        with self._lock:
+            for post_id, tag_id in pairs:
+                self._remove(post_id, tag_id)
+
+    def remove_post(self, post_id):
+        with self._lock:
+            for tag_id in list(self._post_tags.get(post_id, ())):
+                self._remove(post_id, tag_id)
+
+    # ---------------- ค้นหา ----------------
+    def _idf(self, tag_id):
+        df = len(self._postings.get(tag_id, ()))
+        return math.log(1 + len(self._post_tags) / df) if df else 0.0
+
+    def related(self, post_id, limit):
+        """id ของโพสต์ที่คล้าย post_id มากที่สุด limit รายการ (คะแนนเท่ากัน -> ใหม่กว่าก่อน)"""
+        with self._lock:
+            tags = self._post_tags.get(post_id)
+            if not tags:
+                return []
+            query = {t: self._idf(t) for t in tags}
+
+            # tag ข้างเคียง: P(u | t) * idf(u) ของ tag ที่ไม่อยู่ในโพสต์
+            neighbours = {}
+            for t in tags:
+                df = len(self._postings[t])
+                for u, n in self._cooc.get(t, {}).items():
+                    if u not in query:
+                        neighbours[u] = max(neighbours.get(u, 0.0), n / df * self._idf(u))
+            for u, w in heapq.nlargest(EXPANSION_TAGS, neighbours.items(), key=lambda kv: kv[1]):
+                query[u] = EXPANSION_WEIGHT * w
+
+            scores = defaultdict(float)
+            for t, w in query.items():
+                idf = self._idf(t)
+                for p in self._postings[t][-MAX_POSTINGS:]:
+                    scores[p] += w * idf
+            scores.pop(post_id, None)
+            best = heapq.nlargest(
+                limit, scores.items(), key=lambda kv: (kv[1] / math.sqrt(len(self._post_tags[kv[0]])), kv[0])
+            )
+        return [p for p, _ in best]
+
+    # ---------------- ไฟล์ index ----------------
+    def save(self, path):
+        """เขียน post -> tags แบบ CSR (post_ids, offsets, tag_ids) ลงไฟล์ (เขียนไฟล์ชั่วคราวแล้ว replace)"""
+        with self._lock:
+            post_ids = array("q", sorted(self._post_tags))
+            offsets = array("q", [0])
+            tag_ids = array("i")
+            for post_id in post_ids:
+                tag_ids.extend(self._post_tags[post_id])
+                offsets.append(len(tag_ids))
+            header = {"watermark": self.watermark, "posts": len(post_ids), "pairs": len(tag_ids)}
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(INDEX_MAGIC)
+            f.write(json.dumps(header).encode() + b"\n")
+            post_ids.tofile(f)
+            offsets.tofile(f)
+            tag_ids.tofile(f)
+        os.replace(tmp, path)
+        return header
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            if f.readline() != INDEX_MAGIC:
+                raise ValueError(f"{path}: ไม่ใช่ไฟล์ related index")
+            header = json.loads(f.readline())
+            post_ids, offsets, tag_ids = array("q"), array("q"), array("i")
+            post_ids.fromfile(f, header["posts"])
+            offsets.fromfile(f, header["posts"] + 1)
+            tag_ids.fromfile(f, header["pairs"])
+            mtime = os.fstat(f.fileno()).st_mtime
+
+        index = cls(watermark=header["watermark"], mtime=mtime)
+        for i, post_id in enumerate(post_ids):
+            for tag_id in tag_ids[offsets[i]:offsets[i + 1]]:
+                index._add(post_id, tag_id)
+        return index
+
+    @classmethod
+    def build(cls):
+        """scan Post.tags.through ทั้งตาราง (ใช้ใน command หรือเมื่อยังไม่มีไฟล์)"""
+        through = Post.tags.through.objects
+        watermark = through.aggregate(m=Max("pk"))["m"] or 0
+        index = cls(watermark=watermark)
+        rows = through.filter(pk__lte=watermark).order_by("post_id", "tag_id").values_list("post_id", "tag_id")
+        for post_id, tag_id in rows.iterator(chunk_size=REFRESH_BATCH):
+            index._add(post_id, tag_id)
+        return index
+
+
+_index = None
+_index_lock = threading.Lock()
+
+def _file_mtime():
+    try:
+        return os.stat(settings.RELATED_INDEX_PATH).st_mtime
+    except OSError:
+        return None
+
+def _refresh(index):
+    """โหลดไฟล์ใหม่ถ้าถูก build ใหม่ แล้วเติมแถว m2m ที่ใหม่กว่า watermark (เรียกภายใต้ _index_lock)"""
+    now = time.monotonic()
+    if not index.stale and now - index.checked_at < settings.RELATED_INDEX_REFRESH:
+        return index
+    mtime = _file_mtime()
+    if mtime is not None and mtime != index.mtime:
+        index = RelatedIndex.load(settings.RELATED_INDEX_PATH)
+    index.checked_at = now
+    index.stale = False
+
+    rows = list(
+        Post.tags.through.objects.filter(pk__gt=index.watermark).order_by("pk")
+        .values_list("pk", "post_id", "tag_id")[:REFRESH_BATCH]
+    )
+    if rows:
+        index.add_pairs([(post_id, tag_id) for _, post_id, tag_id in rows], rows[-1][0])
+        index.stale = len(rows) == REFRESH_BATCH   # ยังมีค้าง -> อ่านต่อรอบหน้า
+    return index
+
+def get_related_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            path = settings.RELATED_INDEX_PATH
+            _index = RelatedIndex.load(path) if os.path.exists(path) else RelatedIndex.build()
+        _index = _refresh(_index)
+        return _index
+
+
+# ---------------- อัปเดตจาก signals.py (เฉพาะ index ที่โหลดแล้วใน process นี้) ----------------
+def _after_commit(fn):
+    def apply():
+        with _index_lock:
+            if _index is not None:
+                fn(_index)
+    transaction.on_commit(apply)
+
+def mark_stale():
+    """มีแถว Post.tags ใหม่ -> การเรียกครั้งถัดไปอ่านแถวที่เกิน watermark ทันที"""
+    _after_commit(lambda index: setattr(index, "stale", True))
+
+def forget_pairs(pairs):
+    pairs = list(pairs)
+    _after_commit(lambda index: index.remove_pairs(pairs))
+
+def forget_post(post_id):
+    _after_commit(lambda index: index.remove_post(post_id))
+
+
+def related_posts(post_id, limit=None):
+    """โพสต์ที่เกี่ยวข้องสำหรับ post_detail / comment_modal (1 query ดึงโพสต์ + history)"""
+    limit = limit or settings.RELATED_POSTS_LIMIT
+    ids = get_related_index().related(post_id, limit)
+    if not ids:
+        return []
+    posts = Post.objects.select_related("history").in_bulk(ids)
+    return [posts[pk] for pk in ids if pk in posts]
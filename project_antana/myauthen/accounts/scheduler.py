@@ -0,0 +1,182 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .progress import store as progress_store
+
+
+# ==========================================
+# Fair-share scheduler สำหรับงาน generate
+# ==========================================
+
+class AdmissionError(Exception):
+    """งานถูกปฏิเสธก่อนเข้าคิว (status = HTTP status ที่ควรตอบกลับ)"""
+
+    def __init__(self, message, status=429):
+        super().__init__(message)
+        self.status = status
+
+
+class _TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate            # token ต่อวินาที
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, cost):
+        """
+        หัก cost token คืน 0 หรือจำนวนวินาทีที่ต้องรอ
+        cost > capacity: รับได้เมื่อ bucket เต็ม แล้วติดลบ (ค้างหนี้) -> คำขอถัดไปรอจนเติมคืนครบ
+        ผลคือจำนวนภาพเฉลี่ยไม่เกิน rate ไม่ว่าแต่ละคำขอจะใหญ่แค่ไหน
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        need = min(cost, self.capacity)
+        if self.tokens < need:
+            return (need - self.tokens) / self.rate  # วินาทีที่ต้องรอ
+        self.tokens -= cost
+        return 0
+
+
+class _Ticket:
+    def __init__(self, user_id, is_staff, progress_id=None):
+        self.user_id = user_id
+        self.is_staff = is_staff
+        self.progress_id = progress_id
+        self.granted = threading.Event()
+
+
+class FairScheduler:
+    """
+    - token bucket ต่อผู้ใช้ (1 token = 1 ภาพ) กันการยิง batch ใหญ่ซ้ำ ๆ
+    - จำกัดงานที่ค้างอยู่ (in-flight) ต่อผู้ใช้
+    - แจก slot GPU แบบ round-robin ระหว่างผู้ใช้ (คนที่ส่งเยอะไม่แซงคิวคนอื่น)
+    - staff ได้ slot ก่อนเสมอ และไม่ติด token bucket
+    สถานะทั้งหมดอยู่ใน memory ของ process: รันหลาย worker -> ทุกค่าจำกัดคูณด้วยจำนวน worker (ดู settings.py)
+    """
+
+    def __init__(self, slots=4, rate_per_minute=12, burst=8, max_inflight=2, max_queue=32, queue_timeout=120):
+        self.slots = slots
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._lock = threading.Lock()
+        self._running = 0
+        self._buckets = {}
+        self._inflight = {}
+        self._queues = {True: OrderedDict(), False: OrderedDict()}  # is_staff -> {user_id: deque[ticket]}
+
+    # ---------------- admission ----------------
+    def _admit(self, user, n_images, progress_id=None):
+        with self._lock:
+            if self._inflight.get(user.id, 0) >= self.max_inflight:
+                raise AdmissionError("มีงานสร้างภาพที่กำลังทำอยู่ครบจำนวนแล้ว กรุณารอให้เสร็จก่อน")
+            if self.queued() >= self.max_queue:
+                raise AdmissionError("ระบบสร้างภาพมีคิวเต็ม กรุณาลองใหม่อีกครั้ง", status=503)
+            if not user.is_staff:
+                bucket = self._buckets.get(user.id)
+                if bucket is None:
+                    bucket = self._buckets[user.id] = _TokenBucket(self.rate, self.burst)
+                wait = bucket.take(n_images)
+                if wait:
+                    raise AdmissionError(f"สร้างภาพถี่เกินไป กรุณารอ {int(wait) + 1} วินาที")
+            self._inflight[user.id] = self._inflight.get(user.id, 0) + 1
+
+            ticket = _Ticket(user.id, user.is_staff, progress_id)
+            self._queues[ticket.is_staff].setdefault(user.id, deque()).append(ticket)
+            self._dispatch()
+            return ticket
+
+    def _dispatch(self):
+        # เรียกภายใต้ self._lock เท่านั้น
+        while self._running < self.slots:
+            queues = self._queues[True] or self._queues[False]
+            if not queues:
+                break
+            user_id, tickets = queues.popitem(last=False)
+            ticket = tickets.popleft()
+            if tickets:
+                queues[user_id] = tickets  # ต่อท้าย -> round-robin
+            self._running += 1
+            ticket.granted.set()
+            if ticket.progress_id:
+                progress_store.update(ticket.progress_id, position=0)
+        self._publish_positions()
+
+    def _publish_positions(self):
+        # จำลองลำดับที่ _dispatch จะแจก slot แล้วแจ้งตำแหน่งคิวให้ progress store
+        position = 0
+        for is_staff in (True, False):
+            pending = [deque(t) for t in self._queues[is_staff].values()]
+            while pending:
+                for tickets in pending:
+                    position += 1
+                    ticket = tickets.popleft()
+                    if ticket.progress_id:
+                        progress_store.update(ticket.progress_id, status="queued", position=position)
+                pending = [t for t in pending if t]
+
+    def _release(self, ticket, ran):
+        with self._lock:
+            if ran:
+                self._running -= 1
+            else:
+                # หมดเวลารอ: เอา ticket ออกจากคิว
+                tickets = self._queues[ticket.is_staff].get(ticket.user_id)
+                if tickets and ticket in tickets:
+                    tickets.remove(ticket)
+                    if not tickets:
+                        del self._queues[ticket.is_staff][ticket.user_id]
+                elif ticket.granted.is_set():
+                    self._running -= 1
+            left = self._inflight.get(ticket.user_id, 1) - 1
+            if left > 0:
+                self._inflight[ticket.user_id] = left
+            else:
+                self._inflight.pop(ticket.user_id, None)
+            self._dispatch()
+
+    def queued(self):
+        return sum(len(t) for q in self._queues.values() for t in q.values())
+
+    @contextmanager
+    def acquire(self, user, n_images, progress_id=None):
+        """
+        with scheduler.acquire(request.user, batch):
+            ... ส่งงานไป ComfyUI ...
+        raise AdmissionError ถ้าไม่ผ่าน rate limit / in-flight / คิวเต็ม หรือรอ slot นานเกิน
+        """
+        ticket = self._admit(user, n_images, progress_id)
+        ran = ticket.granted.wait(self.queue_timeout)
+        try:
+            if not ran:
+                raise AdmissionError("รอคิวสร้างภาพนานเกินไป กรุณาลองใหม่", status=503)
+            yield ticket
+        finally:
+            self._release(ticket, ran)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = FairScheduler(
+                slots=settings.GENERATE_MAX_CONCURRENT,
+                rate_per_minute=settings.GENERATE_RATE_PER_MINUTE,
+                burst=settings.GENERATE_BURST,
+                max_inflight=settings.GENERATE_MAX_INFLIGHT_PER_USER,
+                max_queue=settings.GENERATE_MAX_QUEUE,
+                queue_timeout=settings.GENERATE_QUEUE_TIMEOUT,
+            )
+        return _scheduler
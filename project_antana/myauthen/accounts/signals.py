@@ -0,0 +1,265 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import conditional, feed, live, prompt_index, related, stats, trending
+from .catalog import CATALOG_VERSION, clear_local as clear_local_catalog
+from .models import Comment, GenerateCount, GenerateDimension, GenerateHistory, GenerateModel, Post, Profile, Tag
+from .versions import bump_version
+
+
+# ==========================================
+# อัปเดต rollup สถิติรายวัน + UserStats (accounts.stats) ตามการสร้าง/ลบข้อมูล
+# like / comment ส่ง delta ให้หน้าเว็บที่เปิดอยู่ (accounts.live) และเพิ่ม/หักคะแนน trending (accounts.trending)
+# หมายเหตุ: bulk_create / queryset.update ไม่ส่ง signal -> ต้องเรียก stats เอง (ดู jobs.store_generated_images)
+# ==========================================
+
+def _post_owner(post_id):
+    return Post.objects.filter(pk=post_id).values_list("user_id", flat=True).first()
+
+
+# ---------------- User ----------------
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.bump(stats.local_date(instance.date_joined), "new_users", 1)
+        stats.create_user_stats(instance.pk)
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    stats.bump(stats.local_date(instance.date_joined), "new_users", -1)
+    stats.clear_user_stats_cache(instance.pk)
+
+
+# ---------------- GenerateHistory ----------------
+@receiver(post_save, sender=GenerateHistory)
+def history_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.record_generations(instance.created_at, instance.model_name, 1)
+        stats.bump_user(instance.user_id, "generations", 1)
+
+@receiver(post_delete, sender=GenerateHistory)
+def history_deleted(sender, instance, **kwargs):
+    stats.record_generations(instance.created_at, instance.model_name, -1)
+    stats.bump_user(instance.user_id, "generations", -1)
+
+
+# ---------------- Post ----------------
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.bump(stats.local_date(instance.created_at), "posts", 1)
+        stats.bump_user(instance.user_id, "posts", 1)
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    # แถวใน Post.tags / Post.likes ถูกลบแบบ cascade โดยไม่มี m2m_changed -> หักยอดก่อนลบ
+    stats.bump_tags(stats.local_date(instance.created_at), instance.tags.values_list("pk", flat=True), -1)
+    stats.remove_likes_received(Post.likes.through.objects.filter(post_id=instance.pk))
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    stats.bump(stats.local_date(instance.created_at), "posts", -1)
+    stats.bump_user(instance.user_id, "posts", -1)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def post_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear":
+        # ยังไม่ถูกลบ -> เก็บรายการไว้หักตอน post_clear
+        if reverse:
+            instance._stats_cleared = list(instance.posts.values_list("pk", "created_at"))
+        else:
+            instance._stats_cleared = list(instance.tags.values_list("pk", flat=True))
+        return
+    if action == "post_clear":
+        cleared = getattr(instance, "_stats_cleared", [])
+        if reverse:
+            for _, created_at in cleared:
+                stats.bump_tags(stats.local_date(created_at), [instance.pk], -1)
+        else:
+            stats.bump_tags(stats.local_date(instance.created_at), cleared, -1)
+        return
+    if action not in ("post_add", "post_remove") or not pk_set:
+        return
+
+    delta = 1 if action == "post_add" else -1
+    if reverse:
+        # tag.posts.add(...) -> instance = Tag, pk_set = id ของ Post
+        for created_at in Post.objects.filter(pk__in=pk_set).values_list("created_at", flat=True):
+            stats.bump_tags(stats.local_date(created_at), [instance.pk], delta)
+    else:
+        stats.bump_tags(stats.local_date(instance.created_at), pk_set, delta)
+
+
+# ---------------- Comment ----------------
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.bump(stats.local_date(instance.created_at), "comments", 1)
+        stats.bump_user(_post_owner(instance.post_id), "comments_received", 1)
+        live.publish_count(instance.post_id, "comments", 1, actor_id=instance.user_id)
+        trending.record_comments(instance.post_id, 1)
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    stats.bump(stats.local_date(instance.created_at), "comments", -1)
+    # ลบพร้อมโพสต์ (cascade): comment ถูกลบก่อนแถวโพสต์ -> ยังหาเจ้าของได้
+    stats.bump_user(_post_owner(instance.post_id), "comments_received", -1)
+    live.publish_count(instance.post_id, "comments", -1, actor_id=instance.user_id)
+    trending.record_comments(instance.post_id, -1)
+
+
+# ---------------- Like (Post.likes) ----------------
+@receiver(m2m_changed, sender=Post.likes.through)
+def post_likes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    likes = Post.likes.through.objects
+    if action in ("pre_remove", "pre_clear"):
+        # นับจากแถวที่มีอยู่จริง (pk_set ของ remove คือค่าที่ส่งมา ไม่ใช่แถวที่ถูกลบ)
+        rows = likes.filter(user_id=instance.pk) if reverse else likes.filter(post_id=instance.pk)
+        if action == "pre_remove":
+            rows = rows.filter(**{"post_id__in" if reverse else "user_id__in": pk_set})
+        stats.remove_likes_received(rows)
+        for post_id, user_id in rows.values_list("post_id", "user_id"):
+            live.publish_count(post_id, "likes", -1, actor_id=user_id)
+            trending.record_likes(post_id, -1)
+        return
+    if action != "post_add" or not pk_set:
+        return
+    if reverse:
+        # user.liked_posts.add(...) -> instance = User, pk_set = id ของ Post
+        for post_id, owner_id in Post.objects.filter(pk__in=pk_set).values_list("pk", "user_id"):
+            stats.bump_user(owner_id, "likes_received", 1)
+            live.publish_count(post_id, "likes", 1, actor_id=instance.pk)
+            trending.record_likes(post_id, 1)
+    else:
+        stats.bump_user(instance.user_id, "likes_received", len(pk_set))
+        trending.record_likes(instance.pk, len(pk_set))
+        for user_id in pk_set:
+            live.publish_count(instance.pk, "likes", 1, actor_id=user_id)
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    # like ของผู้ใช้บนโพสต์คนอื่นถูกลบแบบ cascade โดยไม่มี signal
+    likes = Post.likes.through.objects.filter(user_id=instance.pk)
+    stats.remove_likes_received(likes)
+    trending.remove_likes(likes)
+
+
+# ==========================================
+# การ์ดโพสต์ (fragment cache ดู accounts.feed): bump version ของส่วนที่การ์ดแสดง
+# จำนวน like / comment และสถานะไลก์ render นอก fragment -> ไม่ต้อง invalidate
+# ==========================================
+@receiver(post_save, sender=Post)
+def post_card_changed(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        feed.bump_post_cards([instance.pk])
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def post_card_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        feed.bump_post_cards([instance.pk])
+    elif action == "post_clear":
+        feed.bump_all_post_cards()   # tag ถูกถอดจากทุกโพสต์ (นาน ๆ ครั้ง)
+    else:
+        feed.bump_post_cards(pk_set)
+
+@receiver(post_save, sender=Tag)
+def tag_card_changed(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        feed.bump_all_post_cards()
+
+@receiver(post_save, sender=GenerateHistory)
+def history_card_changed(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # การ์ดใช้ภาพของ history; ให้ดาวอย่างเดียวไม่กระทบการ์ด
+    if created or raw or (update_fields and set(update_fields) <= {"rating"}):
+        return
+    feed.bump_post_cards(Post.objects.filter(history=instance).values_list("pk", flat=True))
+
+@receiver(post_save, sender=Profile)
+def profile_card_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        feed.bump_author_cards(instance.user_id)
+
+@receiver(post_save, sender=User)
+def user_card_changed(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # login บันทึกแค่ last_login -> ไม่ต้อง invalidate การ์ดทั้งหมดของผู้ใช้
+    if created or raw or (update_fields and set(update_fields) <= {"last_login"}):
+        return
+    feed.bump_author_cards(instance.pk)
+
+
+# ==========================================
+# ETag ของหน้าโพสต์ / โปรไฟล์ (accounts.conditional)
+# ==========================================
+@receiver([post_save, post_delete], sender=Comment)
+def comment_thread_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        conditional.bump_threads([instance.post_id])
+
+@receiver(m2m_changed, sender=Post.likes.through)
+def post_likes_thread_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        instance._etag_unliked = list(instance.liked_posts.values_list("pk", flat=True))
+    elif action == "post_clear" and reverse:
+        conditional.bump_threads(getattr(instance, "_etag_unliked", []))
+    elif action in ("post_add", "post_remove", "post_clear"):
+        conditional.bump_threads(pk_set if reverse else [instance.pk])
+
+@receiver(post_save, sender=Post)
+def post_page_changed(sender, instance, created, raw=False, **kwargs):
+    # โพสต์ใหม่/ลบ เปลี่ยน UserStats อยู่แล้ว -> ที่นี่เฉพาะการแก้ไข
+    if not created and not raw:
+        conditional.bump_user_page(instance.user_id)
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def post_page_tags_changed(sender, instance, action, reverse, **kwargs):
+    # reverse (tag.posts...) bump การ์ดทุกใบอยู่แล้วใน post_card_tags_changed / tag_card_changed
+    if action in ("post_add", "post_remove", "post_clear") and not reverse:
+        conditional.bump_user_page(instance.user_id)
+
+
+# ==========================================
+# Related posts (index ใน memory ดู accounts.related)
+# ==========================================
+@receiver(m2m_changed, sender=Post.tags.through)
+def related_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "post_add":
+        related.mark_stale()   # แถวใหม่มี pk เกิน watermark -> index อ่านเองในการเรียกถัดไป
+    elif action == "post_remove":
+        related.forget_pairs((pk, instance.pk) if reverse else (instance.pk, pk) for pk in pk_set)
+    elif action == "pre_clear":
+        if reverse:
+            instance._related_cleared = [(pk, instance.pk) for pk in instance.posts.values_list("pk", flat=True)]
+        else:
+            instance._related_cleared = [(instance.pk, pk) for pk in instance.tags.values_list("pk", flat=True)]
+    elif action == "post_clear":
+        related.forget_pairs(getattr(instance, "_related_cleared", []))
+
+@receiver(post_delete, sender=Post)
+def related_post_deleted(sender, instance, **kwargs):
+    related.forget_post(instance.pk)
+
+
+# ==========================================
+# Prompt index (accounts.prompt_index): แถวใหม่ถูก embed ตอนค้นครั้งถัดไป
+# ==========================================
+@receiver(post_save, sender=GenerateHistory)
+def prompt_index_history_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        transaction.on_commit(prompt_index.mark_stale)
+
+
+# ==========================================
+# Catalog ตัวเลือกการสร้างภาพ (accounts.catalog): เปลี่ยนเมื่อไรให้ทุก process โหลดใหม่
+# ==========================================
+@receiver([post_save, post_delete], sender=GenerateModel)
+@receiver([post_save, post_delete], sender=GenerateDimension)
+@receiver([post_save, post_delete], sender=GenerateCount)
+def catalog_changed(sender, **kwargs):
+    bump_version(CATALOG_VERSION)
+    clear_local_catalog()
+
@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+
+# ==========================================
+# Server-Sent Events (generate/events/, post/live/)
+# ==========================================
+# StreamingHttpResponse ต้องได้ iterator ให้ตรงกับ server:
+# - ASGI (uvicorn myauthen.asgi:application): async iterator -> ไม่กิน thread ระหว่างรอ
+# - WSGI / runserver: sync iterator -> ส่งทีละข้อความได้ทันที
+#   (ถ้าให้ async iterator ใต้ WSGI Django จะอ่านจนจบ stream ก่อนส่ง = client ไม่ได้อะไรเลย)
+# poll() ต้องไม่แตะ DB (อ่านจาก memory เท่านั้น) เพราะถูกเรียกได้ทั้งใน event loop และ thread
+
+STREAM_SECONDS = 600     # ปิด stream แล้วให้ EventSource ต่อใหม่เอง
+KEEPALIVE_SECONDS = 15   # ส่ง comment ว่าง ๆ กัน proxy ตัด connection
+
+
+def event_stream(request, poll, interval, on_open=None, on_close=None):
+    """
+    poll() -> str | None : ข้อมูล (JSON) ที่จะส่งเป็น event ถัดไป หรือ None ถ้ายังไม่มีอะไรใหม่
+    on_open() เมื่อ stream เริ่มส่งจริง แล้วเรียก poll ทุก interval วินาทีจนครบ STREAM_SECONDS แล้วเรียก on_close()
+    """
+    def tick(state):
+        data = poll()
+        now = time.monotonic()
+        if data is not None:
+            state["sent"] = now
+            return f"data: {data}\n\n"
+        if now - state["sent"] > KEEPALIVE_SECONDS:
+            state["sent"] = now
+            return ": ping\n\n"
+        return None
+
+    def sync_stream():
+        state = {"sent": time.monotonic()}
+        deadline = state["sent"] + STREAM_SECONDS
+        if on_open:
+            on_open()
+        try:
+            yield "retry: 3000\n\n"
+            while time.monotonic() < deadline:
+                chunk = tick(state)
+                if chunk:
+                    yield chunk
+                time.sleep(interval)
+        finally:
+            if on_close:
+                on_close()
+
+    async def async_stream():
+        state = {"sent": time.monotonic()}
+        deadline = state["sent"] + STREAM_SECONDS
+        if on_open:
+            on_open()
+        try:
+            yield "retry: 3000\n\n"
+            while time.monotonic() < deadline:
+                chunk = tick(state)
+                if chunk:
+                    yield chunk
+                await asyncio.sleep(interval)
+        finally:
+            if on_close:
+                on_close()
+
+    stream = async_stream() if isinstance(request, ASGIRequest) else sync_stream()
+    response = StreamingHttpResponse(stream, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,218 @@
+from datetime import datetime, time as dtime, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    Comment,
+    DailyModelUsage,
+    DailyStat,
+    DailyTagUsage,
+    GenerateHistory,
+    Post,
+    Tag,
+    UserStats,
+)
+
+
+# ==========================================
+# Rollup สถิติรายวัน (DailyStat / DailyModelUsage / DailyTagUsage)
+# ==========================================
+# ค่าทุกตัวเป็นตัวนับแบบ +/- ตามวันที่สร้างของแถวต้นทาง (เวลาท้องถิ่น)
+# -> ผลรวมทุกวัน = จำนวนแถวที่มีอยู่จริง, backfill() คำนวณใหม่ทั้งหมดได้ถ้าค่าเพี้ยน
+
+def local_date(dt=None):
+    return timezone.localdate(dt) if dt is not None else timezone.localdate()
+
+def day_range(day):
+    """(start, end) ของวันตามเวลาท้องถิ่น -> ใช้ filter แบบ range แทน __date (ใช้ index ได้)"""
+    start = timezone.make_aware(datetime.combine(day, dtime.min))
+    return start, start + timedelta(days=1)
+
+def _bump(model, lookup, field, delta):
+    """UPDATE ... SET field = field + delta; ถ้ายังไม่มีแถวของวันนั้นให้ INSERT (กัน race ด้วย unique)"""
+    if not delta:
+        return
+    if model.objects.filter(**lookup).update(**{field: F(field) + delta}):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **{field: delta})
+    except IntegrityError:
+        # อีก request สร้างแถวไปก่อนแล้ว
+        model.objects.filter(**lookup).update(**{field: F(field) + delta})
+
+def bump(day, field, delta=1):
+    _bump(DailyStat, {"date": day}, field, delta)
+
+def bump_model(day, model_name, delta=1):
+    _bump(DailyModelUsage, {"date": day, "model_name": model_name or ""}, "count", delta)
+
+def bump_tags(day, tag_ids, delta=1):
+    for tag_id in tag_ids:
+        _bump(DailyTagUsage, {"date": day, "tag_id": tag_id}, "count", delta)
+
+def record_generations(created_at, model_name, n):
+    """เรียกหลัง bulk_create GenerateHistory (bulk_create ไม่ส่ง post_save)"""
+    day = local_date(created_at)
+    bump(day, "generations", n)
+    bump_model(day, model_name, n)
+
+
+# ---------------- อ่านค่าสำหรับ dashboard ----------------
+def totals(since=None):
+    qs = DailyStat.objects.all()
+    if since is not None:
+        qs = qs.filter(date__gte=since)
+    agg = qs.aggregate(
+        users=Sum("new_users"), posts=Sum("posts"), comments=Sum("comments"), generations=Sum("generations")
+    )
+    return {k: v or 0 for k, v in agg.items()}
+
+def today():
+    row = DailyStat.objects.filter(date=local_date()).first()
+    return row or DailyStat(date=local_date())
+
+def top_models(limit=5, since=None):
+    """limit=None -> ทั้งหมด"""
+    qs = DailyModelUsage.objects.all()
+    if since is not None:
+        qs = qs.filter(date__gte=since)
+    return list(
+        qs.values("model_name").annotate(count=Sum("count")).filter(count__gt=0).order_by("-count", "model_name")[:limit]
+    )
+
+def top_tags(limit=5, since=None):
+    """คืน Tag ที่มี .count (ใช้แทน Tag.objects.annotate(count=Count('posts'))), limit=None -> ทั้งหมด"""
+    qs = DailyTagUsage.objects.all()
+    if since is not None:
+        qs = qs.filter(date__gte=since)
+    rows = list(qs.values("tag_id").annotate(count=Sum("count")).filter(count__gt=0).order_by("-count", "tag_id")[:limit])
+    tags = Tag.objects.in_bulk([r["tag_id"] for r in rows])
+    result = []
+    for r in rows:
+        tag = tags.get(r["tag_id"])
+        if tag is not None:
+            tag.count = r["count"]
+            result.append(tag)
+    return result
+
+
+# ---------------- backfill ----------------
+def _per_day(qs, field="created_at", *extra):
+    return qs.annotate(day=TruncDate(field, tzinfo=timezone.get_current_timezone())).values("day", *extra).annotate(n=Count("pk"))
+
+@transaction.atomic
+def backfill():
+    """ลบ rollup ทั้งหมดแล้วคำนวณใหม่จากตารางจริง (GROUP BY วัน) คืนจำนวนแถวที่สร้าง"""
+    DailyStat.objects.all().delete()
+    DailyModelUsage.objects.all().delete()
+    DailyTagUsage.objects.all().delete()
+
+    days = {}
+    def row(day):
+        if day not in days:
+            days[day] = DailyStat(date=day)
+        return days[day]
+
+    for r in _per_day(User.objects.all(), "date_joined"):
+        row(r["day"]).new_users = r["n"]
+    for r in _per_day(Post.objects.all()):
+        row(r["day"]).posts = r["n"]
+    for r in _per_day(Comment.objects.all()):
+        row(r["day"]).comments = r["n"]
+    for r in _per_day(GenerateHistory.objects.all()):
+        row(r["day"]).generations = r["n"]
+    DailyStat.objects.bulk_create(days.values())
+
+    models = DailyModelUsage.objects.bulk_create([
+        DailyModelUsage(date=r["day"], model_name=r["model_name"] or "", count=r["n"])
+        for r in _per_day(GenerateHistory.objects.all(), "created_at", "model_name")
+    ])
+
+    through = Post.tags.through.objects.all()
+    tags = DailyTagUsage.objects.bulk_create([
+        DailyTagUsage(date=r["day"], tag_id=r["tag_id"], count=r["n"])
+        for r in _per_day(through, "post__created_at", "tag_id")
+    ])
+    return {"days": len(days), "models": len(models), "tags": len(tags)}
+
+
+# ==========================================
+# สถิติหัวโปรไฟล์ต่อผู้ใช้ (UserStats)
+# ==========================================
+# แถวถูกสร้างตอนสมัคร (signals.user_created) หรือด้วย backfill_user_stats (ผู้ใช้เดิมก่อนมีตารางนี้)
+# ตัวนับอัปเดตด้วย UPDATE +/- เท่านั้น (ไม่ INSERT) -> ไม่สร้างแถวให้ผู้ใช้ที่กำลังถูกลบ
+# (signal ของ cascade วิ่งหลังแถว UserStats หายไปแล้ว), ฝั่งอ่าน (GET / ETag) ไม่เขียน DB
+
+def _user_stats_key(user_id):
+    return f"user_stats:{user_id}"
+
+def clear_user_stats_cache(user_id):
+    key = _user_stats_key(user_id)
+    cache.delete(key)
+    # ถ้ายังอยู่ใน transaction: request อื่นอาจ cache ค่าเก่าไว้ระหว่างรอ commit -> ลบซ้ำหลัง commit
+    transaction.on_commit(lambda: cache.delete(key))
+
+def bump_user(user_id, field, delta=1):
+    if not user_id or not delta:
+        return
+    UserStats.objects.filter(user_id=user_id).update(**{field: F(field) + delta})
+    clear_user_stats_cache(user_id)
+
+def remove_likes_received(likes):
+    """หัก likes_received ของเจ้าของโพสต์ตามแถว like (Post.likes.through) ใน queryset -> เรียกก่อนลบแถว
+    (through ที่ Django สร้างเองไม่ส่ง pre/post_delete ทั้งตอน remove/clear และ cascade)"""
+    per_owner = likes.values("post__user_id").annotate(n=Count("pk")).order_by().values_list("post__user_id", "n")
+    for owner_id, n in per_owner:
+        bump_user(owner_id, "likes_received", -n)
+
+def create_user_stats(user_id):
+    """แถวเปล่าของผู้ใช้ใหม่ (ยังไม่มีโพสต์/ประวัติ) -> ignore_conflicts กันซ้ำกับ backfill"""
+    UserStats.objects.bulk_create([UserStats(user_id=user_id)], ignore_conflicts=True)
+    clear_user_stats_cache(user_id)
+
+def user_stats(user_id):
+    """UserStats ของผู้ใช้: จาก cache -> แถวเดียวตาม pk (อ่านอย่างเดียว)
+    ผู้ใช้ที่ยังไม่มีแถว (ยังไม่ได้รัน backfill_stats) -> ค่า 0 ทั้งหมด ไม่นับ/ไม่ INSERT ระหว่าง request"""
+    key = _user_stats_key(user_id)
+    row = cache.get(key)
+    if row is not None:
+        return row
+    row = UserStats.objects.filter(user_id=user_id).first()
+    if row is None:
+        row = UserStats(user_id=user_id)
+    cache.set(key, row, settings.USER_STATS_CACHE_SECONDS)
+    return row
+
+def _per_user(qs, field):
+    return dict(qs.values(field).annotate(n=Count("pk")).order_by().values_list(field, "n"))
+
+@transaction.atomic
+def backfill_user_stats():
+    """คำนวณ UserStats ของผู้ใช้ทุกคนใหม่ (GROUP BY ผู้ใช้) คืนจำนวนแถว"""
+    posts = _per_user(Post.objects.all(), "user_id")
+    likes = _per_user(Post.likes.through.objects.all(), "post__user_id")
+    comments = _per_user(Comment.objects.all(), "post__user_id")
+    generations = _per_user(GenerateHistory.objects.all(), "user_id")
+
+    UserStats.objects.all().delete()
+    user_ids = list(User.objects.values_list("pk", flat=True))
+    rows = UserStats.objects.bulk_create([
+        UserStats(
+            user_id=uid,
+            posts=posts.get(uid, 0),
+            likes_received=likes.get(uid, 0),
+            comments_received=comments.get(uid, 0),
+            generations=generations.get(uid, 0),
+        )
+        for uid in user_ids
+    ], batch_size=1000)
+    keys = [_user_stats_key(uid) for uid in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+    return len(rows)
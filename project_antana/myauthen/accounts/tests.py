@@ -0,0 +1,214 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from .models import Tag
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_page
+from .scheduler import AdmissionError, FairScheduler, _TokenBucket
+
+
+def _user(user_id, is_staff=False):
+    return SimpleNamespace(id=user_id, is_staff=is_staff)
+
+
+# ==========================================
+# Fair-share scheduler (accounts/scheduler.py)
+# ==========================================
+
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch("accounts.scheduler.time.monotonic", return_value=1000.0)
+        self.clock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def advance(self, seconds):
+        self.clock.return_value += seconds
+
+    def test_refill_over_time(self):
+        bucket = _TokenBucket(rate=1.0, capacity=4)
+        self.assertEqual(bucket.take(4), 0)
+        self.assertEqual(bucket.take(1), 1.0)
+        self.advance(0.5)
+        self.assertEqual(bucket.take(1), 0.5)
+        self.advance(0.5)
+        self.assertEqual(bucket.take(1), 0)
+
+    def test_refill_caps_at_capacity(self):
+        bucket = _TokenBucket(rate=1.0, capacity=4)
+        self.advance(3600)
+        self.assertEqual(bucket.take(4), 0)
+        self.assertEqual(bucket.take(1), 1.0)
+
+    def test_cost_above_capacity_is_charged_in_full(self):
+        bucket = _TokenBucket(rate=1.0, capacity=8)
+        self.assertEqual(bucket.take(20), 0)
+        self.assertEqual(bucket.tokens, -12)
+        # หนี้ 12 + ภาพถัดไป 1 -> รอ 13 วินาที
+        self.assertEqual(bucket.take(1), 13.0)
+        self.advance(13)
+        self.assertEqual(bucket.take(1), 0)
+
+    def test_cost_above_capacity_waits_for_full_bucket(self):
+        bucket = _TokenBucket(rate=1.0, capacity=8)
+        bucket.take(2)
+        self.assertEqual(bucket.take(20), 2.0)
+        self.advance(2)
+        self.assertEqual(bucket.take(20), 0)
+
+
+class FairSchedulerTests(SimpleTestCase):
+    def scheduler(self, **kwargs):
+        options = dict(slots=1, rate_per_minute=6000, burst=100, max_inflight=10, max_queue=10, queue_timeout=1)
+        options.update(kwargs)
+        return FairScheduler(**options)
+
+    def test_round_robin_between_users(self):
+        scheduler = self.scheduler()
+        alice, bob = _user(1), _user(2)
+        first = scheduler._admit(alice, 1)
+        queued = [scheduler._admit(alice, 1), scheduler._admit(alice, 1), scheduler._admit(bob, 1)]
+        self.assertTrue(first.granted.is_set())
+        self.assertFalse(any(t.granted.is_set() for t in queued))
+
+        order = []
+        running = first
+        for _ in queued:
+            scheduler._release(running, ran=True)
+            running = next(t for t in queued if t.granted.is_set() and t not in order)
+            order.append(running)
+        # alice ส่ง 2 งานก่อน bob แต่ bob ได้ slot ก่อนงานที่สองของ alice
+        self.assertEqual([t.user_id for t in order], [1, 2, 1])
+        self.assertEqual(order[0], queued[0])
+        self.assertEqual(order[2], queued[1])
+
+    def test_staff_jump_the_queue(self):
+        scheduler = self.scheduler()
+        running = scheduler._admit(_user(1), 1)
+        user_ticket = scheduler._admit(_user(2), 1)
+        staff_ticket = scheduler._admit(_user(3, is_staff=True), 1)
+        scheduler._release(running, ran=True)
+        self.assertTrue(staff_ticket.granted.is_set())
+        self.assertFalse(user_ticket.granted.is_set())
+
+    def test_inflight_limit(self):
+        scheduler = self.scheduler(max_inflight=1)
+        ticket = scheduler._admit(_user(1), 1)
+        with self.assertRaises(AdmissionError) as ctx:
+            scheduler._admit(_user(1), 1)
+        self.assertEqual(ctx.exception.status, 429)
+        scheduler._release(ticket, ran=True)
+        scheduler._admit(_user(1), 1)
+
+    def test_queue_full(self):
+        scheduler = self.scheduler(max_queue=1)
+        scheduler._admit(_user(1), 1)
+        scheduler._admit(_user(2), 1)
+        with self.assertRaises(AdmissionError) as ctx:
+            scheduler._admit(_user(3), 1)
+        self.assertEqual(ctx.exception.status, 503)
+
+    def test_rate_limit_charges_full_batch(self):
+        scheduler = self.scheduler(rate_per_minute=60, burst=4)
+        with mock.patch("accounts.scheduler.time.monotonic", return_value=1000.0):
+            ticket = scheduler._admit(_user(1), 10)
+            scheduler._release(ticket, ran=True)
+            with self.assertRaises(AdmissionError) as ctx:
+                scheduler._admit(_user(1), 1)
+        self.assertEqual(ctx.exception.status, 429)
+        # หนี้ 6 + 1 ภาพ = รอ 7 วินาที (ข้อความปัดขึ้น)
+        self.assertIn("8 วินาที", str(ctx.exception))
+
+    def test_staff_skip_rate_limit(self):
+        scheduler = self.scheduler(slots=10, rate_per_minute=1, burst=1)
+        staff = _user(1, is_staff=True)
+        for _ in range(5):
+            scheduler._release(scheduler._admit(staff, 10), ran=True)
+
+    def test_timed_out_ticket_leaves_queue(self):
+        scheduler = self.scheduler()
+        running = scheduler._admit(_user(1), 1)
+        waiting = scheduler._admit(_user(2), 1)
+        scheduler._release(waiting, ran=False)
+        self.assertEqual(scheduler.queued(), 0)
+        scheduler._release(running, ran=True)
+        self.assertEqual(scheduler._running, 0)
+        self.assertEqual(scheduler._inflight, {})
+
+
+# ==========================================
+# Keyset pagination (accounts/pagination.py)
+# ==========================================
+
+class CursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        values = [3, "2024-01-01T00:00:00+00:00", "ชื่อ"]
+        self.assertEqual(decode_cursor(encode_cursor(values)), values)
+
+    def test_garbage_cursor(self):
+        for cursor in ("!!!", "bm90IGpzb24", encode_cursor({"a": 1})[:-2], "eyJhIjoxfQ"):
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+
+class KeysetPageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # category ซ้ำกัน -> pk เป็นตัวตัดสินลำดับในกลุ่มเดียวกัน
+        cls.tags = [Tag.objects.create(name=f"t{i}", category=f"c{i % 3}") for i in range(7)]
+
+    def walk(self, order, limit, qs=None):
+        qs = qs if qs is not None else Tag.objects.all()
+        pages, cursor = [], None
+        while True:
+            rows, cursor = keyset_page(qs, order, cursor, limit)
+            pages.append(rows)
+            if cursor is None:
+                return pages
+
+    def expected(self, order):
+        return list(Tag.objects.order_by(*order))
+
+    def test_ascending_pages_cover_all_rows_once(self):
+        order = ["category", "pk"]
+        pages = self.walk(order, 3)
+        self.assertEqual([len(p) for p in pages], [3, 3, 1])
+        self.assertEqual([t for p in pages for t in p], self.expected(order))
+
+    def test_descending_pages_cover_all_rows_once(self):
+        order = ["-category", "-pk"]
+        pages = self.walk(order, 2)
+        self.assertEqual([len(p) for p in pages], [2, 2, 2, 1])
+        self.assertEqual([t for p in pages for t in p], self.expected(order))
+
+    def test_exact_multiple_has_no_empty_last_page(self):
+        pages = self.walk(["-pk"], 7)
+        self.assertEqual([len(p) for p in pages], [7])
+        pages = self.walk(["pk"], 1)
+        self.assertEqual(len(pages), 7)
+        self.assertTrue(all(pages))
+
+    def test_values_rows(self):
+        order = ["-category", "-pk"]
+        qs = Tag.objects.values("pk", "category")
+        pages = self.walk(order, 4, qs)
+        self.assertEqual([r["pk"] for p in pages for r in p], [t.pk for t in self.expected(order)])
+
+    def test_tampered_cursor(self):
+        order = ["category", "pk"]
+        _, cursor = keyset_page(Tag.objects.all(), order, None, 2)
+        bad = [
+            "not-base64!",
+            encode_cursor(["c0"]),              # จำนวนคอลัมน์ไม่ตรง
+            encode_cursor(["c0", "abc"]),       # pk ไม่ใช่ตัวเลข
+            encode_cursor({"category": "c0"}),  # ไม่ใช่ list
+            cursor[:-3],
+        ]
+        for value in bad:
+            with self.subTest(cursor=value), self.assertRaises(InvalidCursor):
+                keyset_page(Tag.objects.all(), order, value, 2)
+
+    def test_cursor_from_other_order_is_rejected(self):
+        _, cursor = keyset_page(Tag.objects.all(), ["category", "pk"], None, 2)
+        with self.assertRaises(InvalidCursor):
+            keyset_page(Tag.objects.all(), ["-pk"], cursor, 2)
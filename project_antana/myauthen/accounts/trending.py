@@ -0,0 +1,109 @@
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Comment, Post, PostScore
+from .pagination import keyset_page
+
+
+# ==========================================
+# Trending: คะแนนต่อโพสต์แบบ time-decay เก็บใน PostScore
+# ==========================================
+# score = ผลรวมของ weight ของ like/comment โดยค่าเก่าลดลงครึ่งหนึ่งทุก TRENDING_HALF_LIFE_HOURS
+# - like / comment ใหม่: UPDATE score = score + weight (signals.py) ไม่ต้องรวมทั้งตาราง
+# - decay(): คูณทุกแถวด้วยตัวคูณของช่วงเวลาที่ผ่านไป แล้วลบแถวที่เหลือคะแนนน้อย (cron: decay_trending)
+#   -> ตารางมีเฉพาะโพสต์ที่มีความเคลื่อนไหวช่วงหลัง, แท็บ Popular = index scan บน (-score, -post)
+# ถอน like / ลบ comment หัก weight เต็ม (ไม่รู้ว่าถูก decay ไปเท่าไร) แต่ไม่ให้ต่ำกว่า 0
+
+LIKE_WEIGHT = 1.0
+COMMENT_WEIGHT = 2.0
+RANK_ORDER = ["-score", "-pk"]
+
+
+def bump(post_id, delta):
+    if not delta:
+        return
+    rows = PostScore.objects.filter(post_id=post_id)
+    if rows.update(score=Greatest(F("score") + delta, Value(0.0))) or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            PostScore.objects.create(post_id=post_id, score=delta)
+    except IntegrityError:
+        # อีก request สร้างแถวไปก่อน (หรือโพสต์ถูกลบไปแล้ว)
+        rows.update(score=F("score") + delta)
+
+def record_likes(post_id, n):
+    bump(post_id, LIKE_WEIGHT * n)
+
+def record_comments(post_id, n):
+    bump(post_id, COMMENT_WEIGHT * n)
+
+def remove_likes(likes):
+    """หักคะแนนตามแถว like (Post.likes.through) ใน queryset ที่กำลังจะถูกลบโดยไม่มี m2m_changed"""
+    for post_id, n in likes.values("post_id").annotate(n=Count("pk")).order_by().values_list("post_id", "n"):
+        record_likes(post_id, -n)
+
+
+def decay_factor(minutes):
+    return 0.5 ** (minutes / 60 / settings.TRENDING_HALF_LIFE_HOURS)
+
+@transaction.atomic
+def decay(minutes):
+    """
+    ลดคะแนนทุกแถวตามเวลา minutes ที่ผ่านไปตั้งแต่รอบก่อน (= ช่วงของ cron) คืน (แถวที่ลด, แถวที่ลบ)
+    UPDATE ทีละแถวเป็น atomic -> like ที่เข้ามาระหว่างนี้ไม่หาย
+    """
+    decayed = PostScore.objects.update(score=F("score") * decay_factor(minutes))
+    pruned, _ = PostScore.objects.filter(score__lt=settings.TRENDING_MIN_SCORE).delete()
+    return decayed, pruned
+
+
+@transaction.atomic
+def rebuild(now=None):
+    """
+    คำนวณคะแนนใหม่ทั้งตาราง (ครั้งแรกหลัง migrate หรือเมื่อค่าเพี้ยน) คืนจำนวนแถว
+    comment ใช้ created_at ของตัวเอง; แถว like ไม่มีเวลา -> ใช้เวลาโพสต์แทน
+    ดูย้อนหลังเฉพาะช่วงที่ weight ยังไม่ต่ำกว่า TRENDING_MIN_SCORE
+    """
+    now = now or timezone.now()
+    half_life = settings.TRENDING_HALF_LIFE_HOURS * 3600
+    horizon = now - timedelta(
+        seconds=half_life * math.log2(max(LIKE_WEIGHT, COMMENT_WEIGHT) / settings.TRENDING_MIN_SCORE)
+    )
+
+    def weight(w, at):
+        return w * 0.5 ** (max((now - at).total_seconds(), 0) / half_life)
+
+    scores = {}
+    likes = (
+        Post.likes.through.objects.filter(post__created_at__gte=horizon)
+        .values("post_id", "post__created_at").annotate(n=Count("pk")).order_by()
+    )
+    for row in likes:
+        scores[row["post_id"]] = scores.get(row["post_id"], 0) + row["n"] * weight(LIKE_WEIGHT, row["post__created_at"])
+    for post_id, created_at in Comment.objects.filter(created_at__gte=horizon).values_list("post_id", "created_at").iterator():
+        scores[post_id] = scores.get(post_id, 0) + weight(COMMENT_WEIGHT, created_at)
+
+    PostScore.objects.all().delete()
+    PostScore.objects.bulk_create(
+        [PostScore(post_id=post_id, score=s) for post_id, s in scores.items() if s >= settings.TRENDING_MIN_SCORE],
+        batch_size=1000,
+    )
+    return PostScore.objects.count()
+
+
+def trending_page(cursor=None, limit=None):
+    """
+    หนึ่งหน้าของแท็บ Popular: (posts, next_cursor) เรียงตามคะแนน
+    raise InvalidCursor ถ้า cursor ไม่ถูกต้อง
+    คะแนนเปลี่ยนระหว่างเลื่อนหน้าได้ -> โพสต์ที่ขยับข้ามจุดตัดอาจซ้ำ/หลุดหนึ่งครั้ง (รับได้สำหรับ feed)
+    """
+    qs = PostScore.objects.select_related("post__user__profile", "post__history")
+    rows, next_cursor = keyset_page(qs, RANK_ORDER, cursor, limit or settings.TRENDING_PAGE_SIZE)
+    return [row.post for row in rows], next_cursor
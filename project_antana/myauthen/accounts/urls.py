@@ -30,12 +30,15 @@ urlpatterns = [
     path('post/<int:post_id>/edit/', views.edit_post, name='edit_post'),
     path('post/<int:post_id>/delete/', views.delete_post, name='delete_post'),
     path('post/<int:post_id>/toggle-like/', views.toggle_like, name='toggle_like'),
+    path('post/live/', views.post_live_counts, name='post_live_counts'),
     
     # ==============================
     # Comments
     # ==============================
     path('post/<int:post_id>/add-comment/', views.add_comment, name='add_comment'),
     path('post/<int:post_id>/comment-modal/', views.comment_modal, name='comment_modal'),
+    path('post/<int:post_id>/comments/', views.comments_api, name='comments_api'),
+    path('post/<int:post_id>/related/', views.related_posts_partial, name='related_posts'),
     path('comment/<int:comment_id>/edit/', views.edit_comment, name='edit_comment'),
     path('comment/<int:comment_id>/delete/', views.delete_comment, name='delete_comment'),
 
@@ -46,7 +49,13 @@ urlpatterns = [
     path('generate/', views.generate_view, name='generate'),
     path("generate/", views.generate_view, name="generate_view"), 
     path('generate/delete-history/<int:pk>/', views.delete_history_view, name='delete_history_view'),
+    path("generate/history/bulk-delete/", views.bulk_delete_history, name="bulk_delete_history"),
+    path("generate/history/bulk-rate/", views.bulk_rate_history, name="bulk_rate_history"),
+    path("generate/history/", views.history_api, name="history_api"),
+    path("generate/history/<int:pk>/", views.history_detail_api, name="history_detail_api"),
+    path("generate/history/similar/", views.similar_prompts_api, name="similar_prompts_api"),
     path("generate/preview-frame/", views.generate_preview_frame, name="generate_preview_frame"),
+    path("generate/events/", views.generate_events, name="generate_events"),
     path("generate/ai-prompt/", views.call_agent_view, name="call_agent"),
     path("generate/translate-prompt/", views.translate_prompt_view, name="translate_prompt"),
     path("generate/ai-assist/", views.call_agent_assist_view, name="call_agent_assist"),
@@ -111,4 +120,5 @@ urlpatterns = [
     path("dashboard/tags/delete/<int:pk>/", views.admin_delete_tag, name="admin_delete_tag"),
     
     path("dashboard/ajax/widget/", views.ajax_dashboard_widget, name="ajax_dashboard_widget"),
+    path("dashboard/exports/<str:name>/", views.admin_export_download, name="admin_export_download"),
 ]
\ No newline at end of file
@@ -0,0 +1,46 @@
+import time
+
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+
+
+# ==========================================
+# ตัวเลข version ใน cache "versions" (ใช้ร่วมกันทุก worker: Redis หรือไฟล์) สำหรับ invalidate ข้อมูลที่ cache ไว้
+# ==========================================
+# ค่าเป็น timestamp แทน 0/1 -> ถ้า cache ถูกล้าง version ใหม่จะไม่ซ้ำกับของเก่า
+# ที่อาจยังค้างอยู่ใน cache ชั้นอื่น (local / fragment)
+# bump = เขียนค่าใหม่ที่ไม่ซ้ำ (time_ns) แทน incr: backend ไฟล์ไม่มี incr แบบ atomic
+# bump พร้อมกันสองครั้งได้ค่าที่ต่างจากก่อนหน้าทั้งคู่ -> ข้อมูลที่ cache ไว้ใต้ version เดิมหมดอายุเสมอ
+
+cache = ConnectionProxy(caches, "versions")
+
+def _key(name):
+    return f"version:{name}"
+
+def get_version(name):
+    key = _key(name)
+    version = cache.get(key)
+    if version is None:
+        seed = int(time.time() * 1000)
+        cache.add(key, seed, None)
+        # cache เต็มแล้วโดน cull ทันทีได้ -> ใช้ seed ไปก่อน
+        version = cache.get(key, seed)
+    return version
+
+def bump_version(name):
+    version = time.time_ns()
+    cache.set(_key(name), version, None)
+    return version
+
+def get_versions(names):
+    """{name: version} ของหลายตัวใน round-trip เดียว (ตัวที่ยังไม่มีค่อย seed)"""
+    keys = {_key(name): name for name in names}
+    found = cache.get_many(list(keys))
+    missing = [key for key in keys if key not in found]
+    if missing:
+        seed = int(time.time() * 1000)
+        for key in missing:
+            cache.add(key, seed, None)
+        found.update(cache.get_many(missing))
+    # key ที่ seed แล้วอาจถูก cull ไปแล้วระหว่างทาง (cache เต็ม) -> ใช้ seed ของรอบนี้แทน
+    return {name: found.get(key, seed if missing else None) for key, name in keys.items()}
@@ -1,27 +1,42 @@
 import json
+import operator
 import os
-import random
 import re
 import subprocess
 import time
-import uuid
+from bisect import bisect_right
+from functools import reduce
+from urllib.parse import urlencode
 
-import requests
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout, update_session_auth_hash
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
-from django.core.files.base import ContentFile
+from django.core.cache import cache
 from django.core.paginator import Paginator
+from django.db import transaction
 from django.db.models import Count, Q
-from django.http import JsonResponse
+from django.db.models.functions import Substr
+from django.http import FileResponse, Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.utils import timezone
+from django.template.loader import render_to_string
+from django.utils.dateparse import parse_date
+from django.utils.html import escape, format_html
 from django.utils.timesince import timesince
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import condition, require_POST
 
 # from .decorators import admin_required
+from . import stats
+from .batching import get_batcher
+from .catalog import get_catalog
+from .conditional import COMMENT_PAGE_SIZE, post_etag, revalidate, user_profile_etag
+from .deletion import request_account_deletion
+from .exports import export_path
+from .feed import attach_post_stats, card_posts
 from .forms import CommentForm, PostForm
+from .jobs import claim_job, delete_histories, save_generated_images
+from .live import ENGAGEMENT_CHANNEL, coalesce, get_pubsub
 from .models import (
     Comment,
     GenerateCount,
@@ -35,11 +50,15 @@ from .models import (
     SidebarMenu,
     Tag,
 )
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_page
+from .progress import store as progress_store
+from .prompt_index import EmbeddingError, similar_histories
+from .related import related_posts
+from .scheduler import AdmissionError, get_scheduler
+from .sse import event_stream
+from .trending import trending_page
 
 
-COMFY_HOST = os.environ.get("COMFY_HOST", "http://127.0.0.1:8188")
-WORKFLOW_PATH = os.path.join(os.path.dirname(__file__), "workflows", "workflows1.json")
-
 # ==========================================
 # Decorators (ย้ายมาจาก decorators.py)
 # ==========================================
@@ -121,20 +140,23 @@ def logout_view(request):
 
 @login_required(login_url= 'login')
 def profile_view(request):
-    posts = Post.objects.filter(user=request.user).select_related('history', 'user__profile').prefetch_related('tags')
-    return render(request, 'profile/profile.html', {'posts': posts})
-
-
-def user_profile(request, username):
-    user_p = get_object_or_404(User, username=username)
-    posts = Post.objects.filter(user=user_p).select_related('history', 'user__profile').prefetch_related('tags').order_by('-created_at')
-    
-    return render(request, 'profile/user_profile.html', {
-        'user_profile': user_p,
-        'profile': user_p.profile,
-        'posts': posts
+    posts, next_cursor = _user_posts_page(request, request.user)
+    return render(request, 'profile/profile.html', {
+        'posts': posts,
+        'next_cursor': next_cursor,
+        'user_stats': stats.user_stats(request.user.pk),
+        'card_ttl': settings.POST_CARD_CACHE_SECONDS,
     })
 
+def _user_posts_page(request, user):
+    """โพสต์ของผู้ใช้ทีละหน้า ?cursor= (keyset ใหม่สุดก่อน เหมือนฟีด) cursor เสีย -> หน้าแรก"""
+    qs = card_posts(Post.objects.filter(user=user))
+    try:
+        posts, next_cursor = keyset_page(qs, ["-created_at", "-pk"], request.GET.get("cursor") or None, settings.FEED_PAGE_SIZE)
+    except InvalidCursor:
+        posts, next_cursor = keyset_page(qs, ["-created_at", "-pk"], None, settings.FEED_PAGE_SIZE)
+    return attach_post_stats(posts, request.user), next_cursor
+
 
 @login_required(login_url='login')
 def edit_profile_view(request):
@@ -200,8 +222,9 @@ def settings_view(request):
 @login_required
 def delete_account_confirm(request):
     if request.method == "POST":
-        user = request.user
-        user.delete()
+        # ปิดบัญชีทันที ข้อมูลถูกลบต่อใน background (accounts/deletion.py)
+        request_account_deletion(request.user)
+        logout(request)
         messages.success(request, "บัญชีถูกลบเรียบร้อยแล้ว")
         return redirect("login_register")
     return render(request, "components/confirm_delete.html")
@@ -222,6 +245,7 @@ def generate_view(request):
         positive     = request.POST.get("positive_prompt", "").strip()
         negative     = request.POST.get("negative_prompt", "").strip()
         seed_str     = request.POST.get("seed", "").strip()
+        job_id       = request.POST.get("job_id", "").strip()
 
         # ---------------- Validate ----------------
         # batch
@@ -230,6 +254,15 @@ def generate_view(request):
         except ValueError:
             batch = 1
 
+        # รับเฉพาะจำนวนภาพที่เปิดใช้งานใน GenerateCount
+        catalog = get_catalog()
+        allowed_counts = catalog.allowed_counts
+        if batch < 1 or (allowed_counts and batch not in allowed_counts) or (not allowed_counts and batch != 1):
+            return JsonResponse(
+                {"status": "error", "message": "จำนวนภาพไม่ถูกต้อง"},
+                status=400
+            )
+
         # seed
         seed = None
         if seed_str:
@@ -274,9 +307,8 @@ def generate_view(request):
 
 
         # ---------------- Load Model ----------------
-        try:
-            model_obj = GenerateModel.objects.get(id=model_id)
-        except GenerateModel.DoesNotExist:
+        model_obj = catalog.get_model(model_id)
+        if model_obj is None:
             return JsonResponse({
                 "status": "error",
                 "message": "ไม่พบโมเดลที่เลือก"
@@ -286,29 +318,39 @@ def generate_view(request):
 
         # ---------------- Load Dimension ----------------
         try:
-            dim_obj = GenerateDimension.objects.get(id=dimension_id)
-            raw = dim_obj.value.replace("px", "").replace(" ", "")
-            width_str, height_str = raw.split("x")
-            width = int(width_str)
-            height = int(height_str)
-        except Exception as e:
+            width, height = catalog.get_dimension_size(dimension_id)
+        except ValueError as e:
             return JsonResponse({
                 "status": "error",
                 "message": f"Dimension ผิดรูปแบบ: {e}"
             }, status=400)
 
         # ---------------- Generate via ComfyUI ----------------
+        # รอคิวแบบ fair-share ก่อน แล้วผ่าน micro-batcher
+        # (prompt เดียวกันจากหลายคนที่ไม่ระบุ seed ถูกรวมเป็น latent batch เดียว)
+        # สถานะคิว / step / preview ถูกส่งให้หน้าเว็บผ่าน generate_events
+        progress_id = progress_store.create(request.user.id, job_id if re.fullmatch(r"[0-9a-f]{32}", job_id) else None)
         try:
-            result = generate_image_with_workflow(
-                model_name = ckpt,
-                positive   = positive,
-                negative   = negative,
-                seed       = seed,     # ใช้ seed จากฟอร์ม (None = auto random)
-                width      = width,
-                height     = height,
-                n_images   = batch
-            )
+            with get_scheduler().acquire(request.user, batch, progress_id):
+                result = get_batcher().submit(
+                    model_name  = ckpt,
+                    positive    = positive,
+                    negative    = negative,
+                    seed        = seed,     # ใช้ seed จากฟอร์ม (None = auto random)
+                    width       = width,
+                    height      = height,
+                    n_images    = batch,
+                    progress_id = progress_id,
+                    record      = {"user_id": request.user.id, "model_name": model_obj.name},
+                ).result()
+        except AdmissionError as e:
+            progress_store.finish(progress_id, e)
+            return JsonResponse({
+                "status": "busy",
+                "message": str(e),
+            }, status=e.status)
         except TimeoutError as e:
+            # งานยังค้างใน GenerationJob -> reconciler จะนำภาพเข้า History เมื่อ ComfyUI ทำเสร็จ
             return JsonResponse({
                 "status": "timeout",
                 "message": str(e),
@@ -325,49 +367,17 @@ def generate_view(request):
         seed_used = result.get("seed", seed)
 
         # ---------------- Save History ----------------
-        # ---------------- Save History ----------------
+        # claim งานก่อน: ถ้า reconciler นำเข้าไปแล้วจะไม่บันทึกซ้ำ
         history_ids = []
-        for url in img_urls:
-            h = GenerateHistory.objects.create(
-                user             = request.user,
-                model_name       = model_obj.name,
-                positive_prompt  = positive,
-                negative_prompt  = negative,
-                seed             = seed_used,
-                image_url        = url, # Temporary keep original URL
-                created_at       = timezone.now(),
+        if claim_job(result.get("job_record_id")):
+            history_ids, img_urls = save_generated_images(
+                request.user.id, model_obj.name, positive, negative, seed_used, img_urls
             )
-            
-            # --- Download and Save to Local Storage ---
-            try:
-                # 1. Download content
-                # url is like http://127.0.0.1:8188/view?filename=...
-                # We need to ensure we can reach it.
-                resp = requests.get(url, timeout=30)
-                if resp.status_code == 200:
-                    # 2. Generate filename
-                    unique_name = f"gen_{request.user.id}_{uuid.uuid4().hex[:8]}.png"
-                    
-                    # 3. Save to ImageField
-                    h.image_file.save(unique_name, ContentFile(resp.content), save=True)
-                    
-                    # 4. Update image_url to be the local MEDIA URL
-                    # This ensures frontend template usage of {{ item.image_url }} works with the local file
-                    h.image_url = h.image_file.url
-                    h.save()
-                    
-                    # Update local list so the immediate JSON response is correct
-                    img_urls[img_urls.index(url)] = h.image_file.url
-                    
-            except Exception as e:
-                print(f"Error downloading/saving image: {e}")
-            # ------------------------------------------
-
-            history_ids.append(h.id)
 
         # ---------------- Return JSON ----------------
         return JsonResponse({
             "status": "success",
+            "job_id": progress_id,
             "images": img_urls,
             "history_ids": history_ids,
             "seed": seed_used,
@@ -377,12 +387,11 @@ def generate_view(request):
         })
 
     # ============ GET: Render Page ============
-    models_available = GenerateModel.objects.filter(is_active=True)
-    dimensions       = GenerateDimension.objects.filter(is_active=True)
-    numbers          = GenerateCount.objects.filter(is_active=True)
-    histories        = GenerateHistory.objects.filter(
-        user=request.user
-    ).order_by("-created_at")[:30]
+    catalog          = get_catalog()
+    models_available = catalog.models
+    dimensions       = catalog.dimensions
+    numbers          = catalog.counts
+    histories, history_cursor = _history_page(request.user, {})
 
     return render(
         request,
@@ -392,75 +401,10 @@ def generate_view(request):
             "dimensions": dimensions,
             "numbers": numbers,
             "histories": histories,
+            "history_cursor": history_cursor,
         }
     )
 
-def _as_int(x, default):
-    try:
-        return int(x)
-    except Exception:
-        return int(default)
-
-def _mul8(x, default=512):
-    """บังคับให้เป็นจำนวนที่หาร 8 ลงตัว (latent ส่วนใหญ่ต้องเป็น multiple of 8)"""
-    v = _as_int(x, default)
-    return max(64, (v // 8) * 8)
-
-def _normalize_model_name(model_name: str) -> str:
-    """
-    แปลงชื่อที่มาจาก UI ให้เป็นไฟล์ ckpt/safetensors ที่ ComfyUI เห็นจริง
-    ปรับ mapping ให้ตรงกับ checkpoints ที่คุณมีใน ComfyUI
-    """
-    mapping = {
-        "Nova XL v9.0": "novaOrangeXL_v90.safetensors",
-        "ilustmix v8.0": "ilustmix_v80.safetensors",
-    }
-    if not model_name:
-        return "novaOrangeXL_v90.safetensors"
-    if model_name.endswith(".safetensors") or model_name.endswith(".ckpt"):
-        return model_name
-    return mapping.get(model_name, model_name)
-
-def _post_json(url: str, payload: dict, timeout: int = 60):
-    """POST แบบ JSON พร้อม error message ที่อ่านง่าย"""
-    try:
-        r = requests.post(url, json=payload, timeout=timeout)
-    except requests.RequestException as e:
-        raise RuntimeError(f"POST {url} failed: {e}")
-    if r.status_code != 200:
-        raise RuntimeError(f"POST {url} -> {r.status_code}: {r.text}")
-    try:
-        return r.json()
-    except Exception:
-        raise RuntimeError(f"POST {url} returned non-JSON: {r.text[:500]}")
-
-def _get_json(url: str, timeout: int = 30):
-    """GET แล้วแปลงเป็น JSON พร้อมข้อความ error อ่านง่าย"""
-    try:
-        r = requests.get(url, timeout=timeout)
-    except requests.RequestException as e:
-        raise RuntimeError(f"GET {url} failed: {e}")
-    if r.status_code != 200:
-        raise RuntimeError(f"GET {url} -> {r.status_code}: {r.text}")
-    try:
-        return r.json()
-    except Exception:
-        raise RuntimeError(f"GET {url} returned non-JSON: {r.text[:500]}")
-
-def _poll_history(prompt_id: str, max_secs: int = 300, sleep_secs: float = 1.0):
-    """
-    โพลผลลัพธ์จาก /history/<prompt_id> จนกว่าจะมี outputs
-    คืน dict history ของ ComfyUI
-    """
-    start = time.time()
-    url = f"{COMFY_HOST}/history/{prompt_id}"
-    while time.time() - start <= max_secs:
-        data = _get_json(url, timeout=15)
-        if prompt_id in data and data[prompt_id].get("outputs"):
-            return data
-        time.sleep(sleep_secs)
-    raise TimeoutError(f"ComfyUI did not produce output within {max_secs}s for prompt_id={prompt_id}")
-
 def _parse_label_value_csv(csv_text, as_int=False):
     """
     'A|100, B|200, C' -> [{'label':'A','value':100}, {'label':'B','value':200}, {'label':'C','value':'C'}]
@@ -551,84 +495,24 @@ def _get_generate_presets():
         "size_px_map": size_map,
     }
 
-# =========================
-# == COMFY PAYLOAD BUILDER
-# =========================
-def build_prompt_graph(model_name, positive, negative, seed, width, height, n_images=1):
-    """
-    โหลด workflows2.json แล้วตั้งค่า node id ตามไฟล์ workflow ของคุณ:
-      1: CheckpointLoaderSimple -> ckpt_name
-      2: CLIPTextEncode (positive) -> text
-      3: CLIPTextEncode (negative) -> text
-      4: KSampler -> seed
-      5: EmptyLatentImage -> width/height/batch_size
-      7: SaveImage (output)
-    คืน payload พร้อมส่ง /prompt
-    """
-    with open(WORKFLOW_PATH, "r", encoding="utf-8") as f:
-        wf = json.load(f)
-
-    ckpt  = _normalize_model_name(model_name)
-    seed  = _as_int(seed if seed not in [None, ""] else random.randint(1, 4294967295), random.randint(1, 4294967295))
-    width = _mul8(width, 512)
-    height = _mul8(height, 512)
-    batch = max(1, _as_int(n_images or 1, 1))
-
-    # id=1
-    if "1" in wf and "inputs" in wf["1"]:
-        wf["1"]["inputs"]["ckpt_name"] = ckpt
-    # id=2
-    if "2" in wf and "inputs" in wf["2"]:
-        wf["2"]["inputs"]["text"] = positive or ""
-    # id=3
-    if "3" in wf and "inputs" in wf["3"]:
-        wf["3"]["inputs"]["text"] = negative or ""
-    # id=4
-    if "4" in wf and "inputs" in wf["4"]:
-        wf["4"]["inputs"]["seed"] = seed
-    # id=5
-    if "5" in wf and "inputs" in wf["5"]:
-        wf["5"]["inputs"]["width"] = width
-        wf["5"]["inputs"]["height"] = height
-        wf["5"]["inputs"]["batch_size"] = max(1, int(n_images or 1))  # ถ้าอยากได้หลายรูป
-
-    return {"prompt": wf, "client_id": "django-ui"}
-
-def generate_image_with_workflow(model_name, positive, negative, seed, width, height, n_images=None):
+
+@login_required(login_url='login')
+async def generate_events(request):
     """
-    ส่ง workflow ไป ComfyUI และดึง URL รูปกลับมาเป็นลิสต์
-    คืน dict: {"image_urls": [...], "seed": <int>}
+    Server-Sent Events: สถานะงาน generate ของผู้ใช้ (ตำแหน่งคิว, step ของ sampler, preview)
+    ส่งเฉพาะเมื่อสถานะเปลี่ยน / ASGI ไม่กิน worker thread ระหว่างรอ (ดู sse.py)
     """
-    payload = build_prompt_graph(
-        model_name=model_name,
-        positive=positive or "",
-        negative=negative or "",
-        seed=seed,
-        width=width,
-        height=height,
-        n_images=n_images or 1,
-    )
-
-    resp = _post_json(f"{COMFY_HOST}/prompt", payload, timeout=90)
-    prompt_id = resp.get("prompt_id") or resp.get("promptId")
-    if not prompt_id:
-        raise RuntimeError(f"ComfyUI did not return prompt_id: {resp}")
-
-    hist = _poll_history(prompt_id, max_secs=300, sleep_secs=1.0)
-    outputs = hist[prompt_id].get("outputs", {})
+    user = await request.auser()
+    last = {"payload": None}
 
-    # node 7 = SaveImage (ตาม workflows2.json)
-    images = outputs.get("7", {}).get("images", [])
-    image_urls = []
-    for im in images or []:
-        filename = im["filename"]
-        subfolder = im.get("subfolder", "")
-        image_urls.append(f"{COMFY_HOST}/view?filename={filename}&subfolder={subfolder}&type=output")
+    def poll():
+        payload = json.dumps({"jobs": progress_store.snapshot(user.id)})
+        if payload == last["payload"]:
+            return None
+        last["payload"] = payload
+        return payload
 
-    if not image_urls:
-        raise RuntimeError("No images found in ComfyUI outputs.")
-
-    return {"image_urls": image_urls, "seed": payload["prompt"].get("4", {}).get("inputs", {}).get("seed")}
+    return event_stream(request, poll, 0.5)
 
 
 def generate_preview_frame(request):
@@ -636,12 +520,8 @@ def generate_preview_frame(request):
     batch = int(request.GET.get("batch", 1))
 
     try:
-        dim = GenerateDimension.objects.get(id=dimension_id)
-        raw = dim.value.replace("px", "").replace(" ", "")
-        w, h = raw.split("x")
-        width = int(w)
-        height = int(h)
-    except Exception:
+        width, height = get_catalog().get_dimension_size(dimension_id)
+    except ValueError:
         width = 1080
         height = 1080
 
@@ -659,14 +539,178 @@ def generate_preview_frame(request):
 @login_required(login_url='login')
 @require_POST
 def delete_history_view(request, pk):
-    history = get_object_or_404(GenerateHistory, pk=pk)
-    # Optional: check ownership
-    if history.user != request.user:
+    get_object_or_404(GenerateHistory.objects.only("id"), pk=pk)
+    if delete_histories(request.user.id, [pk]) is None:
         return JsonResponse({"status": "error", "message": "Ownership denied"}, status=403)
-        
-    history.delete()
     return JsonResponse({"status": "success"})
 
+def _history_ids(data, limit=1000):
+    ids = data.get("ids")
+    if not isinstance(ids, list) or not ids or len(ids) > limit:
+        raise ValueError
+    return [int(i) for i in ids]
+
+@login_required(login_url='login')
+@require_POST
+def bulk_delete_history(request):
+    """POST JSON {"ids": [...]} -> ลบภาพของตัวเองหลายรายการในครั้งเดียว"""
+    try:
+        ids = _history_ids(json.loads(request.body))
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({"status": "error", "message": "ids ไม่ถูกต้อง"}, status=400)
+
+    deleted = delete_histories(request.user.id, ids)
+    if deleted is None:
+        return JsonResponse({"status": "error", "message": "Ownership denied"}, status=403)
+    return JsonResponse({"status": "success", "deleted": deleted})
+
+@login_required(login_url='login')
+@require_POST
+def bulk_rate_history(request):
+    """POST JSON {"ids": [...], "rating": 1-5 | null} -> UPDATE เดียว"""
+    try:
+        data = json.loads(request.body)
+        ids = set(_history_ids(data))
+        rating = data.get("rating")
+        if rating is not None:
+            rating = int(rating)
+            if not 1 <= rating <= 5:
+                raise ValueError
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({"status": "error", "message": "ข้อมูลไม่ถูกต้อง"}, status=400)
+
+    with transaction.atomic():
+        updated = GenerateHistory.objects.filter(user=request.user, pk__in=ids).update(rating=rating)
+        if updated != len(ids):
+            # มี id ที่ไม่ใช่ของผู้ใช้ -> ยกเลิกทั้งหมด
+            transaction.set_rollback(True)
+            return JsonResponse({"status": "error", "message": "Ownership denied"}, status=403)
+    return JsonResponse({"status": "success", "updated": updated})
+
+
+# ---------------- History API (keyset pagination) ----------------
+HISTORY_PAGE_SIZE = 24
+# คอลัมน์ที่ใช้แสดงการ์ด (ไม่ดึง prompt ที่ยาว จนกว่าจะเปิดดู/Remix ผ่าน history_detail_api)
+HISTORY_LIST_FIELDS = ("id", "image_url", "model_name", "seed", "rating", "created_at")
+
+def _history_page(user, params, cursor=None, limit=HISTORY_PAGE_SIZE):
+    """
+    ประวัติของผู้ใช้ทีละหน้า (ใช้ index (user, -created_at))
+    params: model, rating (1-5 | none), date_from, date_to (YYYY-MM-DD)
+    raise ValueError / InvalidCursor ถ้า filter หรือ cursor ไม่ถูกต้อง
+    """
+    qs = GenerateHistory.objects.filter(user=user).only(*HISTORY_LIST_FIELDS)
+
+    model_name = params.get("model")
+    if model_name:
+        qs = qs.filter(model_name=model_name)
+
+    rating = params.get("rating")
+    if rating == "none":
+        qs = qs.filter(rating__isnull=True)
+    elif rating:
+        qs = qs.filter(rating=int(rating))
+
+    for key, bound in (("date_from", 0), ("date_to", 1)):
+        value = params.get(key)
+        if not value:
+            continue
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"{key} ไม่ถูกต้อง")
+        edge = stats.day_range(day)[bound]
+        qs = qs.filter(created_at__gte=edge) if bound == 0 else qs.filter(created_at__lt=edge)
+
+    return keyset_page(qs, ["-created_at", "-pk"], cursor, limit)
+
+@login_required(login_url='login')
+def history_api(request):
+    """
+    GET /generate/history/?cursor=&limit=&model=&rating=&date_from=&date_to=
+    -> {"items": [...], "next_cursor": ...} (ไม่มี prompt, ดูที่ history_detail_api)
+    """
+    try:
+        limit = min(max(int(request.GET.get("limit", HISTORY_PAGE_SIZE)), 1), 60)
+        rows, next_cursor = _history_page(request.user, request.GET, request.GET.get("cursor") or None, limit)
+    except (InvalidCursor, ValueError):
+        return JsonResponse({"status": "error", "message": "พารามิเตอร์ไม่ถูกต้อง"}, status=400)
+
+    return JsonResponse({
+        "status": "success",
+        "items": [{
+            "id": h.id,
+            "image_url": h.image_url,
+            "model_name": h.model_name,
+            "seed": h.seed,
+            "rating": h.rating,
+            "created_at": h.created_at.isoformat(),
+        } for h in rows],
+        "next_cursor": next_cursor,
+    })
+
+SIMILAR_PROMPTS_LIMIT = 12
+
+@login_required(login_url='login')
+def similar_prompts_api(request):
+    """
+    GET /generate/history/similar/?q=<prompt>&k=  หรือ  ?id=<history_id>&k=
+    -> {"items": [...]} ภาพที่ prompt คล้ายกันที่สุด (ของตัวเอง หรือที่ถูกแชร์เป็นโพสต์แล้ว)
+    """
+    text = request.GET.get("q", "").strip()
+    try:
+        k = min(max(int(request.GET.get("k", SIMILAR_PROMPTS_LIMIT)), 1), 50)
+        history_id = int(request.GET["id"]) if request.GET.get("id") else None
+    except ValueError:
+        return JsonResponse({"status": "error", "message": "พารามิเตอร์ไม่ถูกต้อง"}, status=400)
+    if not text and history_id is None:
+        return JsonResponse({"status": "error", "message": "กรุณาระบุ prompt"}, status=400)
+
+    visible = GenerateHistory.objects.filter(Q(user=request.user) | Q(pk__in=Post.objects.values("history_id")))
+    if history_id is not None and not visible.filter(pk=history_id).exists():
+        raise Http404
+    try:
+        # ขอเผื่อไว้ เพราะบางภาพเป็นของผู้อื่นที่ไม่ได้แชร์ / ถูกลบไปแล้ว
+        hits = similar_histories(k * 4, text=text or None, history_id=history_id)
+    except EmbeddingError:
+        return JsonResponse({"status": "error", "message": "ระบบค้นหายังไม่พร้อม กรุณาลองใหม่อีกครั้ง"}, status=503)
+
+    rows = visible.only("id", "user_id", "model_name", "seed", "positive_prompt", "image_url").in_bulk(
+        [pk for pk, _ in hits]
+    )
+    items = []
+    for pk, score in hits:
+        h = rows.get(pk)
+        if h is None:
+            continue
+        items.append({
+            "id": h.id,
+            "image_url": h.image_url,
+            "model_name": h.model_name,
+            "seed": h.seed,
+            "positive_prompt": h.positive_prompt,
+            "score": round(score, 4),
+            "is_mine": h.user_id == request.user.id,
+        })
+        if len(items) == k:
+            break
+    return JsonResponse({"status": "success", "items": items})
+
+@login_required(login_url='login')
+def history_detail_api(request, pk):
+    """prompt เต็มของภาพเดียว (ตอนเปิดดูรายละเอียด / Remix)"""
+    h = get_object_or_404(
+        GenerateHistory.objects.only("id", "user_id", "model_name", "seed", "positive_prompt", "negative_prompt"),
+        pk=pk, user=request.user,
+    )
+    return JsonResponse({
+        "status": "success",
+        "id": h.id,
+        "model_name": h.model_name,
+        "seed": h.seed,
+        "positive_prompt": h.positive_prompt,
+        "negative_prompt": h.negative_prompt or "",
+    })
+
 
 
 
@@ -1013,7 +1057,21 @@ def call_agent_assist_view(request):
 # ==========================================
 @login_required(login_url='login')
 def post_feed_view(request):
-    posts = Post.objects.all().order_by('-created_at')
+    # ?tab=popular -> เรียงตามคะแนน trending (keyset บน PostScore), ค่าเริ่มต้น = ใหม่สุด (keyset บน created_at)
+    # ทั้งสองแท็บแสดงทีละหน้า ?cursor= ไม่ render ทุกโพสต์ในครั้งเดียว
+    tab = "popular" if request.GET.get("tab") == "popular" else "latest"
+    cursor = request.GET.get("cursor") or None
+
+    def page(cursor):
+        if tab == "popular":
+            return trending_page(cursor)
+        return keyset_page(card_posts(Post.objects.all()), ["-created_at", "-pk"], cursor, settings.FEED_PAGE_SIZE)
+
+    try:
+        posts, next_cursor = page(cursor)
+    except InvalidCursor:
+        posts, next_cursor = page(None)
+    posts = attach_post_stats(posts, request.user)
 
     # แปลง queryset เป็น JSON
     data = []
@@ -1030,9 +1088,9 @@ def post_feed_view(request):
             ),
             "created_since": timesince(post.created_at),
             "image": post.history.image_url if post.history else None,
-            "likes_count": post.likes.count(),
-            "comments_count": post.comments.count(),
-            "is_liked": request.user in post.likes.all() if request.user.is_authenticated else False,
+            "likes_count": post.like_count,
+            "comments_count": post.comment_count,
+            "is_liked": post.liked_by_me,
             "history_id": post.history.id if post.history else None,
             "prompt": post.history.positive_prompt if post.history else "",
             "negative": post.history.negative_prompt if post.history else "",
@@ -1043,6 +1101,9 @@ def post_feed_view(request):
     return render(request, 'posts/post_feed.html', {
         "posts": posts,                    # ใช้ render ฟีดปกติ
         "posts_json": json.dumps(data),    # ใช้ JS filter client-side
+        "card_ttl": settings.POST_CARD_CACHE_SECONDS,
+        "tab": tab,
+        "next_cursor": next_cursor,
     })
 
 def post_create_view(request):
@@ -1158,20 +1219,52 @@ def share_post(request, history_id):
     })
 
 @login_required(login_url= 'login')
+@revalidate
+@condition(etag_func=user_profile_etag)
 def user_profile(request, username):
     user_profile = get_object_or_404(User, username=username)
     profile = user_profile.profile
-    posts = Post.objects.filter(user=user_profile).order_by('-created_at')  # แก้ตรงนี้
+    posts, next_cursor = _user_posts_page(request, user_profile)
     return render(request, 'accounts/user_profile.html', {
         'user_profile': user_profile,
         'profile': profile,
         'posts': posts,
+        'next_cursor': next_cursor,
+        'user_stats': stats.user_stats(user_profile.pk),
+        'card_ttl': settings.POST_CARD_CACHE_SECONDS,
     })
 
 
+def _comment_page(post_id, cursor=None, limit=COMMENT_PAGE_SIZE):
+    """คอมเมนต์ของโพสต์ทีละหน้า ใหม่สุดก่อน (index (post, -created_at)) พร้อมผู้เขียน + รูปโปรไฟล์ใน query เดียว"""
+    qs = Comment.objects.filter(post_id=post_id).select_related('user__profile')
+    return keyset_page(qs, ["-created_at", "-pk"], cursor, limit)
+
+def comments_api(request, post_id):
+    """
+    GET /post/<id>/comments/?cursor=&limit=
+    -> {"html": <partials/comment_item.html ต่อกัน>, "next_cursor": ...} สำหรับปุ่มโหลดเพิ่มใน comment modal
+    """
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    try:
+        limit = min(max(int(request.GET.get("limit", COMMENT_PAGE_SIZE)), 1), 50)
+        rows, next_cursor = _comment_page(post_id, request.GET.get("cursor") or None, limit)
+    except (InvalidCursor, ValueError):
+        return JsonResponse({"status": "error", "message": "พารามิเตอร์ไม่ถูกต้อง"}, status=400)
+
+    return JsonResponse({
+        "status": "success",
+        "html": "".join(
+            render_to_string("partials/comment_item.html", {"comment": c}, request=request) for c in rows
+        ),
+        "next_cursor": next_cursor,
+    })
+
+@revalidate
+@condition(etag_func=post_etag)
 def post_detail(request, post_id):
-    post = Post.objects.get(id=post_id)
-    comments = Comment.objects.filter(post=post).order_by('-created_at')
+    post = get_object_or_404(Post.objects.select_related('history', 'user__profile'), id=post_id)
 
     if request.method == "POST" and request.headers.get("x-requested-with") == "XMLHttpRequest":
         data = json.loads(request.body)
@@ -1186,66 +1279,114 @@ def post_detail(request, post_id):
         else:
             return JsonResponse({"error": "ข้อความว่าง"}, status=400)
 
+    comments, next_cursor = _comment_page(post.pk)
     return render(request, "posts/post_detail.html", {
         "post": post,
         "comments": comments,
+        "next_cursor": next_cursor,
     })
     
+@revalidate
+@condition(etag_func=post_etag)
 def comment_modal(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    comments = post.comments.all().order_by('-created_at')
+    post = get_object_or_404(
+        Post.objects.select_related('history', 'user__profile').prefetch_related('tags'), id=post_id
+    )
+    # หน้าแรกเท่านั้น หน้าถัดไปโหลดผ่าน comments_api
+    comments, next_cursor = _comment_page(post.pk)
     form = CommentForm()
 
     return render(request, 'posts/comment_modal.html', {
         'post': post,
         'comments': comments,
+        'next_cursor': next_cursor,
         'form': form,
     })
+
+def related_posts_partial(request, post_id):
+    """
+    GET /post/<id>/related/ -> partials/related_posts.html
+    โหลดแยกจาก comment_modal: ผลลัพธ์ขึ้นกับ index ทั้งระบบ (โพสต์/tag อื่น) ซึ่งไม่อยู่ใน ETag ของโพสต์
+    """
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    return render(request, "partials/related_posts.html", {"related_posts": related_posts(post_id)})
     
+def _wants_json(request):
+    """ฟอร์มคอมเมนต์ที่ส่งผ่าน fetch (partials/comment_scripts.html) -> ตอบ JSON แทน redirect"""
+    return request.headers.get("x-requested-with") == "XMLHttpRequest"
+
+def _comment_response(request, post_id, comment=None, status=200):
+    """{"html": fragment ของคอมเมนต์ (ถ้ามี), "comment_count": จำนวนล่าสุดของโพสต์} สำหรับอัปเดต modal + การ์ด"""
+    data = {"status": "success", "post_id": post_id, "comment_count": Comment.objects.filter(post_id=post_id).count()}
+    if comment is not None:
+        data["id"] = comment.id
+        data["html"] = render_to_string("partials/comment_item.html", {"comment": comment}, request=request)
+    return JsonResponse(data, status=status)
+
+@login_required(login_url='login')
 def add_comment(request, post_id):
+    ajax = _wants_json(request)
     if request.method == 'POST':
-        post = get_object_or_404(Post, id=post_id)
-        text = request.POST.get('text')
+        if not Post.objects.filter(pk=post_id).exists():
+            raise Http404
+        text = request.POST.get('text', '').strip()
 
         if text:
-            Comment.objects.create(
-                post=post,
+            comment = Comment.objects.create(
+                post_id=post_id,
                 user=request.user,
                 text=text
             )
+            if ajax:
+                return _comment_response(request, post_id, comment, status=201)
+        elif ajax:
+            return JsonResponse({"status": "error", "message": "ข้อความว่าง"}, status=400)
 
-    # ✅ กลับไปหน้าเดิมหลังจากบันทึก (refresh แล้วแสดงคอมเมนต์ใหม่ได้เลย)
+    # ✅ กลับไปหน้าเดิมหลังจากบันทึก (ฟอร์มแบบไม่ใช้ JS)
     return redirect(request.META.get('HTTP_REFERER', '/'))
 
 @login_required
 def edit_comment(request, comment_id):
-    comment = get_object_or_404(Comment, id=comment_id)
+    comment = get_object_or_404(Comment.objects.select_related('user__profile'), id=comment_id)
+    ajax = _wants_json(request)
     
     # Check permission
     if request.user != comment.user:
+        if ajax:
+            return JsonResponse({"status": "error", "message": "คุณไม่มีสิทธิ์แก้ไขความคิดเห็นนี้"}, status=403)
         messages.error(request, "คุณไม่มีสิทธิ์แก้ไขความคิดเห็นนี้")
         return redirect(request.META.get('HTTP_REFERER', '/'))
 
     if request.method == 'POST':
-        text = request.POST.get('text')
+        text = request.POST.get('text', '').strip()
         if text:
             comment.text = text
-            comment.save()
+            comment.save(update_fields=['text'])
+            if ajax:
+                return _comment_response(request, comment.post_id, comment)
             messages.success(request, "แก้ไขความคิดเห็นเรียบร้อยแล้ว")
+        elif ajax:
+            return JsonResponse({"status": "error", "message": "ข้อความว่าง"}, status=400)
     
     return redirect(request.META.get('HTTP_REFERER', '/'))
 
 @login_required
 def delete_comment(request, comment_id):
     comment = get_object_or_404(Comment, id=comment_id)
+    ajax = _wants_json(request)
     
     # Check permission (Owner or Staff)
-    if not (request.user == comment.user or request.user.is_staff):
+    if not (request.user.pk == comment.user_id or request.user.is_staff):
+        if ajax:
+            return JsonResponse({"status": "error", "message": "คุณไม่มีสิทธิ์ลบความคิดเห็นนี้"}, status=403)
         messages.error(request, "คุณไม่มีสิทธิ์ลบความคิดเห็นนี้")
         return redirect(request.META.get('HTTP_REFERER', '/'))
 
     if request.method == 'POST':
         comment.delete()
+        if ajax:
+            return _comment_response(request, comment.post_id)
         messages.success(request, "ลบความคิดเห็นเรียบร้อยแล้ว")
     
     return redirect(request.META.get('HTTP_REFERER', '/'))
@@ -1254,7 +1395,7 @@ def delete_comment(request, comment_id):
 @require_POST
 def toggle_like(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
-    if request.user in post.likes.all():
+    if post.likes.filter(pk=request.user.pk).exists():
         post.likes.remove(request.user)
         liked = False
     else:
@@ -1262,6 +1403,34 @@ def toggle_like(request, post_id):
         liked = True
     return JsonResponse({'liked': liked, 'count': post.likes.count()})
 
+@login_required(login_url='login')
+async def post_live_counts(request):
+    """
+    Server-Sent Events: delta ของจำนวน like / comment ของโพสต์บนหน้า (?posts=1,2,3 ตามลำดับบนหน้า)
+    รวมเป็นข้อความเดียวทุก LIVE_COUNTS_INTERVAL วินาที (ไม่นับการกระทำของผู้ชมเอง)
+    """
+    try:
+        post_ids = [int(x) for x in request.GET.get("posts", "").split(",") if x]
+    except ValueError:
+        return JsonResponse({"status": "error", "message": "posts ไม่ถูกต้อง"}, status=400)
+    if not post_ids:
+        return JsonResponse({"status": "error", "message": "ต้องระบุ posts"}, status=400)
+    # เกินจำนวนสูงสุด -> เก็บโพสต์แรก ๆ ของหน้า (ที่ผู้ใช้เห็นก่อน)
+    post_ids = set(list(dict.fromkeys(post_ids))[:settings.LIVE_COUNTS_MAX_POSTS])
+    user = await request.auser()
+    pubsub = get_pubsub()
+    subscription = {}   # subscribe ตอน stream เริ่มจริง (ไม่ค้างถ้า response ไม่ถูกส่ง)
+
+    def poll():
+        counts = coalesce(subscription["sub"].drain(), post_ids, user.id)
+        return json.dumps({"counts": counts}) if counts else None
+
+    return event_stream(
+        request, poll, settings.LIVE_COUNTS_INTERVAL,
+        on_open=lambda: subscription.update(sub=pubsub.subscribe(ENGAGEMENT_CHANNEL)),
+        on_close=lambda: pubsub.unsubscribe(subscription["sub"]),
+    )
+
 def ajax_search_posts(request):
     query = request.GET.get("q", "")
     if query:
@@ -1359,15 +1528,16 @@ def staff_required(view_func):
 @admin_required
 def custom_admin(request):
     filter_type = request.GET.get('filter')
-    today = timezone.now().date()
+    today = stats.local_date()
+    start, end = stats.day_range(today)
 
     # หน้าแดชบอร์ดแอดมิน + รายชื่อสมาชิก
     title = "จัดการสมาชิก (Members)"
     if filter_type == 'active_today':
-        users_qs = User.objects.filter(last_login__date=today).order_by('-last_login')
+        users_qs = User.objects.filter(last_login__gte=start, last_login__lt=end).order_by('-last_login')
         title = f"จัดการสมาชิก (Active Today: {today})"
     elif filter_type == 'new_today':
-        users_qs = User.objects.filter(date_joined__date=today).order_by('-date_joined')
+        users_qs = User.objects.filter(date_joined__gte=start, date_joined__lt=end).order_by('-date_joined')
         title = f"จัดการสมาชิก (New Today: {today})"
     else:
         users_qs = User.objects.all().order_by("-date_joined")
@@ -1465,9 +1635,8 @@ def admin_delete_user(request, user_id):
         messages.error(request, "ไม่สามารถลบบัญชีของตัวเองได้")
         return redirect("custom_admin")
 
-    username = user.username
-    user.delete()
-    messages.success(request, f"ลบบัญชีผู้ใช้ {username} เรียบร้อยแล้ว")
+    request_account_deletion(user, requested_by=request.user)
+    messages.success(request, f"ปิดบัญชี {user.username} แล้ว กำลังลบข้อมูลในเบื้องหลัง")
     return redirect("custom_admin")
 
 
@@ -1665,18 +1834,19 @@ def dashboard_view(request):
     Admin Dashboard: Overview of system statistics.
     Detailed version (Main).
     """
-    today = timezone.now().date()
-    
-    # Basic Counters
-    total_users = User.objects.count()
-    total_posts = Post.objects.count()
-    total_comments = Comment.objects.count()
-    total_generated_images = GenerateHistory.objects.count()
+    # Basic Counters (จาก rollup รายวัน: อ่าน O(จำนวนวัน) แถว แทน COUNT ทั้งตาราง)
+    totals = stats.totals()
+    today = stats.today()
+    total_users = totals['users']
+    total_posts = totals['posts']
+    total_comments = totals['comments']
+    total_generated_images = totals['generations']
 
     # Activity Monitoring
-    active_users_today = User.objects.filter(last_login__date=today).count()
-    new_users_today = User.objects.filter(date_joined__date=today).count()
-    generated_today = GenerateHistory.objects.filter(created_at__date=today).count()
+    start, end = stats.day_range(today.date)
+    active_users_today = User.objects.filter(last_login__gte=start, last_login__lt=end).count()
+    new_users_today = today.new_users
+    generated_today = today.generations
     active_models = GenerateModel.objects.filter(is_active=True).count()
     tags_count = Tag.objects.count()
 
@@ -1685,10 +1855,9 @@ def dashboard_view(request):
     recent_images = GenerateHistory.objects.select_related('user').order_by('-created_at')[:5]
 
     # Model Usage Stats
-    model_usage_data = GenerateHistory.objects.values('model_name').annotate(count=Count('model_name')).order_by('-count')[:5]
     model_usage = []
     if total_generated_images > 0:
-        for m in model_usage_data:
+        for m in stats.top_models(5):
             percent = (m['count'] / total_generated_images) * 100
             model_usage.append({
                 'model_name': m['model_name'],
@@ -1697,7 +1866,7 @@ def dashboard_view(request):
             })
 
     # Tag Usage Stats
-    tag_usage = Tag.objects.annotate(count=Count('posts')).order_by('-count')[:5]
+    tag_usage = stats.top_tags(5)
 
     context = {
         "total_users": total_users,
@@ -1722,15 +1891,15 @@ def admin_dashboard(request):
     """
     Legacy Admin Dashboard
     """
-    today = timezone.now().date()
+    start, end = stats.day_range(stats.local_date())
     
     total_users = User.objects.count()
-    active_users_today = User.objects.filter(last_login__date=today).count()
-    new_users_today = User.objects.filter(date_joined__date=today).count()
+    active_users_today = User.objects.filter(last_login__gte=start, last_login__lt=end).count()
+    new_users_today = User.objects.filter(date_joined__gte=start, date_joined__lt=end).count()
     active_models = GenerateModel.objects.filter(is_active=True).count()
     tags_count = Tag.objects.count()
     total_generated_images = GenerateHistory.objects.count()
-    generated_today = GenerateHistory.objects.filter(created_at__date=today).count()
+    generated_today = GenerateHistory.objects.filter(created_at__gte=start, created_at__lt=end).count()
 
     recent_users = User.objects.order_by("-date_joined")[:5]
     recent_images = GenerateHistory.objects.select_related('user').order_by('-created_at')[:5]
@@ -1753,94 +1922,205 @@ def admin_dashboard(request):
     })
 
 
+def _widget_cache_key(*parts):
+    # key มีช่วงเวลา (bucket) อยู่ด้วย -> ทุกหน้าของ widget หมดอายุพร้อมกัน ไม่ปนข้อมูลต่างรอบ
+    ttl = max(settings.DASHBOARD_WIDGET_CACHE_TTL, 1)
+    return ":".join(["dashboard_widget", str(int(time.time() // ttl))] + [str(p) for p in parts])
+
+def _widget_ranking(widget_type):
+    """อันดับ models / tags ทั้งหมด (เรียงแล้ว) จาก rollup รายวัน เก็บใน cache ตาม bucket"""
+    def build():
+        if widget_type == 'models':
+            ranking = [{'key': m['model_name'], 'model_name': m['model_name'], 'count': m['count']} for m in stats.top_models(None)]
+        else:
+            ranking = [{'key': t.id, 'name': t.name, 'count': t.count} for t in stats.top_tags(None)]
+        # เรียงซ้ำด้วยลำดับของ Python: DB เรียง model_name ตาม collation ซึ่งอาจไม่ตรงกับการเทียบ str
+        # ที่ bisect ใน _ranking_page ใช้ -> cursor จะข้าม/ซ้ำแถวได้
+        ranking.sort(key=_ranking_key)
+        return ranking
+    return cache.get_or_set(_widget_cache_key(widget_type), build, settings.DASHBOARD_WIDGET_CACHE_TTL)
+
+def _ranking_key(row):
+    return (-row['count'], row['key'])
+
+def _ranking_page(ranking, cursor, limit):
+    # ranking เรียงตาม _ranking_key (-count, key) -> หา position ของ cursor ด้วย bisect แทน OFFSET
+    pos = 0
+    if cursor:
+        count, key = decode_cursor(cursor)
+        pos = bisect_right(ranking, (-count, key), key=_ranking_key)
+    items = ranking[pos:pos + limit]
+    next_cursor = None
+    if pos + limit < len(ranking):
+        next_cursor = encode_cursor([items[-1]['count'], items[-1]['key']])
+    return [{k: v for k, v in r.items() if k != 'key'} for r in items], next_cursor
+
+def _widget_rows_page(widget_type, cursor, limit):
+    """หน้าของ images / users แบบ keyset (ไม่มี COUNT / OFFSET) cache ตาม (bucket, cursor, limit)"""
+    key = _widget_cache_key(widget_type, cursor or "-", limit)
+    page = cache.get(key)
+    if page is not None:
+        return page
+
+    if widget_type == 'images':
+        qs = GenerateHistory.objects.select_related('user').only(
+            'user__username', 'model_name', 'positive_prompt', 'seed', 'created_at'
+        )
+        rows, next_cursor = keyset_page(qs, ['-created_at', '-pk'], cursor, limit)
+        data = [{
+            'user': img.user.username,
+            'model_name': img.model_name,
+            'positive_prompt': img.positive_prompt,
+            'seed': img.seed,
+            'created_at': img.created_at,
+        } for img in rows]
+    else:
+        qs = User.objects.only('username', 'email', 'date_joined')
+        rows, next_cursor = keyset_page(qs, ['-date_joined', '-pk'], cursor, limit)
+        data = [{
+            'username': u.username,
+            'email': u.email if u.email else "-",
+            'joined': u.date_joined.strftime("%d/%m/%Y")
+        } for u in rows]
+
+    page = (data, next_cursor)
+    cache.set(key, page, settings.DASHBOARD_WIDGET_CACHE_TTL)
+    return page
+
 @admin_required
 def ajax_dashboard_widget(request):
     """
     API for Load More functionality on dashboard widgets.
-    Params: widget_type, offset, limit (default 5)
+    Params: widget_type, cursor (ค่า next_cursor จาก response ก่อนหน้า, หน้าแรกไม่ต้องส่ง), limit (default 5, max 50)
+    Response: data, has_more, next_cursor
+    ผลลัพธ์ถูก cache สั้น ๆ (DASHBOARD_WIDGET_CACHE_TTL) -> ตัวเลขอาจช้ากว่าจริงไม่กี่วินาที
     """
     widget_type = request.GET.get('widget_type')
-    offset = int(request.GET.get('offset', 0))
-    limit = int(request.GET.get('limit', 5))
-    
-    data = []
-    has_more = False
-    
+    cursor = request.GET.get('cursor') or None
+    try:
+        limit = min(max(int(request.GET.get('limit', 5)), 1), 50)
+    except ValueError:
+        limit = 5
+
+    if widget_type not in ('images', 'users', 'models', 'tags'):
+        return JsonResponse({"status": "error", "message": "ไม่รู้จัก widget_type"}, status=400)
+
+    try:
+        if widget_type in ('models', 'tags'):
+            data, next_cursor = _ranking_page(_widget_ranking(widget_type), cursor, limit)
+        else:
+            data, next_cursor = _widget_rows_page(widget_type, cursor, limit)
+    except (InvalidCursor, ValueError, TypeError):
+        return JsonResponse({"status": "error", "message": "cursor ไม่ถูกต้อง"}, status=400)
+
     if widget_type == 'images':
-        qs = GenerateHistory.objects.select_related('user').order_by('-created_at')
-        total = qs.count()
-        items = qs[offset : offset + limit]
-        has_more = (offset + limit) < total
-        for img in items:
-            data.append({
-                'user': img.user.username,
-                'model_name': img.model_name,
-                'positive_prompt': img.positive_prompt,
-                'seed': img.seed,
-                'time': timesince(img.created_at) + " ago",
-            })
-            
-    elif widget_type == 'users':
-        qs = User.objects.all().order_by('-date_joined')
-        total = qs.count()
-        items = qs[offset : offset + limit]
-        has_more = (offset + limit) < total
-        for u in items:
-            data.append({
-                'username': u.username,
-                'email': u.email if u.email else "-",
-                'joined': u.date_joined.strftime("%d/%m/%Y")
-            })
-            
-    elif widget_type == 'models':
-        qs = GenerateHistory.objects.values('model_name').annotate(count=Count('model_name')).order_by('-count')
-        total = qs.count()
-        items = qs[offset : offset + limit]
-        has_more = (offset + limit) < total
-        for m in items:
-            data.append({
-                'model_name': m['model_name'],
-                'count': m['count']
-            })
-            
-    elif widget_type == 'tags':
-        qs = Tag.objects.annotate(count=Count('posts')).order_by('-count')
-        total = qs.count()
-        items = qs[offset : offset + limit]
-        has_more = (offset + limit) < total
-        for t in items:
-            data.append({
-                'name': t.name,
-                'count': t.count
-            })
-            
+        # คำนวณ "x ago" ตอนตอบ (ข้อมูลใน cache เก็บเวลาจริงไว้)
+        data = [
+            {k: v for k, v in img.items() if k != 'created_at'} | {'time': timesince(img['created_at']) + " ago"}
+            for img in data
+        ]
+
     return JsonResponse({
         "status": "success",
         "data": data,
-        "has_more": has_more
+        "has_more": next_cursor is not None,
+        "next_cursor": next_cursor,
     })
 
+# ---------------- admin data lists (admin_data_list.html) ----------------
+ADMIN_LIST_PAGE_SIZE = 50
+
+def _thumb(url):
+    return format_html('<img src="{}" class="w-10 h-10 object-cover rounded">', url) if url else "-"
+
+def _admin_data_list(request, qs, columns, default_sort, build_row, context, search_fields=(), filters=(), params=None):
+    """
+    หน้า list ของ admin แบบ keyset pagination (ไม่ COUNT / OFFSET / ไม่ดึงทั้งตาราง)
+    columns = [(header, sort_field | None), ...]   -> คลิกหัวคอลัมน์เพื่อเรียง (?sort=&dir=)
+    search_fields = field ที่ค้นด้วย ?q= (icontains), filters = [(param, lookup), ...] สำหรับค่าตรงตัว
+    params = query string ที่ view กรองไปแล้ว (เช่น filter=today) ให้ติดไปกับลิงก์เรียง/หน้าถัดไป
+    """
+    sortable = {field for _, field in columns if field}
+    sort = request.GET.get('sort')
+    if sort not in sortable:
+        sort = default_sort
+    direction = 'asc' if request.GET.get('dir') == 'asc' else 'desc'
+    prefix = '' if direction == 'asc' else '-'
+
+    params = dict(params or {})
+    clear_url = "?" + urlencode(params)
+    q = request.GET.get('q', '').strip()
+    if q and search_fields:
+        params['q'] = q
+        qs = qs.filter(reduce(operator.or_, [Q(**{f"{f}__icontains": q}) for f in search_fields]))
+    for param, lookup in filters:
+        value = request.GET.get(param, '').strip()
+        if value:
+            try:
+                qs = qs.filter(**{lookup: value})
+            except ValueError:
+                continue  # เช่น ?post=abc
+            params[param] = value
+
+    try:
+        rows, next_cursor = keyset_page(qs, [prefix + sort, prefix + 'pk'], request.GET.get('cursor'), ADMIN_LIST_PAGE_SIZE)
+    except InvalidCursor:
+        rows, next_cursor = keyset_page(qs, [prefix + sort, prefix + 'pk'], None, ADMIN_LIST_PAGE_SIZE)
+
+    base = dict(params, sort=sort, dir=direction)
+    header_links = []
+    for header, field in columns:
+        link = None
+        if field:
+            toggle = 'asc' if field == sort and direction == 'desc' else 'desc'
+            link = "?" + urlencode(dict(params, sort=field, dir=toggle))
+        header_links.append({
+            'label': header,
+            'url': link,
+            'active': field == sort,
+            'dir': direction,
+        })
+
+    return render(request, "dashboard/admin_data_list.html", dict(
+        context,
+        headers=[h for h, _ in columns],
+        columns=header_links,
+        rows=[build_row(obj) for obj in rows],
+        q=q,
+        filters=params,
+        search_enabled=bool(search_fields),
+        clear_url=clear_url,
+        is_paged=bool(request.GET.get('cursor')),
+        first_url="?" + urlencode(base),
+        next_url="?" + urlencode(dict(base, cursor=next_cursor)) if next_cursor else None,
+    ))
+
 @admin_required
 def admin_post_list(request):
-    posts = Post.objects.select_related('user').order_by('-created_at')
-    rows = []
-    for p in posts:
-        image_html = f'<img src="{p.history.image_url}" class="w-10 h-10 object-cover rounded">' if p.history and p.history.image_url else "-"
-        rows.append({
+    posts = Post.objects.select_related('user', 'history').only(
+        'title', 'created_at', 'user__username', 'history__image_url'
+    )
+
+    def row(p):
+        return {
             'id': p.id,
             'data': [
-                image_html,
-                p.title or "(No Title)",
-                p.user.username,
+                _thumb(p.history.image_url),
+                escape(p.title or "(No Title)"),
+                escape(p.user.username),
                 p.created_at.strftime("%Y-%m-%d %H:%M")
             ]
-        })
-    return render(request, "dashboard/admin_data_list.html", {
-        "title": "Manage Posts",
-        "headers": ["Image", "Title", "Owner", "Created At"],
-        "rows": rows,
-        "delete_url_name": "admin_delete_post"
-    })
+        }
+
+    return _admin_data_list(
+        request, posts,
+        columns=[("Image", None), ("Title", "title"), ("Owner", "user__username"), ("Created At", "created_at")],
+        default_sort="created_at",
+        build_row=row,
+        context={"title": "Manage Posts", "delete_url_name": "admin_delete_post"},
+        search_fields=("title", "caption"),
+        filters=(("user", "user__username"),),
+    )
 
 @admin_required
 @require_POST
@@ -1852,24 +2132,32 @@ def admin_delete_post(request, pk):
 
 @admin_required
 def admin_comment_list(request):
-    comments = Comment.objects.select_related('user', 'post').order_by('-created_at')
-    rows = []
-    for c in comments:
-        rows.append({
+    # ดึงแค่ 51 ตัวอักษรแรกของคอมเมนต์ ไม่ต้อง join Post (ใช้ post_id)
+    comments = Comment.objects.select_related('user').only(
+        'created_at', 'post_id', 'user__username'
+    ).annotate(text_preview=Substr('text', 1, 51))
+
+    def row(c):
+        text = c.text_preview
+        return {
             'id': c.id,
             'data': [
-                c.text[:50] + "..." if len(c.text) > 50 else c.text,
-                c.user.username,
-                f"Post #{c.post.id}",
+                escape(text[:50] + "..." if len(text) > 50 else text),
+                escape(c.user.username),
+                f"Post #{c.post_id}",
                 c.created_at.strftime("%Y-%m-%d %H:%M")
             ]
-        })
-    return render(request, "dashboard/admin_data_list.html", {
-        "title": "Manage Comments",
-        "headers": ["Comment", "User", "Post", "Date"],
-        "rows": rows,
-        "delete_url_name": "admin_delete_comment"
-    })
+        }
+
+    return _admin_data_list(
+        request, comments,
+        columns=[("Comment", None), ("User", "user__username"), ("Post", "post_id"), ("Date", "created_at")],
+        default_sort="created_at",
+        build_row=row,
+        context={"title": "Manage Comments", "delete_url_name": "admin_delete_comment"},
+        search_fields=("text",),
+        filters=(("user", "user__username"), ("post", "post_id")),
+    )
 
 @admin_required
 @require_POST
@@ -1882,32 +2170,42 @@ def admin_delete_comment(request, pk):
 @admin_required
 def admin_image_list(request):
     filter_type = request.GET.get('filter')
-    today = timezone.now().date()
-    
+    images = GenerateHistory.objects.select_related('user').only(
+        'image_url', 'model_name', 'created_at', 'user__username'
+    ).annotate(prompt_preview=Substr('positive_prompt', 1, 50))
+
+    params = {}
     if filter_type == 'today':
-        images = GenerateHistory.objects.filter(created_at__date=today).select_related('user').order_by('-created_at')
+        today = stats.local_date()
+        start, end = stats.day_range(today)
+        images = images.filter(created_at__gte=start, created_at__lt=end)
         title = f"ภาพที่สร้างวันนี้ (Today: {today})"
+        params['filter'] = 'today'
     else:
-        images = GenerateHistory.objects.select_related('user').order_by('-created_at')
         title = "จัดการรูปภาพที่สร้าง (All Generated Images)"
-    rows = []
-    for img in images:
-        image_html = f'<img src="{img.image_url}" class="w-10 h-10 object-cover rounded">'
-        rows.append({
+
+    def row(img):
+        return {
             'id': img.id,
             'data': [
-                image_html,
-                img.positive_prompt[:50] + "...",
-                img.user.username,
-                img.model_name
+                _thumb(img.image_url),
+                escape(img.prompt_preview + "..."),
+                escape(img.user.username),
+                escape(img.model_name),
+                img.created_at.strftime("%Y-%m-%d %H:%M")
             ]
-        })
-    return render(request, "dashboard/admin_data_list.html", {
-        "title": title,
-        "headers": ["Image", "Prompt", "User", "Model"],
-        "rows": rows,
-        "delete_url_name": "admin_delete_image"
-    })
+        }
+
+    return _admin_data_list(
+        request, images,
+        columns=[("Image", None), ("Prompt", None), ("User", "user__username"), ("Model", "model_name"), ("Created At", "created_at")],
+        default_sort="created_at",
+        build_row=row,
+        context={"title": title, "delete_url_name": "admin_delete_image"},
+        search_fields=("positive_prompt",),
+        filters=(("user", "user__username"), ("model", "model_name")),
+        params=params,
+    )
 
 @admin_required
 @require_POST
@@ -1917,6 +2215,17 @@ def admin_delete_image(request, pk):
     messages.success(request, "Image history deleted successfully.")
     return redirect('admin_image_list')
 
+@admin_required
+def admin_export_download(request, name):
+    """ดาวน์โหลดไฟล์ที่ export ใน background (ดู accounts.exports.start_background_export)"""
+    try:
+        path = export_path(name)
+    except ValueError:
+        raise Http404
+    if not os.path.exists(path):
+        raise Http404("ไฟล์ยังไม่พร้อม (กำลัง export อยู่) หรือไม่มีไฟล์นี้")
+    return FileResponse(open(path, "rb"), as_attachment=True, filename=name.split("_", 1)[-1])
+
 @admin_required
 def admin_tag_list(request):
     sort_param = request.GET.get('sort')
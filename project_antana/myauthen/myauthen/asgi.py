@@ -3,6 +3,15 @@ ASGI config for myauthen project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Long-lived streams (``generate/events/`` progress of image generation and
+``post/live/`` like/comment count updates) are Server-Sent Events, so serve
+the project through this module in production, e.g.
+``uvicorn myauthen.asgi:application`` (uvicorn is in requirements.txt).
+The streams also work under WSGI / ``runserver`` (accounts/sse.py hands
+Django a sync iterator there), but each open stream then ties up a worker
+thread. Live counts use an in-process pub/sub by default, so with several
+ASGI processes set ``LIVE_PUBSUB_BACKEND`` to a broker-backed one.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -14,3 +23,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myauthen.settings')
 
 application = get_asgi_application()
+
+# เก็บงาน generate ที่ค้างจาก process ก่อนหน้า (ต้องเรียกหลัง setup Django)
+from accounts.jobs import start_reconciler  # noqa: E402
+
+start_reconciler()
@@ -109,6 +109,38 @@ DATABASES = {
     }
 }
 
+# --- Cache ---
+# ตั้ง REDIS_URL (เช่น redis://127.0.0.1:6379/1) เมื่อรันหลาย process/worker: fragment การ์ดและสถิติเห็นตรงกันทุก process
+# ไม่ตั้ง = LocMemCache ต่อ process (fragment ที่ cache ไว้ยังถูกต้อง เพราะ key ผูกกับ version stamp ด้านล่าง)
+# version stamp (accounts/versions.py -> invalidate fragment + ETag) ต้องเป็นค่าเดียวกันทุก worker เสมอ:
+# ใช้ Redis ถ้ามี ไม่อย่างนั้นเป็นไฟล์ใน VERSION_CACHE_DIR (ทุก worker บนเครื่องเดียวกันเห็นร่วมกัน)
+REDIS_URL = os.getenv('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+        'versions': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            # ค่าเริ่มต้นของ Django (300) ไม่พอ: การ์ดหนึ่งใบใช้ 2 fragment + version ของโพสต์/ผู้เขียน
+            'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '20000'))},
+        },
+        'versions': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('VERSION_CACHE_DIR', os.path.join(BASE_DIR, 'cache', 'versions')),
+            # ~4 stamp ต่อโพสต์ (การ์ด, ผู้เขียน, thread, หน้าโปรไฟล์); ถูก cull -> seed ใหม่ = แค่ cache miss
+            'OPTIONS': {'MAX_ENTRIES': int(os.getenv('VERSION_CACHE_MAX_ENTRIES', '200000'))},
+        },
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -159,6 +191,85 @@ STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
 
+# --- ComfyUI Generation ---
+# รวมงาน generate ที่ prompt/checkpoint/ขนาด/sampler เหมือนกัน (seed อัตโนมัติ) ภายใน window เป็น latent batch เดียว
+# COMFY_BATCH_WINDOW = 0 คือปิดการรวมงาน
+COMFY_BATCH_WINDOW = float(os.getenv('COMFY_BATCH_WINDOW', '0.3'))      # วินาที
+COMFY_BATCH_MAX_IMAGES = int(os.getenv('COMFY_BATCH_MAX_IMAGES', '8'))  # ส่งทันทีเมื่อรวมครบจำนวนภาพนี้
+COMFY_BATCH_WORKERS = int(os.getenv('COMFY_BATCH_WORKERS', '2'))        # prompt ที่รอผลพร้อมกันได้
+
+# Fair-share scheduler: จำกัดการใช้ GPU ต่อผู้ใช้ (staff ได้คิวก่อนและไม่ติด rate limit)
+# ค่าทั้งหมดเป็นต่อ process (token bucket / คิว / in-flight อยู่ใน memory): รัน N worker -> ผู้ใช้ได้สูงสุด N เท่า
+# และ GPU รับงานพร้อมกันได้ N x GENERATE_MAX_CONCURRENT -> หารค่าด้วยจำนวน worker เมื่อ deploy หลาย process
+GENERATE_MAX_CONCURRENT = int(os.getenv('GENERATE_MAX_CONCURRENT', '4'))                # งานที่ส่งเข้า GPU พร้อมกัน
+GENERATE_MAX_INFLIGHT_PER_USER = int(os.getenv('GENERATE_MAX_INFLIGHT_PER_USER', '2'))  # งานค้างต่อผู้ใช้
+GENERATE_RATE_PER_MINUTE = float(os.getenv('GENERATE_RATE_PER_MINUTE', '12'))           # ภาพ/นาที ต่อผู้ใช้
+GENERATE_BURST = int(os.getenv('GENERATE_BURST', '8'))                                  # ขนาด token bucket
+GENERATE_MAX_QUEUE = int(os.getenv('GENERATE_MAX_QUEUE', '32'))                         # คิวรวมทั้งระบบ
+GENERATE_QUEUE_TIMEOUT = int(os.getenv('GENERATE_QUEUE_TIMEOUT', '120'))                # วินาทีที่รอ slot ได้
+
+# งานที่ส่งไป ComfyUI แล้วถูกบันทึกใน GenerationJob -> reconciler นำผลเข้า History ถ้า process ตายระหว่างรอ
+GENERATE_RECONCILE_ON_STARTUP = os.getenv('GENERATE_RECONCILE_ON_STARTUP', '1') == '1'
+GENERATE_RECONCILE_INTERVAL = int(os.getenv('GENERATE_RECONCILE_INTERVAL', '60'))       # วินาที
+GENERATE_JOB_RECONCILE_AFTER = int(os.getenv('GENERATE_JOB_RECONCILE_AFTER', '330'))    # งานที่ไม่มี request รอแล้ว (poll 300s)
+GENERATE_JOB_KEEP_HOURS = int(os.getenv('GENERATE_JOB_KEEP_HOURS', '24'))               # เก็บงานที่จบแล้วไว้กี่ชั่วโมง
+
+# catalog โมเดล/ขนาด/จำนวนภาพใน memory (invalidate ด้วย version ใน cache, อายุสูงสุดกันกรณี cache ไม่แชร์)
+CATALOG_CACHE_SECONDS = int(os.getenv('CATALOG_CACHE_SECONDS', '60'))
+
+# --- Dashboard ---
+# cache ผลของ widget API (วินาที) ใช้ cache backend ของ Django (ค่าเริ่มต้น = LocMemCache ต่อ process)
+DASHBOARD_WIDGET_CACHE_TTL = int(os.getenv('DASHBOARD_WIDGET_CACHE_TTL', '30'))
+
+# --- Profile ---
+# cache สถิติหัวโปรไฟล์ (UserStats) ต่อผู้ใช้ ลบ cache ทันทีเมื่อค่าเปลี่ยน อายุนี้กันกรณี cache ไม่แชร์ระหว่าง process
+USER_STATS_CACHE_SECONDS = int(os.getenv('USER_STATS_CACHE_SECONDS', '300'))
+# fragment cache ของการ์ดโพสต์ ({% cache %} ใน feed / โปรไฟล์) key มี version ของโพสต์/ผู้เขียน -> แก้แล้วเห็นทันที
+POST_CARD_CACHE_SECONDS = int(os.getenv('POST_CARD_CACHE_SECONDS', '600'))
+FEED_PAGE_SIZE = int(os.getenv('FEED_PAGE_SIZE', '24'))   # แท็บล่าสุดของ feed (keyset ทีละหน้า)
+
+# --- HTTP caching (ETag ของ post_detail / comment_modal / user_profile ดู accounts/conditional.py) ---
+ETAG_SALT = os.getenv('ETAG_SALT', '')                                   # เปลี่ยนเมื่อ deploy template ใหม่ -> ETag เก่าใช้ไม่ได้
+PUBLIC_PAGE_MAX_AGE = int(os.getenv('PUBLIC_PAGE_MAX_AGE', '60'))        # วินาทีที่ proxy/CDN เก็บหน้าของผู้ชมที่ไม่ได้ login
+MEDIA_MAX_AGE = int(os.getenv('MEDIA_MAX_AGE', str(7 * 24 * 3600)))      # ไฟล์ media ชื่อไม่ซ้ำ (storage เติม suffix) -> cache ได้นาน
+
+# --- Live counts (SSE: post/live/) ---
+LIVE_COUNTS_INTERVAL = float(os.getenv('LIVE_COUNTS_INTERVAL', '1'))     # วินาที: รวม delta ของรอบเป็นข้อความเดียว
+LIVE_COUNTS_MAX_POSTS = int(os.getenv('LIVE_COUNTS_MAX_POSTS', '200'))   # จำนวนโพสต์สูงสุดที่ client หนึ่งติดตามได้
+# pub/sub ใน process เดียว; หลาย process ให้เปลี่ยนเป็น backend บน broker ที่มี publish/subscribe/unsubscribe เหมือนกัน
+LIVE_PUBSUB_BACKEND = os.getenv('LIVE_PUBSUB_BACKEND', 'accounts.live.LocalPubSub')
+
+# --- Trending (แท็บ Popular ของ feed ดู accounts/trending.py) ---
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', '24'))   # คะแนนลดครึ่งหนึ่งทุกกี่ชั่วโมง
+TRENDING_MIN_SCORE = float(os.getenv('TRENDING_MIN_SCORE', '0.05'))             # ต่ำกว่านี้หลุดจากตาราง
+TRENDING_PAGE_SIZE = int(os.getenv('TRENDING_PAGE_SIZE', '24'))
+
+# --- Related posts (post_detail / comment modal ดู accounts/related.py) ---
+RELATED_INDEX_PATH = os.getenv('RELATED_INDEX_PATH', os.path.join(BASE_DIR, 'indexes', 'related_posts.idx'))  # สร้างด้วย build_related_index
+RELATED_INDEX_REFRESH = int(os.getenv('RELATED_INDEX_REFRESH', '30'))   # วินาที: เช็คไฟล์ใหม่ + โพสต์ที่แชร์ใหม่
+RELATED_POSTS_LIMIT = int(os.getenv('RELATED_POSTS_LIMIT', '6'))
+
+# --- ค้นหา prompt ที่คล้ายกัน (generate/history/similar/ ดู accounts/prompt_index.py) ---
+OLLAMA_HOST = os.getenv('OLLAMA_HOST', 'http://127.0.0.1:11434')
+PROMPT_EMBED_MODEL = os.getenv('PROMPT_EMBED_MODEL', '')                # เช่น nomic-embed-text; ว่าง/เรียกไม่ได้ = hashing vectorizer
+PROMPT_EMBED_TIMEOUT = int(os.getenv('PROMPT_EMBED_TIMEOUT', '30'))
+PROMPT_EMBED_HASH_DIM = int(os.getenv('PROMPT_EMBED_HASH_DIM', '256'))
+PROMPT_LSH_TABLES = int(os.getenv('PROMPT_LSH_TABLES', '16'))            # เปลี่ยนค่า LSH แล้วต้อง build ใหม่
+PROMPT_LSH_BITS = int(os.getenv('PROMPT_LSH_BITS', '10'))
+PROMPT_INDEX_PATH = os.getenv('PROMPT_INDEX_PATH', os.path.join(BASE_DIR, 'indexes', 'prompt_embeddings.idx'))  # สร้างด้วย build_prompt_index
+PROMPT_INDEX_REFRESH = int(os.getenv('PROMPT_INDEX_REFRESH', '30'))     # วินาที: เช็คไฟล์ใหม่ + embed ภาพที่สร้างใหม่
+
+# --- Background worker / Export ---
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', '2'))          # thread สำหรับงานเบื้องหลัง (export, ลบไฟล์)
+EXPORT_ROOT = os.getenv('EXPORT_ROOT', os.path.join(BASE_DIR, 'exports'))  # ไฟล์ export (ไม่อยู่ใต้ MEDIA_ROOT)
+EXPORT_MAX_AGE_HOURS = float(os.getenv('EXPORT_MAX_AGE_HOURS', '24'))   # ไฟล์ export เก่ากว่านี้ถูกลบ (export ครั้งถัดไป / gc_media)
+
+# ลบบัญชีทีละ batch ใน background (accounts/deletion.py)
+ACCOUNT_DELETE_BATCH_SIZE = int(os.getenv('ACCOUNT_DELETE_BATCH_SIZE', '500'))
+ACCOUNT_DELETE_BATCH_PAUSE = float(os.getenv('ACCOUNT_DELETE_BATCH_PAUSE', '0.05'))  # วินาทีที่พักระหว่าง batch
+# งาน running ที่ไม่คืบหน้า (updated_at) นานเกินนี้ถือว่า worker ตาย -> process_account_deletions รับไปทำต่อ
+ACCOUNT_DELETE_STALE_AFTER = int(os.getenv('ACCOUNT_DELETE_STALE_AFTER', '900'))
+
 # --- Allauth Config ---
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
@@ -18,6 +18,8 @@ from django.contrib import admin
 from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
+from django.views.decorators.cache import cache_control
+from django.views.static import serve
 
 urlpatterns = [
     path('', include('accounts.urls')),
@@ -27,4 +29,9 @@ urlpatterns = [
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    # serve ตอบ 304 จาก If-Modified-Since อยู่แล้ว + ให้ browser cache ไฟล์ media (production ให้ web server ตั้งเอง)
+    urlpatterns += static(
+        settings.MEDIA_URL,
+        view=cache_control(public=True, max_age=settings.MEDIA_MAX_AGE)(serve),
+        document_root=settings.MEDIA_ROOT,
+    )
\ No newline at end of file
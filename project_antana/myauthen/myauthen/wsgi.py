@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myauthen.settings')
 
 application = get_wsgi_application()
+
+# เก็บงาน generate ที่ค้างจาก process ก่อนหน้า (ต้องเรียกหลัง setup Django)
+from accounts.jobs import start_reconciler  # noqa: E402
+
+start_reconciler()